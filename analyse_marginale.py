@@ -0,0 +1,209 @@
+import json
+from array import array
+from collections import deque
+
+import mclp
+from entites import lire_matrice
+
+
+EPSILON = 1e-9
+
+
+class FlotCouverture:
+    """
+    Évaluation rapide de la couverture pour un nombre de bornes fixé dans chaque parking.
+
+    Une fois x fixé, le MCLP se réduit à un flot maximal biparti : source -> bâtiment j (capacité
+    nb_ve_potentiel), bâtiment j -> parking i pour chaque arc de couverture d'un parking équipé,
+    parking i -> puits (capacité x_i * max_bornes_i). Ajouter une borne dans le parking i n'augmente
+    que la capacité de i : le gain se calcule en cherchant des chemins augmentants vers i seulement,
+    à partir du flot courant, sans reconstruire ni résoudre de modèle.
+
+    Les chemins augmentants sont cherchés à rebours depuis le parking visé, jusqu'au premier bâtiment
+    ayant une demande non couverte : seul le voisinage du parking est parcouru. Pendant l'évaluation d'un
+    candidat, les valeurs modifiées sont notées dans un journal et restaurées ensuite, sans copier le flot.
+    """
+
+    def __init__(self, instance, Rmax, bornes):
+        """
+        Args:
+            - instance (dict): Instance MCLP (voir mclp.preparer_instance).
+            - Rmax (float): Distance maximale de couverture.
+            - bornes (list): Nombre de bornes installées dans chaque parking (indices de la table des parkings).
+        """
+        self.poids = instance["batiments"]["nb_ve_potentiel"]
+        self.C = instance["parkings"]["max_bornes"]
+        self.bornes = array('i', bornes)
+        arc_bat, arc_park = mclp.arcs_couverture(instance, Rmax)
+        self.arc_bat, self.arc_park = arc_bat, arc_park
+
+        nb_batiments, nb_parkings = len(self.poids), len(self.C)
+        self.arcs_par_batiment = [[] for _ in range(nb_batiments)]
+        self.arcs_par_parking = [[] for _ in range(nb_parkings)]
+        for a, (j, i) in enumerate(zip(arc_bat, arc_park)):
+            self.arcs_par_batiment[j].append(a)
+            self.arcs_par_parking[i].append(a)
+
+        self.flot = array('d', [0.0] * len(arc_bat))
+        self.reste_batiment = array('d', self.poids) # demande non encore couverte
+        self.reste_parking = array('d', [self.bornes[i] * self.C[i] for i in range(nb_parkings)])
+        self.journal = None # ({arc: flot initial}, {bâtiment: reste initial}) pendant une évaluation
+
+        # Flot maximal initial : augmentations successives jusqu'à ce qu'aucun parking ne progresse
+        progres = True
+        while progres:
+            progres = False
+            for i in range(nb_parkings):
+                if self.reste_parking[i] > EPSILON and self.augmenter(i, self.reste_parking[i]) > EPSILON:
+                    progres = True
+
+    def couverture(self):
+        return sum(self.poids) - sum(self.reste_batiment)
+
+    def ouvert(self, i, candidat):
+        return self.bornes[i] > 0 or i == candidat
+
+    def chemin_augmentant(self, cible, candidat):
+        """
+        Parcours en largeur du graphe résiduel à rebours, depuis le parking `cible` jusqu'à un bâtiment
+        ayant une demande non couverte. Renvoie la liste des (arc, sens) du chemin, du bâtiment de
+        départ vers `cible`, ou None.
+        """
+        suivant_batiment = {} # bâtiment j -> (arc a, parking i) : j envoie plus de demande à i
+        suivant_parking = {cible: None} # parking i -> (arc a, bâtiment j) : i cède à j une partie de sa demande
+        file = deque([cible])
+
+        while file:
+            i = file.popleft()
+            for a in self.arcs_par_parking[i]:
+                j = self.arc_bat[a]
+                if j in suivant_batiment:
+                    continue
+                suivant_batiment[j] = (a, i)
+                if self.reste_batiment[j] > EPSILON:
+                    chemin = []
+                    while True:
+                        a, i = suivant_batiment[j]
+                        chemin.append((a, +1))
+                        if suivant_parking[i] is None:
+                            return chemin
+                        a, j = suivant_parking[i]
+                        chemin.append((a, -1))
+                # Arcs inverses : un bâtiment déjà servi par un autre parking i2 peut lui être retiré
+                for a2 in self.arcs_par_batiment[j]:
+                    i2 = self.arc_park[a2]
+                    if i2 not in suivant_parking and self.flot[a2] > EPSILON and self.ouvert(i2, candidat):
+                        suivant_parking[i2] = (a2, j)
+                        file.append(i2)
+        return None
+
+    def augmenter(self, cible, quantite, candidat=None):
+        """
+        Pousse jusqu'à `quantite` de demande supplémentaire vers le parking `cible`. Renvoie la quantité poussée.
+        """
+        total = 0.0
+        while quantite - total > EPSILON:
+            chemin = self.chemin_augmentant(cible, candidat)
+            if chemin is None:
+                break
+            j_depart = self.arc_bat[chemin[0][0]]
+            delta = min(quantite - total, self.reste_batiment[j_depart],
+                        min(self.flot[a] for a, sens in chemin if sens < 0) if any(sens < 0 for _, sens in chemin) else float('inf'))
+            if self.journal is not None:
+                flots, restes = self.journal
+                for a, _ in chemin:
+                    flots.setdefault(a, self.flot[a])
+                restes.setdefault(j_depart, self.reste_batiment[j_depart])
+            for a, sens in chemin:
+                self.flot[a] += sens * delta
+            self.reste_batiment[j_depart] -= delta
+            self.reste_parking[cible] -= delta
+            total += delta
+        return total
+
+    def gain_borne_supplementaire(self, i):
+        """
+        Gain exact de couverture d'une borne de plus dans le parking i, les autres bornes restant en place.
+        L'état du flot est restauré après l'évaluation à partir du journal des valeurs modifiées.
+        """
+        if self.bornes[i] >= self.C[i]:
+            return 0.0
+        reste_parking = self.reste_parking[i]
+        self.journal = ({}, {})
+        try:
+            self.reste_parking[i] += self.C[i]
+            gain = self.augmenter(i, self.C[i], candidat=i)
+        finally:
+            flots, restes = self.journal
+            for a, valeur in flots.items():
+                self.flot[a] = valeur
+            for j, valeur in restes.items():
+                self.reste_batiment[j] = valeur
+            self.reste_parking[i] = reste_parking
+            self.journal = None
+        return gain
+
+
+def analyser_valeurs_marginales(bat_file_path, parkings_file_path, mat_distances_file_path, selected_sites_path, output_file, p, Rmax):
+    """
+    Après une résolution de mclp_deloc, classe les parkings candidats selon le gain de couverture
+    d'une borne supplémentaire, et estime la valeur d'une unité de budget p supplémentaire par le
+    meilleur de ces gains, sans résoudre de MILP ni de relaxation linéaire.
+
+    Args:
+        - bat_file_path (str): Chemin du fichier JSON des bâtiments filtrés.
+        - parkings_file_path (str): Chemin du fichier JSON des parkings filtrés.
+        - mat_distances_file_path (str): Chemin de la matrice des distances bâtiments-parkings.
+        - selected_sites_path (str): Chemin du fichier JSON des sites sélectionnés (solution de mclp_deloc).
+        - output_file (str): Chemin du fichier JSON de sortie.
+        - p (int): Nombre maximal de bornes utilisé pour la résolution.
+        - Rmax (float): Distance maximale de couverture utilisée pour la résolution.
+
+    Returns:
+        - resultats : dict, classement des parkings et valeur du budget.
+    """
+    with open(bat_file_path, 'r', encoding='utf-8') as f:
+        data_bat = json.load(f)
+    with open(parkings_file_path, 'r', encoding='utf-8') as f:
+        data_parkings = json.load(f)
+    T, meta = lire_matrice(mat_distances_file_path)
+    with open(selected_sites_path, 'r', encoding='utf-8') as f:
+        selected_sites = json.load(f)
+
+    instance = mclp.preparer_instance(data_bat, data_parkings, T, meta)
+    parkings = instance["parkings"]
+    bornes_installees = {site["gml_id"]: site["nb_bornes_installees"] for site in selected_sites}
+    bornes = [bornes_installees.get(parkings.ids[i], 0) for i in range(len(parkings))]
+
+    flot = FlotCouverture(instance, Rmax, bornes)
+
+    classement = sorted(
+        (
+            {
+                "gml_id": parkings.ids[i],
+                "nb_bornes_installees": bornes[i],
+                "max_bornes": parkings["max_bornes"][i],
+                "gain_borne_supplementaire": flot.gain_borne_supplementaire(i),
+            }
+            for i in range(len(parkings))
+        ),
+        key=lambda candidat: -candidat["gain_borne_supplementaire"]
+    )
+
+    resultats = {
+        "recapitulatif": {
+            "couverture": flot.couverture(),
+            "nb_bornes_installees": sum(bornes),
+            "p": p,
+            # Valeur d'une unité de budget (borne inférieure) : meilleure borne ajoutée sans déplacer les autres
+            "gain_p_plus_1_glouton": classement[0]["gain_borne_supplementaire"] if classement else 0.0,
+        },
+        "parkings": classement,
+    }
+
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(resultats, f, ensure_ascii=False, indent=4)
+
+    print(f"Valeurs marginales des parkings sauvegardées dans '{output_file}'.")
+    print(f"Résumé : {resultats['recapitulatif']}")
+    return resultats
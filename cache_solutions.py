@@ -0,0 +1,202 @@
+import os
+import re
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+
+def empreinte_instance(instance):
+    """
+    Empreinte des données sources d'une instance MCLP : bâtiments (identifiants, positions, demandes),
+    parkings (identifiants, positions, capacités) et source des distances (géodésique, index spatial,
+    graphe piéton). Deux instances de même empreinte donnent la même solution pour les mêmes (p, Rmax).
+
+    Les arcs ne sont pas hachés : avec une matrice creuse, ils dépendent du rayon de coupure, et l'empreinte
+    changerait avec Rmax, ce qui empêcherait d'utiliser une solution voisine en Rmax comme indice. Les arcs
+    à distance <= Rmax ne dépendent pas du rayon de coupure dès que celui-ci est >= Rmax, ce que
+    mclp.arcs_couverture vérifie.
+    """
+    batiments, parkings = instance["batiments"], instance["parkings"]
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([batiments.ids, parkings.ids, instance["source_distances"]]).encode('utf-8'))
+    for tableau in (batiments.lat, batiments.lon, batiments["nb_ve_potentiel"], parkings.lat, parkings.lon, parkings["max_bornes"]):
+        h.update(tableau.tobytes())
+    return h.hexdigest()
+
+
+class CacheSolutions:
+    """
+    Cache disque des résultats de mclp_deloc, borné en taille et purgé selon la politique LRU.
+
+    Chaque résultat est un fichier JSON du dossier du cache dont le nom porte la clé (empreinte de
+    l'instance, p, Rmax) : il n'y a pas d'index partagé à réécrire. Les fichiers sont écrits dans un
+    fichier temporaire puis renommés (os.replace, atomique), et la date de modification d'un fichier
+    sert de date de dernier accès (os.utime à chaque lecture). Le dossier peut donc être partagé
+    entre la ligne de commande, le service et les workers d'un lot : au pire, deux processus
+    résolvent la même instance et écrivent le même résultat. Les statistiques sont propres au processus.
+    """
+
+    MOTIF = re.compile(r"^(?P<empreinte>[0-9a-f]+)_p(?P<p>\d+)_R(?P<Rmax>[^_]+)\.json$")
+    DUREE_TEMPORAIRES_S = 3600 # fichiers temporaires abandonnés (processus interrompu) supprimés après ce délai
+
+    def __init__(self, dossier, taille_max_octets=100 * 1024 * 1024):
+        """
+        Args:
+            - dossier (str): Dossier du cache (créé si besoin).
+            - taille_max_octets (int): Taille totale maximale des résultats conservés.
+        """
+        self.dossier = dossier
+        self.taille_max_octets = taille_max_octets
+        self.verrou = threading.Lock()
+        os.makedirs(dossier, exist_ok=True)
+        self.statistiques = {"succes": 0, "echecs": 0, "indices_utilises": 0, "evictions": 0}
+
+    @staticmethod
+    def cle(empreinte, p, Rmax):
+        return f"{empreinte}_p{int(p)}_R{float(Rmax)!r}"
+
+    def compter(self, compteur):
+        with self.verrou:
+            self.statistiques[compteur] += 1
+
+    def chemin(self, cle):
+        return os.path.join(self.dossier, cle + ".json")
+
+    def lire_entree(self, cle):
+        """
+        Lit une entrée et met à jour sa date de dernier accès ; None si elle n'existe pas (ou plus).
+        """
+        chemin = self.chemin(cle)
+        try:
+            with open(chemin, 'r', encoding='utf-8') as f:
+                resultat = json.load(f)
+            os.utime(chemin)
+        except FileNotFoundError:
+            return None
+        return resultat
+
+    def entrees(self):
+        """
+        Parcourt le dossier du cache : [(dernier_acces, taille, nom, (empreinte, p, Rmax)), ...].
+        Les fichiers temporaires abandonnés depuis plus de DUREE_TEMPORAIRES_S sont supprimés au passage.
+        """
+        entrees = []
+        maintenant = time.time()
+        with os.scandir(self.dossier) as fichiers:
+            for fichier in fichiers:
+                try:
+                    stat = fichier.stat()
+                    if fichier.name.endswith(".tmp"):
+                        if maintenant - stat.st_mtime > self.DUREE_TEMPORAIRES_S:
+                            os.remove(fichier.path)
+                        continue
+                except FileNotFoundError:
+                    continue # supprimé entre-temps par un autre processus
+                motif = self.MOTIF.match(fichier.name)
+                if motif:
+                    parametres = (motif["empreinte"], int(motif["p"]), float(motif["Rmax"]))
+                    entrees.append((stat.st_mtime, stat.st_size, fichier.name, parametres))
+        return entrees
+
+    def lire(self, empreinte, p, Rmax, couverture=False):
+        """
+        Renvoie le résultat exact (selected_sites, max_coverage) s'il est en cache, sinon None.
+        Avec `couverture`, renvoie aussi la couverture par arc, et None si l'entrée ne la contient pas.
+        """
+        resultat = self.lire_entree(self.cle(empreinte, p, Rmax))
+        if resultat is None or (couverture and "couverture" not in resultat):
+            self.compter("echecs")
+            return None
+        self.compter("succes")
+        if couverture:
+            return resultat["selected_sites"], resultat["max_coverage"], [tuple(arc) for arc in resultat["couverture"]]
+        return resultat["selected_sites"], resultat["max_coverage"]
+
+    def plus_proche(self, empreinte, p, Rmax):
+        """
+        Renvoie les sites sélectionnés de la solution en cache aux paramètres les plus proches
+        (même instance, écart relatif sur p et Rmax minimal), ou None si aucune n'existe.
+        Une entrée supprimée entre le parcours du dossier et sa lecture est ignorée.
+        """
+        candidats = sorted(
+            (abs(p_entree - p) / max(p, 1) + abs(Rmax_entree - Rmax) / max(Rmax, 1), nom[:-len(".json")])
+            for _, _, nom, (empreinte_entree, p_entree, Rmax_entree) in self.entrees() if empreinte_entree == empreinte
+        )
+        for _, cle in candidats:
+            resultat = self.lire_entree(cle)
+            if resultat is not None:
+                self.compter("indices_utilises")
+                return resultat["selected_sites"]
+        return None
+
+    def ecrire(self, empreinte, p, Rmax, selected_sites, max_coverage, couverture=None):
+        """
+        Ajoute un résultat au cache (avec la couverture par arc si elle est donnée), puis supprime
+        les entrées les moins récemment utilisées tant que la taille totale dépasse la limite.
+        """
+        cle = self.cle(empreinte, p, Rmax)
+        resultat = {"selected_sites": selected_sites, "max_coverage": max_coverage}
+        if couverture is not None:
+            resultat["couverture"] = couverture
+        descripteur, temporaire = tempfile.mkstemp(dir=self.dossier, suffix=".tmp")
+        with os.fdopen(descripteur, 'w', encoding='utf-8') as f:
+            json.dump(resultat, f, ensure_ascii=False)
+        os.replace(temporaire, self.chemin(cle))
+
+        entrees = sorted(self.entrees())
+        taille_totale = sum(taille for _, taille, _, _ in entrees)
+        for _, taille, nom, _ in entrees:
+            if taille_totale <= self.taille_max_octets:
+                break
+            if nom == cle + ".json":
+                continue
+            try:
+                os.remove(os.path.join(self.dossier, nom))
+                self.compter("evictions")
+            except FileNotFoundError:
+                pass # déjà évincée par un autre processus
+            taille_totale -= taille
+
+    def stats(self):
+        """
+        Statistiques du cache : succès, échecs, taux de succès, indices utilisés et évictions
+        (depuis le démarrage du processus), nombre d'entrées et taille sur disque.
+        """
+        with self.verrou:
+            stats = dict(self.statistiques)
+        entrees = self.entrees()
+        stats["nb_entrees"] = len(entrees)
+        stats["taille_octets"] = sum(taille for _, taille, _, _ in entrees)
+        total = stats["succes"] + stats["echecs"]
+        stats["taux_succes"] = stats["succes"] / total if total else None
+        return stats
+
+
+def resoudre_mclp_avec_cache(instance, p, Rmax, cache, temps_limite_ms=None, couverture=False, empreinte=None):
+    """
+    Résout le MCLP en passant par le cache : un résultat exact est renvoyé immédiatement ;
+    sinon la solution en cache la plus proche (même instance) sert d'indice de départ au solveur,
+    et le nouveau résultat est ajouté au cache.
+
+    L'empreinte de l'instance (voir `empreinte_instance`) parcourt tous ses arcs : pour une instance
+    résolue plusieurs fois (zone préchargée d'un service), la calculer une fois et la passer en `empreinte`.
+
+    Returns:
+        - selected_sites : list, parkings sélectionnés avec le nombre de bornes à implanter.
+        - max_coverage : float, couverture totale maximale.
+        - (si couverture) arcs_couverts : list, couverture affectée à chaque arc (voir mclp.couverture_arcs).
+    """
+    import mclp
+
+    if empreinte is None:
+        empreinte = empreinte_instance(instance)
+    resultat = cache.lire(empreinte, p, Rmax, couverture=couverture)
+    if resultat is not None:
+        return resultat
+
+    indice = cache.plus_proche(empreinte, p, Rmax)
+    resultat = mclp.resoudre_mclp(instance, p, Rmax, temps_limite_ms=temps_limite_ms, indice=indice, couverture=couverture)
+    cache.ecrire(empreinte, p, Rmax, *resultat)
+    return resultat
@@ -0,0 +1,133 @@
+import json
+import numpy as np
+
+
+def generer_profil_type(fichier_profil, pas_min=60, puissance_kw=22.0, taux_occupation=0.25, nb_jours=365):
+    """
+    Génère un profil annuel type de puissance appelée par une borne (pic de recharge en soirée),
+    enregistré au format .npy pour servir d'entrée à `calculer_charges_transfo`.
+
+    Args:
+        - fichier_profil (str): Chemin du fichier .npy de sortie.
+        - pas_min (int): Résolution du profil en minutes (60 ou 15).
+        - puissance_kw (float): Puissance nominale d'une borne.
+        - taux_occupation (float): Taux d'occupation moyen de la borne sur la journée.
+        - nb_jours (int): Nombre de jours du profil.
+    """
+    pas_par_jour = 24 * 60 // pas_min
+    heures = np.arange(pas_par_jour) * pas_min / 60
+
+    # Forme journalière : faible la nuit, pic entre 18h et 22h
+    forme = 0.3 + np.exp(-0.5 * ((heures - 19.5) / 2.0) ** 2) + 0.4 * np.exp(-0.5 * ((heures - 9.0) / 1.5) ** 2)
+    forme = forme / forme.mean() * taux_occupation
+
+    profil = np.lib.format.open_memmap(fichier_profil, mode='w+', dtype=np.float32, shape=(nb_jours * pas_par_jour,))
+    profil[:] = np.tile(np.minimum(forme, 1.0) * puissance_kw, nb_jours)
+    profil.flush()
+    print(f"Profil type de borne ({nb_jours} jours, pas de {pas_min} min) sauvegardé dans '{fichier_profil}'.")
+
+
+def calculer_charges_transfo(asso_tf_bornes_path, fichier_profil, charges_output_path, rapport_output_path,
+                             pas_min=60, puissance_tf_kw=250.0, bornes_profil_path=None, taille_bloc=4096):
+    """
+    Agrège les profils de puissance des bornes en courbes de charge de chaque transformateur,
+    à partir de l'association transformateurs-bornes, et mesure pic, heures de surcharge et marge.
+
+    Le profil peut être :
+        - un vecteur (nb_pas,) : même profil pour toutes les bornes ;
+        - une matrice (nb_bornes, nb_pas) : un profil par borne, dans l'ordre de `bornes_profil_path`
+          (liste JSON des identifiants de bornes).
+    Les profils et les courbes de charge sont des tableaux .npy ouverts en mémoire mappée, et
+    l'agrégation est faite par blocs de pas de temps : la mémoire utilisée ne dépend pas de la durée du profil.
+
+    Args:
+        - asso_tf_bornes_path (str): Chemin du fichier JSON {tf_id: [borne_id, ...]}.
+        - fichier_profil (str): Chemin du fichier .npy des profils de puissance (kW).
+        - charges_output_path (str): Chemin du fichier .npy de sortie (nb_tf, nb_pas) des charges.
+        - rapport_output_path (str): Chemin du fichier JSON de sortie des indicateurs par transformateur.
+        - pas_min (int): Résolution du profil en minutes (60 ou 15).
+        - puissance_tf_kw (float or dict): Puissance admissible par transformateur (valeur unique ou {tf_id: kW}).
+        - bornes_profil_path (str, optional): Chemin du fichier JSON listant les bornes des lignes du profil.
+        - taille_bloc (int): Nombre de pas de temps traités à la fois.
+
+    Returns:
+        - rapport : dict, {tf_id: {"pic_kw", "heures_surcharge", "marge_kw", ...}}.
+    """
+    with open(asso_tf_bornes_path, 'r', encoding='utf-8') as f:
+        associations = json.load(f)
+
+    tf_ids = list(associations)
+    profil = np.load(fichier_profil, mmap_mode='r')
+    nb_pas = profil.shape[-1]
+    pas_h = pas_min / 60
+
+    capacites = np.array(
+        [puissance_tf_kw.get(tf_id, np.inf) if isinstance(puissance_tf_kw, dict) else puissance_tf_kw for tf_id in tf_ids],
+        dtype=np.float64
+    )
+
+    charges = np.lib.format.open_memmap(charges_output_path, mode='w+', dtype=np.float32, shape=(len(tf_ids), nb_pas))
+
+    if profil.ndim == 1:
+        # Profil commun : la charge d'un transformateur est le profil multiplié par son nombre de bornes
+        nb_bornes = np.array([len(associations[tf_id]) for tf_id in tf_ids], dtype=np.float32)
+        for debut in range(0, nb_pas, taille_bloc):
+            fin = min(debut + taille_bloc, nb_pas)
+            charges[:, debut:fin] = nb_bornes[:, None] * profil[None, debut:fin]
+    else:
+        if bornes_profil_path is None:
+            raise ValueError("Un profil par borne nécessite la liste des bornes correspondantes (bornes_profil_path).")
+        with open(bornes_profil_path, 'r', encoding='utf-8') as f:
+            index_bornes = {borne_id: k for k, borne_id in enumerate(json.load(f))}
+
+        # Lignes du profil triées par transformateur, puis sommées par segment (np.add.reduceat)
+        lignes, segments, tf_avec_bornes = [], [], []
+        for t, tf_id in enumerate(tf_ids):
+            bornes = associations[tf_id]
+            if not bornes:
+                continue
+            manquantes = [b for b in bornes if b not in index_bornes]
+            if manquantes:
+                raise ValueError(f"Bornes sans profil pour le transformateur {tf_id} : {manquantes}")
+            segments.append(len(lignes))
+            lignes.extend(index_bornes[b] for b in bornes)
+            tf_avec_bornes.append(t)
+        lignes, segments, tf_avec_bornes = np.array(lignes), np.array(segments), np.array(tf_avec_bornes)
+
+        for debut in range(0, nb_pas, taille_bloc):
+            fin = min(debut + taille_bloc, nb_pas)
+            charges[:, debut:fin] = 0
+            if len(lignes):
+                charges[tf_avec_bornes, debut:fin] = np.add.reduceat(profil[lignes, debut:fin], segments, axis=0)
+
+    charges.flush()
+
+    # Indicateurs par transformateur, calculés par blocs
+    pics = np.zeros(len(tf_ids))
+    pas_surcharge = np.zeros(len(tf_ids), dtype=np.int64)
+    energie = np.zeros(len(tf_ids))
+    for debut in range(0, nb_pas, taille_bloc):
+        bloc = np.asarray(charges[:, debut:debut + taille_bloc], dtype=np.float64)
+        pics = np.maximum(pics, bloc.max(axis=1, initial=0.0))
+        pas_surcharge += (bloc > capacites[:, None]).sum(axis=1)
+        energie += bloc.sum(axis=1) * pas_h
+
+    rapport = {
+        tf_id: {
+            "nb_bornes": len(associations[tf_id]),
+            "pic_kw": float(pics[t]),
+            "puissance_admissible_kw": float(capacites[t]),
+            "marge_kw": float(capacites[t] - pics[t]),
+            "heures_surcharge": float(pas_surcharge[t] * pas_h),
+            "energie_annuelle_kwh": float(energie[t]),
+        }
+        for t, tf_id in enumerate(tf_ids)
+    }
+
+    with open(rapport_output_path, 'w', encoding='utf-8') as f:
+        json.dump(rapport, f, ensure_ascii=False, indent=4)
+
+    nb_surcharges = sum(1 for r in rapport.values() if r["heures_surcharge"] > 0)
+    print(f"Charges des transformateurs sauvegardées dans '{charges_output_path}' et '{rapport_output_path}'.")
+    print(f"Résumé : {len(tf_ids)} transformateurs, {nb_surcharges} en surcharge au moins une fois.")
+    return rapport
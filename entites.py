@@ -0,0 +1,178 @@
+import json
+from array import array
+
+
+class TableEntites:
+    """
+    Table compacte d'entités (bâtiments, parkings, transformateurs) : les gml_id sont convertis une fois
+    en indices entiers denses (0..n-1) et les attributs sont stockés dans des tableaux typés (module array).
+    Les calculs travaillent sur les indices ; les gml_id ne sont utilisés qu'en sortie.
+    """
+
+    __slots__ = ("ids", "index", "lat", "lon", "attributs")
+
+    def __init__(self, ids, lat, lon, **attributs):
+        """
+        Args:
+            - ids (list): gml_id des entités, dans l'ordre des indices.
+            - lat (iterable), lon (iterable): Coordonnées des entités.
+            - **attributs: Attributs numériques supplémentaires, sous la forme nom=(code_type, valeurs),
+              avec code_type un code du module array ('d' pour float, 'i' pour int).
+        """
+        self.ids = list(ids)
+        self.index = {gml_id: k for k, gml_id in enumerate(self.ids)}
+        if len(self.index) != len(self.ids):
+            raise ValueError("Identifiants en double dans la table d'entités.")
+        self.lat = array('d', lat)
+        self.lon = array('d', lon)
+        self.attributs = {nom: array(code, valeurs) for nom, (code, valeurs) in attributs.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, nom):
+        return self.attributs[nom]
+
+    def __contains__(self, gml_id):
+        return gml_id in self.index
+
+    def indice(self, gml_id):
+        return self.index[gml_id]
+
+    def avec_attributs(self, **attributs):
+        """
+        Copie de la table partageant identifiants, index et coordonnées, avec des attributs remplacés ou ajoutés
+        (même forme nom=(code_type, valeurs) que le constructeur).
+        """
+        copie = TableEntites.__new__(TableEntites)
+        copie.ids, copie.index, copie.lat, copie.lon = self.ids, self.index, self.lat, self.lon
+        copie.attributs = dict(self.attributs)
+        copie.attributs.update({nom: array(code, valeurs) for nom, (code, valeurs) in attributs.items()})
+        return copie
+
+    def point(self, k):
+        """
+        Coordonnées (lat, lon) de l'entité d'indice k.
+        """
+        return (self.lat[k], self.lon[k])
+
+    @classmethod
+    def depuis_batiments(cls, data_bat, demande_seule=True):
+        """
+        Table des bâtiments du fichier filtré, avec l'attribut `nb_ve_potentiel`.
+        Par défaut, seuls les bâtiments ayant une demande non nulle sont conservés.
+        """
+        batiments = [b for b in data_bat.get("batiments", []) if not demande_seule or b['nb_ve_potentiel'] > 0]
+        return cls(
+            [b["gml_id"] for b in batiments],
+            [b["geo_point_2d"]["lat"] for b in batiments],
+            [b["geo_point_2d"]["lon"] for b in batiments],
+            nb_ve_potentiel=('d', [b["nb_ve_potentiel"] for b in batiments]),
+        )
+
+    @classmethod
+    def depuis_parkings(cls, data_parkings):
+        """
+        Table des parkings du fichier filtré, avec l'attribut `max_bornes`.
+        """
+        parkings = data_parkings.get("parkings", [])
+        return cls(
+            [p["gml_id"] for p in parkings],
+            [p["geo_point_2d"]["lat"] for p in parkings],
+            [p["geo_point_2d"]["lon"] for p in parkings],
+            max_bornes=('i', [p["max_bornes"] for p in parkings]),
+        )
+
+    @classmethod
+    def depuis_sites(cls, selected_sites):
+        """
+        Table des sites sélectionnés (fichier SOLUTION_sites), avec l'attribut `nb_bornes_installees`.
+        """
+        return cls(
+            [s["gml_id"] for s in selected_sites],
+            [s["geo_point"]["lat"] for s in selected_sites],
+            [s["geo_point"]["lon"] for s in selected_sites],
+            nb_bornes_installees=('i', [s["nb_bornes_installees"] for s in selected_sites]),
+        )
+
+    @classmethod
+    def depuis_transfos(cls, transfos):
+        """
+        Table des transformateurs du fichier filtré ("Geo Point" au format "lat, lon").
+        """
+        points = [tuple(map(float, tf["Geo Point"].split(","))) for tf in transfos]
+        return cls(
+            [tf["gml_id"] for tf in transfos],
+            [lat for lat, _ in points],
+            [lon for _, lon in points],
+        )
+
+
+def arcs_matrice(T, table_lignes, table_colonnes, Rmax=None, cle_ligne="batiment_id"):
+    """
+    Convertit une matrice des distances JSON en arcs creux (indice ligne, indice colonne, distance),
+    en ne gardant que les entités présentes dans les deux tables (et les distances <= Rmax si précisé).
+
+    Returns:
+        - tuple : (array('i') des lignes, array('i') des colonnes, array('d') des distances).
+    """
+    lignes, colonnes, distances = array('i'), array('i'), array('d')
+    index_lignes, index_colonnes = table_lignes.index, table_colonnes.index
+
+    for entry in T:
+        j = index_lignes.get(entry[cle_ligne])
+        if j is None:
+            continue
+        for gml_id, distance in entry["distances"].items():
+            i = index_colonnes.get(gml_id)
+            if i is not None and (Rmax is None or distance <= Rmax):
+                lignes.append(j)
+                colonnes.append(i)
+                distances.append(distance)
+
+    return lignes, colonnes, distances
+
+
+def ecrire_meta_matrice(matrice_path, source, rayon_max=None):
+    """
+    Enregistre à côté d'une matrice des distances bâtiments-parkings (fichier `.meta`) sa source
+    ("geodesique", "index", ou "reseau:<empreinte du graphe>") et son rayon de coupure : une matrice
+    creuse ne contient que les distances <= rayon_max et ne peut pas servir pour un Rmax plus grand.
+    """
+    with open(matrice_path + ".meta", 'w', encoding='utf-8') as f:
+        json.dump({"source": source, "rayon_max": rayon_max}, f, indent=4)
+
+
+def lire_matrice(matrice_path):
+    """
+    Charge une matrice des distances et ses métadonnées (voir `ecrire_meta_matrice`). Une matrice sans
+    fichier `.meta`, écrite avant son introduction, est une matrice géodésique complète.
+
+    Returns:
+        - tuple : (matrice, {"source", "rayon_max"})
+    """
+    with open(matrice_path, 'r', encoding='utf-8') as f:
+        T = json.load(f)
+    return T, lire_meta_matrice(matrice_path)
+
+
+def lire_meta_matrice(matrice_path):
+    """
+    Métadonnées d'une matrice des distances (voir `ecrire_meta_matrice`), sans charger la matrice.
+    """
+    try:
+        with open(matrice_path + ".meta", 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"source": "geodesique", "rayon_max": None}
+
+
+def verifier_rayon(rayon_max, Rmax):
+    """
+    Lève une ValueError si Rmax dépasse le rayon de coupure d'une matrice creuse (arcs manquants).
+    """
+    if rayon_max is not None and Rmax > rayon_max:
+        raise ValueError(
+            f"Rmax = {Rmax} m dépasse le rayon de coupure de la matrice des distances ({rayon_max} m) : "
+            "la recalculer avec ce Rmax (prepare --Rmax)."
+        )
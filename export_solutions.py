@@ -0,0 +1,375 @@
+import os
+import csv
+import json
+import struct
+from collections import Counter
+
+import numpy as np
+
+from entites import TableEntites
+
+
+TAILLE_LECTURE = 1 << 20 # nombre de caractères lus à la fois dans le fichier des bâtiments
+TAILLE_BLOC = 10000 # nombre de lignes écrites à la fois dans les colonnes
+TAILLE_ENTETE_NPY = 128 # en-tête .npy réservé en début de fichier, réécrit à la fermeture avec le nombre de lignes
+TEXTE = "texte" # type des colonnes de chaînes (largeur fixe déterminée au fil de l'écriture)
+TOLERANCE_Z = 1e-6 # couverture résiduelle tolérée sur un parking non retenu (tolérance du solveur)
+COUCHES = {"batiments": "batiment", "sites": "site", "liens": "lien"} # fichier de la couche -> propriété `couche`
+
+
+class EcrivainGeoJSON:
+    """
+    Écriture en flux d'une FeatureCollection GeoJSON : chaque entité est sérialisée et écrite dès
+    qu'elle est produite, le document complet n'est jamais construit en mémoire.
+    """
+
+    def __init__(self, chemin):
+        self.fichier = open(chemin, 'w', encoding='utf-8')
+        self.fichier.write('{"type":"FeatureCollection","features":[\n')
+        self.nb_entites = 0
+
+    def ajouter(self, entite):
+        if self.nb_entites:
+            self.fichier.write(',\n')
+        self.fichier.write(entite)
+        self.nb_entites += 1
+
+    def fermer(self):
+        self.fichier.write('\n]}\n')
+        self.fichier.close()
+
+
+class EcrivainGeoJSONSeq:
+    """
+    Écriture en flux d'une couche GeoJSONSeq (une entité GeoJSON par ligne, extension .geojsonl),
+    lue directement par GDAL/OGR, QGIS ou geopandas, et lisible elle-même ligne à ligne.
+    """
+
+    def __init__(self, chemin):
+        self.fichier = open(chemin, 'w', encoding='utf-8')
+        self.nb_entites = 0
+
+    def ajouter(self, entite):
+        self.fichier.write(entite)
+        self.fichier.write('\n')
+        self.nb_entites += 1
+
+    def fermer(self):
+        self.fichier.close()
+
+
+class ColonneNpy:
+    """
+    Colonne .npy écrite par blocs sans connaître à l'avance le nombre de lignes : un en-tête de taille
+    fixe est réservé, les blocs sont ajoutés à la suite, puis l'en-tête est réécrit à la fermeture.
+    Pour les chaînes, la largeur est celle du plus long texte écrit ; si un bloc dépasse la largeur
+    courante, la colonne est réécrite une fois à la nouvelle largeur (identifiants de longueur homogène
+    en pratique).
+    """
+
+    def __init__(self, chemin, dtype):
+        self.chemin = chemin
+        self.texte = dtype == TEXTE
+        self.dtype = np.dtype('<U1' if self.texte else dtype)
+        self.nb_lignes = 0
+        self.fichier = open(chemin, 'wb+')
+        self.fichier.write(b' ' * TAILLE_ENTETE_NPY)
+
+    def ajouter(self, valeurs):
+        if self.texte:
+            largeur = max((len(v) for v in valeurs), default=1)
+            if largeur > self.dtype.itemsize // 4:
+                self.elargir(np.dtype(f'<U{largeur}'))
+        self.fichier.write(np.asarray(valeurs, dtype=self.dtype).tobytes())
+        self.nb_lignes += len(valeurs)
+
+    def elargir(self, dtype):
+        self.fichier.seek(TAILLE_ENTETE_NPY)
+        anciennes = np.frombuffer(self.fichier.read(), dtype=self.dtype)
+        self.fichier.seek(TAILLE_ENTETE_NPY)
+        self.fichier.truncate()
+        self.fichier.write(anciennes.astype(dtype).tobytes())
+        self.dtype = dtype
+
+    def fermer(self):
+        entete = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (np.lib.format.dtype_to_descr(self.dtype), self.nb_lignes)
+        entete = entete.ljust(TAILLE_ENTETE_NPY - 11) + "\n"
+        self.fichier.seek(0)
+        self.fichier.write(np.lib.format.magic(1, 0) + struct.pack('<H', len(entete)) + entete.encode('latin1'))
+        self.fichier.close()
+
+
+class EcrivainColonnes:
+    """
+    Table au format colonne : un fichier .npy par colonne (voir ColonneNpy) et un `schema.json`.
+    Les lignes sont accumulées par blocs de TAILLE_BLOC puis écrites colonne par colonne ; les colonnes
+    se relisent sans copie avec numpy.load(..., mmap_mode='r').
+    """
+
+    def __init__(self, dossier, colonnes):
+        """
+        Args:
+            - dossier (str): Dossier de la table (créé si besoin).
+            - colonnes (dict): {nom: dtype numpy ou TEXTE}, dans l'ordre des colonnes.
+        """
+        os.makedirs(dossier, exist_ok=True)
+        self.dossier = dossier
+        self.colonnes = {nom: ColonneNpy(os.path.join(dossier, nom + ".npy"), dtype) for nom, dtype in colonnes.items()}
+        self.bloc = {nom: [] for nom in colonnes}
+
+    def ajouter(self, ligne):
+        for nom, valeurs in self.bloc.items():
+            valeurs.append(ligne[nom])
+        if len(next(iter(self.bloc.values()))) >= TAILLE_BLOC:
+            self.vider()
+
+    def vider(self):
+        for nom, valeurs in self.bloc.items():
+            self.colonnes[nom].ajouter(valeurs)
+            self.bloc[nom] = []
+
+    def fermer(self):
+        self.vider()
+        for colonne in self.colonnes.values():
+            colonne.fermer()
+        schema = {
+            "nb_lignes": next(iter(self.colonnes.values())).nb_lignes,
+            "colonnes": {nom: colonne.dtype.str for nom, colonne in self.colonnes.items()},
+        }
+        with open(os.path.join(self.dossier, "schema.json"), 'w', encoding='utf-8') as f:
+            json.dump(schema, f, indent=4)
+
+
+def entite_geojson(geometrie, proprietes):
+    return json.dumps({"type": "Feature", "geometry": geometrie, "properties": proprietes}, ensure_ascii=False, separators=(',', ':'))
+
+
+def lire_tableau_json(chemin, cle, taille_lecture=TAILLE_LECTURE):
+    """
+    Lit en flux les éléments du tableau `cle` d'un fichier JSON de la forme {cle: [...], ...}
+    (fichiers filtrés) : le fichier est lu par blocs et chaque élément est décodé puis rendu
+    dès qu'il est complet, sans charger le document entier.
+    """
+    decodeur = json.JSONDecoder()
+    with open(chemin, 'r', encoding='utf-8') as f:
+        tampon, position, fin_fichier = "", 0, False
+
+        def caractere():
+            # Prochain caractère significatif (None en fin de fichier), le tampon étant complété au besoin
+            nonlocal tampon, position, fin_fichier
+            while True:
+                while position < len(tampon) and tampon[position].isspace():
+                    position += 1
+                if position < len(tampon) or fin_fichier:
+                    return tampon[position] if position < len(tampon) else None
+                bloc = f.read(taille_lecture)
+                fin_fichier = not bloc
+                tampon, position = tampon[position:] + bloc, 0
+
+        def valeur():
+            # Décode la valeur suivante ; une valeur en fin de tampon peut être tronquée : on relit
+            nonlocal tampon, position, fin_fichier
+            while True:
+                caractere()
+                try:
+                    objet, suite = decodeur.raw_decode(tampon, position)
+                    if suite < len(tampon) or fin_fichier:
+                        position = suite
+                        return objet
+                except json.JSONDecodeError:
+                    if fin_fichier:
+                        raise ValueError(f"Fichier JSON '{chemin}' invalide ou tronqué.")
+                bloc = f.read(taille_lecture)
+                fin_fichier = not bloc
+                tampon, position = tampon[position:] + bloc, 0
+
+        def attendre(attendu):
+            nonlocal position
+            c = caractere()
+            if c != attendu:
+                raise ValueError(f"Fichier JSON '{chemin}' : '{attendu}' attendu, '{c}' trouvé.")
+            position += 1
+
+        attendre('{')
+        if caractere() == '}':
+            return
+        while True:
+            nom = valeur()
+            attendre(':')
+            if nom == cle:
+                attendre('[')
+                if caractere() == ']':
+                    position += 1
+                else:
+                    while True:
+                        yield valeur()
+                        if caractere() == ']':
+                            position += 1
+                            break
+                        attendre(',')
+            else:
+                valeur() # autre clé du fichier : ignorée
+            if caractere() == '}':
+                return
+            attendre(',')
+
+
+def lire_couverture(couverture_path):
+    """
+    Lit en flux le fichier de couverture par arc écrit à la résolution (voir mclp.ecrire_couverture) :
+    (batiment_id, parking_id, z) dans l'ordre des bâtiments.
+    """
+    with open(couverture_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        if next(reader, None) != ["batiment_id", "parking_id", "z"]:
+            raise ValueError(f"Fichier de couverture '{couverture_path}' invalide : relancer solve.")
+        for batiment_id, parking_id, z in reader:
+            yield batiment_id, parking_id, float(z)
+
+
+def exporter_solution(bat_file_path, selected_sites_path, couverture_path, asso_tf_bornes_path,
+                      transfo_filtres_path, dossier_export, Rmax):
+    """
+    Exporte une solution (sites, couverture de chaque bâtiment, raccordements aux transformateurs et
+    indicateurs) en GeoJSON, en couches GeoJSONSeq et en tables colonnes, en écrivant au fil de l'eau.
+
+    La couverture affectée à chaque bâtiment (variables z du MCLP) est lue dans le fichier de couverture
+    par arc enregistré à la résolution, sans matrice des distances ni nouveau calcul. Les bâtiments du
+    fichier filtré sont lus un par un, dans le même ordre que ce fichier, et leur emprise est écrite
+    aussitôt : aucune géométrie n'est conservée en mémoire.
+
+    Args:
+        - bat_file_path (str): Chemin du fichier JSON des bâtiments filtrés.
+        - selected_sites_path (str): Chemin du fichier JSON des sites sélectionnés.
+        - couverture_path (str): Chemin du fichier CSV de couverture par arc (écrit par solve).
+        - asso_tf_bornes_path (str): Chemin du fichier JSON de l'association transformateurs-bornes (ignoré s'il n'existe pas).
+        - transfo_filtres_path (str): Chemin du fichier JSON des transformateurs filtrés.
+        - dossier_export (str): Dossier de sortie : solution.geojson, {batiments,sites,liens}.geojsonl,
+          colonnes/{batiments,sites,liens}/ et metriques.json.
+        - Rmax (float): Distance maximale de couverture utilisée pour la résolution.
+
+    Returns:
+        - metriques : dict, indicateurs de la solution.
+    """
+    from geopy.distance import geodesic
+
+    if not os.path.exists(couverture_path) or os.path.getmtime(couverture_path) < os.path.getmtime(selected_sites_path):
+        raise ValueError(f"Couverture par arc absente ou antérieure à la solution '{selected_sites_path}' : relancer solve.")
+    with open(selected_sites_path, 'r', encoding='utf-8') as f:
+        sites = TableEntites.depuis_sites(json.load(f))
+    association = {}
+    if os.path.exists(asso_tf_bornes_path):
+        with open(asso_tf_bornes_path, 'r', encoding='utf-8') as f:
+            association = json.load(f)
+    with open(transfo_filtres_path, 'r', encoding='utf-8') as f:
+        transfos = TableEntites.depuis_transfos(json.load(f))
+
+    os.makedirs(dossier_export, exist_ok=True)
+    geojson = EcrivainGeoJSON(os.path.join(dossier_export, "solution.geojson"))
+    couches = {couche: EcrivainGeoJSONSeq(os.path.join(dossier_export, couche + ".geojsonl")) for couche in COUCHES}
+    dossier_colonnes = os.path.join(dossier_export, "colonnes")
+    tables = {
+        "batiments": EcrivainColonnes(os.path.join(dossier_colonnes, "batiments"), {
+            "gml_id": TEXTE, "lat": np.float64, "lon": np.float64, "nb_ve_potentiel": np.float64,
+            "couverture": np.float64, "taux_couverture": np.float64, "parking_principal": TEXTE,
+        }),
+        "sites": EcrivainColonnes(os.path.join(dossier_colonnes, "sites"), {
+            "gml_id": TEXTE, "lat": np.float64, "lon": np.float64, "nb_bornes_installees": np.int32, "demande_servie": np.float64,
+        }),
+        "liens": EcrivainColonnes(os.path.join(dossier_colonnes, "liens"), {
+            "tf_id": TEXTE, "parking_id": TEXTE, "nb_bornes": np.int32, "distance": np.float64,
+        }),
+    }
+
+    def ecrire(couche, geometrie, proprietes, colonnes):
+        entite = entite_geojson(geometrie, dict(proprietes, couche=COUCHES[couche]))
+        geojson.ajouter(entite)
+        couches[couche].ajouter(entite)
+        tables[couche].ajouter(colonnes)
+
+    # Bâtiments ayant une demande, fusionnés au fil de l'eau avec la couverture par arc (même ordre)
+    demande_servie = [0.0] * len(sites)
+    demande_totale = couverture = 0.0
+    nb_batiments = nb_couverts = nb_totalement_couverts = 0
+    arcs = lire_couverture(couverture_path)
+    arc = next(arcs, None)
+    for batiment in lire_tableau_json(bat_file_path, "batiments"):
+        nb_ve = batiment["nb_ve_potentiel"]
+        if not nb_ve > 0:
+            continue
+        couverture_batiment, parking_principal, z_principal = 0.0, None, 0.0
+        while arc is not None and arc[0] == batiment["gml_id"]:
+            _, parking_id, z = arc
+            if parking_id not in sites:
+                if z > TOLERANCE_Z:
+                    raise ValueError(f"Couverture par arc incohérente avec la solution (parking '{parking_id}') : relancer solve.")
+                arc = next(arcs, None)
+                continue
+            couverture_batiment += z
+            demande_servie[sites.indice(parking_id)] += z
+            if z > z_principal:
+                parking_principal, z_principal = parking_id, z
+            arc = next(arcs, None)
+
+        lat, lon = batiment["geo_point_2d"]["lat"], batiment["geo_point_2d"]["lon"]
+        proprietes = {
+            "gml_id": batiment["gml_id"], "nb_ve_potentiel": nb_ve, "couverture": couverture_batiment,
+            "taux_couverture": couverture_batiment / nb_ve, "parking_principal": parking_principal,
+        }
+        ecrire("batiments", batiment.get("geo_shape", {}).get("geometry") or {"type": "Point", "coordinates": [lon, lat]},
+               proprietes, dict(proprietes, lat=lat, lon=lon, parking_principal=parking_principal or ""))
+        demande_totale += nb_ve
+        couverture += couverture_batiment
+        nb_batiments += 1
+        nb_couverts += couverture_batiment > 0
+        nb_totalement_couverts += couverture_batiment >= nb_ve - 1e-9
+    if arc is not None:
+        raise ValueError(f"Couverture par arc incohérente avec les bâtiments filtrés (bâtiment '{arc[0]}') : relancer solve.")
+
+    # Sites sélectionnés
+    for i in range(len(sites)):
+        proprietes = {"gml_id": sites.ids[i], "nb_bornes_installees": sites["nb_bornes_installees"][i], "demande_servie": demande_servie[i]}
+        ecrire("sites", {"type": "Point", "coordinates": [sites.lon[i], sites.lat[i]]}, proprietes,
+               dict(proprietes, lat=sites.lat[i], lon=sites.lon[i]))
+
+    # Raccordements (transformateur, parking) -> nombre de bornes
+    liens = Counter()
+    for tf_id, bornes_tf in association.items():
+        for borne_id in bornes_tf:
+            liens[(tf_id, borne_id.rsplit(".borne_", 1)[0])] += 1
+    longueur_cable = 0.0
+    transfos_utilises = set()
+    for (tf_id, parking_id), nb in liens.items():
+        if tf_id not in transfos or parking_id not in sites:
+            continue
+        point_tf, point_parking = transfos.point(transfos.indice(tf_id)), sites.point(sites.indice(parking_id))
+        distance = geodesic(point_parking, point_tf).meters
+        longueur_cable += nb * distance
+        transfos_utilises.add(tf_id)
+        proprietes = {"tf_id": tf_id, "parking_id": parking_id, "nb_bornes": nb, "distance": distance}
+        ecrire("liens", {"type": "LineString", "coordinates": [[point_parking[1], point_parking[0]], [point_tf[1], point_tf[0]]]},
+               proprietes, proprietes)
+
+    geojson.fermer()
+    for ecrivain in [*couches.values(), *tables.values()]:
+        ecrivain.fermer()
+
+    metriques = {
+        "Rmax": Rmax,
+        "demande_totale": demande_totale,
+        "couverture": couverture,
+        "taux_couverture": couverture / demande_totale if demande_totale else 0.0,
+        "nb_sites": len(sites),
+        "nb_bornes": sum(sites["nb_bornes_installees"]),
+        "nb_batiments": nb_batiments,
+        "nb_batiments_couverts": nb_couverts,
+        "nb_batiments_totalement_couverts": nb_totalement_couverts,
+        "nb_transfos_utilises": len(transfos_utilises),
+        "longueur_cable_m": longueur_cable,
+    }
+    with open(os.path.join(dossier_export, "metriques.json"), 'w', encoding='utf-8') as f:
+        json.dump(metriques, f, ensure_ascii=False, indent=4)
+
+    print(f"Solution exportée dans '{dossier_export}' ({geojson.nb_entites} entités GeoJSON).")
+    print(f"Résumé : {metriques}")
+    return metriques
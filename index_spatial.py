@@ -0,0 +1,200 @@
+import os
+import json
+from math import sin, cos, sqrt, radians, degrees, floor
+
+import numpy as np
+
+
+# Ellipsoïde WGS84
+A_WGS84 = 6378137.0
+E2_WGS84 = 6.69437999014e-3
+
+FAMILLES = ("batiments", "parkings")
+DECALAGE_CELLULE = 1 << 20 # rend positifs les numéros de cellule avant de les combiner en une clé
+
+
+def rayons_courbure(lat):
+    """
+    Rayons de courbure méridien et transverse de l'ellipsoïde WGS84 à la latitude `lat` (degrés).
+    """
+    w = 1 - E2_WGS84 * sin(radians(lat)) ** 2
+    return A_WGS84 * (1 - E2_WGS84) / w ** 1.5, A_WGS84 / sqrt(w)
+
+
+def distances_locales(lat, lon, lats, lons):
+    """
+    Distances (m) d'un point à un tableau de points, par approximation plane sur l'ellipsoïde au voisinage
+    du point : l'écart à la distance géodésique est de l'ordre du centimètre à quelques kilomètres.
+    """
+    M, N = rayons_courbure(lat)
+    dy = M * np.radians(lats - lat)
+    dx = N * cos(radians(lat)) * np.radians(lons - lon)
+    return np.sqrt(dx * dx + dy * dy)
+
+
+def points_source(data, cle):
+    """
+    (gml_id, lat, lon) des entités d'un fichier source (liste brute) ou filtré ({cle: [...]}).
+    """
+    items = data.get(cle, []) if isinstance(data, dict) else data
+    return [
+        (item["gml_id"], item["geo_point_2d"]["lat"], item["geo_point_2d"]["lon"])
+        for item in items if "geo_point_2d" in item
+    ]
+
+
+def empreinte_fichier(chemin):
+    stat = os.stat(chemin)
+    return [os.path.abspath(chemin), stat.st_size, stat.st_mtime_ns]
+
+
+def construire_index(bat_file_path, parkings_file_path, dossier_index, taille_cellule_m=200):
+    """
+    Construit sur disque un index spatial des centroïdes des bâtiments et des parkings de la métropole.
+
+    Les points sont rangés par cellule d'une grille régulière en degrés (taille ~ `taille_cellule_m`) :
+    pour chaque famille, les tableaux numpy (clé de cellule, lat, lon, gml_id) sont triés par clé, de
+    sorte que chaque ligne de cellules d'une requête corresponde à une tranche contiguë. Les gml_id triés
+    et la permutation associée permettent de retrouver une entité par identifiant sans dictionnaire.
+    L'index n'est pas reconstruit si les fichiers sources et la taille de cellule n'ont pas changé.
+
+    Args:
+        - bat_file_path (str): Chemin du fichier JSON des bâtiments (source ou filtré).
+        - parkings_file_path (str): Chemin du fichier JSON des parkings (source ou filtré).
+        - dossier_index (str): Dossier de l'index (créé si besoin).
+        - taille_cellule_m (float): Taille des cellules de la grille, en mètres (de l'ordre de Rmax).
+
+    Returns:
+        - None
+    """
+    meta_path = os.path.join(dossier_index, "meta.json")
+    sources = {"batiments": empreinte_fichier(bat_file_path), "parkings": empreinte_fichier(parkings_file_path)}
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("sources") == sources and meta.get("taille_cellule_m") == taille_cellule_m:
+            print(f"Index spatial à jour dans '{dossier_index}'.")
+            return
+
+    points = {}
+    for famille, chemin in (("batiments", bat_file_path), ("parkings", parkings_file_path)):
+        with open(chemin, 'r', encoding='utf-8') as f:
+            points[famille] = points_source(json.load(f), famille)
+
+    tous = points["batiments"] + points["parkings"]
+    if not tous:
+        raise ValueError("Aucun point à indexer (champ geo_point_2d absent).")
+    lat_ref = sum(lat for _, lat, _ in tous) / len(tous)
+    M, N = rayons_courbure(lat_ref)
+    pas_lat = degrees(taille_cellule_m / M)
+    pas_lon = degrees(taille_cellule_m / (N * cos(radians(lat_ref))))
+
+    os.makedirs(dossier_index, exist_ok=True)
+    for famille in FAMILLES:
+        ids = np.array([gml_id for gml_id, _, _ in points[famille]], dtype=str)
+        lat = np.array([p[1] for p in points[famille]], dtype=np.float64)
+        lon = np.array([p[2] for p in points[famille]], dtype=np.float64)
+        cle = ((np.floor(lon / pas_lon).astype(np.int64) + DECALAGE_CELLULE) << 21) + (np.floor(lat / pas_lat).astype(np.int64) + DECALAGE_CELLULE)
+
+        ordre = np.argsort(cle, kind="stable")
+        ids, lat, lon, cle = ids[ordre], lat[ordre], lon[ordre], cle[ordre]
+        perm = np.argsort(ids, kind="stable")
+
+        np.save(os.path.join(dossier_index, famille + "_cle.npy"), cle)
+        np.save(os.path.join(dossier_index, famille + "_lat.npy"), lat)
+        np.save(os.path.join(dossier_index, famille + "_lon.npy"), lon)
+        np.save(os.path.join(dossier_index, famille + "_ids.npy"), ids)
+        np.save(os.path.join(dossier_index, famille + "_ids_tries.npy"), ids[perm])
+        np.save(os.path.join(dossier_index, famille + "_perm.npy"), perm)
+
+    meta = {
+        "sources": sources,
+        "taille_cellule_m": taille_cellule_m,
+        "pas_lat": pas_lat,
+        "pas_lon": pas_lon,
+        "effectifs": {famille: len(points[famille]) for famille in FAMILLES},
+    }
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=4)
+
+    print(f"Index spatial construit dans '{dossier_index}' : {meta['effectifs']}.")
+
+
+class IndexSpatial:
+    """
+    Index spatial persistant (voir construire_index), ouvert en mémoire mappée : l'ouverture est
+    immédiate quelle que soit la taille de la métropole, et seules les pages lues sont chargées.
+    Répond aux requêtes « entités à moins de R mètres » pour n'importe quel rayon R.
+    """
+
+    def __init__(self, dossier_index):
+        with open(os.path.join(dossier_index, "meta.json"), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.pas_lat = self.meta["pas_lat"]
+        self.pas_lon = self.meta["pas_lon"]
+        self.tableaux = {
+            famille: {
+                nom: np.load(os.path.join(dossier_index, f"{famille}_{nom}.npy"), mmap_mode='r')
+                for nom in ("cle", "lat", "lon", "ids", "ids_tries", "perm")
+            }
+            for famille in FAMILLES
+        }
+
+    def autour(self, famille, lat, lon, R):
+        """
+        Entités de `famille` à moins de R mètres du point (lat, lon).
+
+        Returns:
+            - tuple : (indices dans l'index, distances en mètres), deux tableaux numpy.
+        """
+        t = self.tableaux[famille]
+        M, N = rayons_courbure(lat)
+        dlat = degrees(R / M)
+        dlon = degrees(R / (N * cos(radians(lat))))
+        cy0 = floor((lat - dlat) / self.pas_lat) + DECALAGE_CELLULE
+        cy1 = floor((lat + dlat) / self.pas_lat) + DECALAGE_CELLULE
+
+        # Une tranche contiguë du tableau trié par ligne de cellules
+        tranches = []
+        for cx in range(floor((lon - dlon) / self.pas_lon), floor((lon + dlon) / self.pas_lon) + 1):
+            base = (cx + DECALAGE_CELLULE) << 21
+            debut = np.searchsorted(t["cle"], base + cy0, side="left")
+            fin = np.searchsorted(t["cle"], base + cy1, side="right")
+            if fin > debut:
+                tranches.append(np.arange(debut, fin))
+        if not tranches:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        indices = np.concatenate(tranches)
+        distances = distances_locales(lat, lon, t["lat"][indices], t["lon"][indices])
+        garder = distances <= R
+        return indices[garder], distances[garder]
+
+    def position(self, famille, gml_id):
+        """
+        Indice d'une entité dans l'index à partir de son gml_id (KeyError si absente).
+        """
+        t = self.tableaux[famille]
+        k = np.searchsorted(t["ids_tries"], gml_id)
+        if k >= len(t["ids_tries"]) or t["ids_tries"][k] != gml_id:
+            raise KeyError(f"Entité '{gml_id}' absente de l'index spatial ({famille}).")
+        return int(t["perm"][k])
+
+    def identifiant(self, famille, indice):
+        return str(self.tableaux[famille]["ids"][indice])
+
+    def couverture(self, famille_source, gml_id, famille_cible, R):
+        """
+        Liste de couverture d'une entité : {gml_id: distance} des entités de `famille_cible` à moins de R mètres.
+        """
+        t = self.tableaux[famille_source]
+        k = self.position(famille_source, gml_id)
+        indices, distances = self.autour(famille_cible, float(t["lat"][k]), float(t["lon"][k]), R)
+        ids = self.tableaux[famille_cible]["ids"]
+        return {str(ids[i]): float(d) for i, d in zip(indices, distances)}
+
+    def batiments_autour_parking(self, parking_id, R):
+        return self.couverture("parkings", parking_id, "batiments", R)
+
+    def parkings_autour_batiment(self, batiment_id, R):
+        return self.couverture("batiments", batiment_id, "parkings", R)
@@ -0,0 +1,244 @@
+import os
+import sys
+import csv
+import json
+import time
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import mclp
+import simulation
+from entites import lire_matrice, verifier_rayon
+
+
+# Paramètres pouvant varier d'un scénario à l'autre sans refiltrer les données de la zone
+PARAMETRES_GRILLE = ["N_ve_2000", "Rmax", "p", "cout_moy_22kW", "max_connections_per_transformer"]
+
+# Paramètres fixes acceptés dans un lot : ceux de la grille et ceux de la préparation des données des zones.
+# Les modes de résolution (resolution_conjointe, multiechelle, dossier_cache, ...) ne sont pas pris en charge :
+# chaque groupe est résolu par mclp.resoudre_mclp.
+PARAMETRES_LOT = PARAMETRES_GRILLE + [
+    "dossier_local", "dossier_sortie", "bat_file", "iris_file", "parkings_file", "transfo_file",
+    "graphe_pietons", "index_spatial", "taille_cellule_index_m", "nb_workers",
+]
+
+# Paramètres définissant le MCLP : les scénarios qui ne diffèrent que par les autres (coût, raccordement) partagent une résolution
+PARAMETRES_MCLP = ["zone_id", "N_ve_2000", "Rmax", "p"]
+
+COLONNES_RESULTATS = [
+    "scenario", "zone_id", *PARAMETRES_GRILLE, "statut", "demande_totale", "couverture", "taux_couverture",
+    "nb_sites", "nb_bornes", "cout_total", "nb_transfos_utilises", "duree_s", "erreur",
+]
+
+# Données des zones préchargées, héritées par les processus de calcul (voir initialiser_worker)
+DONNEES_ZONES = {}
+
+
+def charger_lot(fichier_lot):
+    """
+    Lit et valide un fichier de lot JSON :
+        {
+            "zones": ["iris.163", ...],
+            "parametres": {...},                 # paramètres fixes, parmi PARAMETRES_LOT
+            "grille": {"p": [10, 20], ...},      # valeurs à croiser, parmi PARAMETRES_GRILLE
+            "nb_workers": 4,
+            "temps_limite_ms": null,             # temps limite de chaque résolution
+            "sortie": "output/RESULTATS_lot.csv"
+        }
+    """
+    with open(fichier_lot, 'r', encoding='utf-8') as f:
+        lot = json.load(f)
+
+    inconnus = set(lot) - {"zones", "parametres", "grille", "nb_workers", "temps_limite_ms", "sortie"}
+    if inconnus:
+        raise ValueError(f"Clés inconnues dans le fichier de lot '{fichier_lot}' : {sorted(inconnus)}")
+    inconnus = set(lot.get("parametres", {})) - set(simulation.PARAMETRES_DEFAUT)
+    if inconnus:
+        raise ValueError(f"Paramètres inconnus dans le fichier de lot '{fichier_lot}' : {sorted(inconnus)}")
+    non_pris_en_charge = set(lot.get("parametres", {})) - set(PARAMETRES_LOT)
+    if non_pris_en_charge:
+        raise ValueError(
+            f"Paramètres non pris en charge par un lot de scénarios : {sorted(non_pris_en_charge)} "
+            f"(autorisés : {PARAMETRES_LOT})"
+        )
+    hors_grille = set(lot.get("grille", {})) - set(PARAMETRES_GRILLE)
+    if hors_grille:
+        raise ValueError(f"Paramètres non variables dans une grille : {sorted(hors_grille)} (autorisés : {PARAMETRES_GRILLE})")
+    if not lot.get("zones"):
+        raise ValueError(f"Aucune zone dans le fichier de lot '{fichier_lot}'.")
+    return lot
+
+
+def developper_grille(zones, grille, params):
+    """
+    Produit cartésien des zones et des valeurs de la grille. Chaque scénario reprend les paramètres
+    `params` pour les clés absentes de la grille.
+
+    Returns:
+        - list : scénarios, dictionnaires {"scenario", "zone_id", <paramètres de PARAMETRES_GRILLE>}.
+    """
+    cles = [cle for cle in PARAMETRES_GRILLE if cle in grille]
+    scenarios = []
+    for zone_id in zones:
+        for valeurs in itertools.product(*(grille[cle] for cle in cles)):
+            scenario = {cle: params[cle] for cle in PARAMETRES_GRILLE}
+            scenario.update(zip(cles, valeurs))
+            scenario["zone_id"] = zone_id
+            scenario["scenario"] = len(scenarios)
+            scenarios.append(scenario)
+    return scenarios
+
+
+def precharger_zone(params, zone_id):
+    """
+    Charge une fois les fichiers filtrés d'une zone (préparés au besoin) et construit son instance MCLP,
+    avec pour demande le nombre d'adultes de chaque bâtiment : la demande d'un scénario s'en déduit
+    par simple mise à l'échelle (nb_ve_potentiel = N_ve_2000 * nb_occ_theor_18plus / 2000).
+    """
+    params = dict(params, zone_id=zone_id)
+    chemins = simulation.chemins_fichiers(params)
+    if not all(os.path.exists(chemins[cle]) for cle in ("bat_filtres", "parkings_filtres", "transfo_filtres", "matrice_distances_bat_park")):
+        print(f"Données de la zone '{zone_id}' absentes : préparation.")
+        simulation.etape_prepare(params, chemins)
+
+    with open(chemins["bat_filtres"], 'r', encoding='utf-8') as f:
+        data_bat = json.load(f)
+    with open(chemins["parkings_filtres"], 'r', encoding='utf-8') as f:
+        data_parkings = json.load(f)
+    T, meta = lire_matrice(chemins["matrice_distances_bat_park"])
+    with open(chemins["transfo_filtres"], 'r', encoding='utf-8') as f:
+        transfos = json.load(f)
+
+    for batiment in data_bat.get("batiments", []):
+        batiment["nb_ve_potentiel"] = batiment.get("nb_occ_theor_18plus", 0) or 0
+    return {
+        "instance": mclp.preparer_instance(data_bat, data_parkings, T, meta),
+        "transfos": transfos,
+    }
+
+
+def grouper_scenarios(scenarios):
+    """
+    Regroupe les scénarios ayant le même MCLP (voir PARAMETRES_MCLP), dans l'ordre de leur première apparition.
+    """
+    groupes = {}
+    for scenario in scenarios:
+        groupes.setdefault(tuple(scenario[cle] for cle in PARAMETRES_MCLP), []).append(scenario)
+    return list(groupes.values())
+
+
+def initialiser_worker(donnees_zones):
+    """
+    Initialisation d'un processus de calcul. Avec le démarrage par fork (Linux), `donnees_zones` est hérité
+    du processus parent sans copie ni sérialisation (les pages mémoire sont partagées en lecture) ;
+    sinon (spawn), les données ne sont transmises qu'une fois par processus, et non à chaque scénario.
+    """
+    global DONNEES_ZONES
+    DONNEES_ZONES = donnees_zones
+
+
+def executer_groupe(scenarios, temps_limite_ms=None):
+    """
+    Résout un groupe de scénarios de même MCLP (voir grouper_scenarios) sur les données préchargées :
+    le MCLP est résolu une seule fois, puis le coût d'installation et l'association bornes-transformateurs
+    sont calculés pour chaque scénario. Les erreurs sont consignées dans les lignes de résultat.
+
+    Returns:
+        - list : lignes de la table des résultats (voir COLONNES_RESULTATS), une par scénario du groupe.
+          La durée d'un scénario est celle de la résolution partagée plus celle de son association.
+    """
+    debut = time.perf_counter()
+    premier = scenarios[0]
+    zone = DONNEES_ZONES[premier["zone_id"]]
+    base = zone["instance"]
+
+    # Demande du groupe : les arcs et les parkings sont partagés, seuls les poids changent
+    facteur = premier["N_ve_2000"] / 2000
+    batiments = base["batiments"].avec_attributs(nb_ve_potentiel=('d', (facteur * n for n in base["batiments"]["nb_ve_potentiel"])))
+    instance = dict(base, batiments=batiments)
+    demande_totale = sum(batiments["nb_ve_potentiel"])
+
+    try:
+        selected_sites, max_coverage = mclp.resoudre_mclp(instance, premier["p"], premier["Rmax"], temps_limite_ms=temps_limite_ms)
+    except Exception as e:
+        duree = time.perf_counter() - debut
+        return [dict(scenario, statut="echec", demande_totale=demande_totale, erreur=str(e), duree_s=duree) for scenario in scenarios]
+    duree_resolution = time.perf_counter() - debut
+
+    lignes = []
+    for scenario in scenarios:
+        debut = time.perf_counter()
+        ligne = dict(
+            scenario, statut="ok", demande_totale=demande_totale, erreur="",
+            couverture=max_coverage,
+            taux_couverture=max_coverage / demande_totale if demande_totale else 0.0,
+            nb_sites=len(selected_sites),
+            nb_bornes=sum(site["nb_bornes_installees"] for site in selected_sites),
+            cout_total=simulation.cout_installation(selected_sites, scenario["cout_moy_22kW"]),
+        )
+        try:
+            association = mclp.associer_bornes_transfo(selected_sites, zone["transfos"], scenario["max_connections_per_transformer"])
+            ligne["nb_transfos_utilises"] = sum(1 for bornes in association.values() if bornes)
+        except Exception as e:
+            ligne.update(statut="echec", erreur=str(e))
+        ligne["duree_s"] = duree_resolution + time.perf_counter() - debut
+        lignes.append(ligne)
+    return lignes
+
+
+def executer_lot(fichier_lot, params=None):
+    """
+    Exécute un lot de scénarios : développement de la grille, préchargement unique des zones,
+    résolution en parallèle sur un pool de processus (un MCLP par groupe de scénarios ne différant que par
+    le coût ou le raccordement) et écriture d'une table CSV consolidée.
+
+    Args:
+        - fichier_lot (str): Chemin du fichier de lot JSON (voir charger_lot).
+        - params (dict, optional): Paramètres de base (voir simulation.PARAMETRES_DEFAUT), surchargés par ceux du lot.
+
+    Returns:
+        - resultats : list, une ligne par scénario, dans l'ordre de la grille.
+    """
+    lot = charger_lot(fichier_lot)
+    params = dict(params or simulation.PARAMETRES_DEFAUT)
+    params.update(lot.get("parametres", {}))
+    sortie = lot.get("sortie") or os.path.join(params["dossier_sortie"], "RESULTATS_lot.csv")
+
+    scenarios = developper_grille(lot["zones"], lot.get("grille", {}), params)
+    groupes = grouper_scenarios(scenarios)
+    print(f"Lot '{fichier_lot}' : {len(scenarios)} scénarios sur {len(lot['zones'])} zone(s), {len(groupes)} MCLP à résoudre.")
+
+    debut = time.perf_counter()
+    donnees_zones = {zone_id: precharger_zone(params, zone_id) for zone_id in lot["zones"]}
+    print(f"Zones préchargées en {time.perf_counter() - debut:.2f} s.")
+
+    # Une matrice creuse (distances à pied, index spatial) ne contient pas les arcs au-delà de son rayon de coupure
+    for scenario in scenarios:
+        verifier_rayon(donnees_zones[scenario["zone_id"]]["instance"]["rayon_max"], scenario["Rmax"])
+
+    # fork sous Linux : les processus héritent des données préchargées sans les recopier. Ailleurs
+    # (macOS, Windows), fork n'est pas sûr et la méthode par défaut (spawn) passe par l'initialiseur.
+    contexte = multiprocessing.get_context("fork" if sys.platform.startswith("linux") else None)
+    nb_workers = lot.get("nb_workers", params["nb_workers"])
+    temps_limite_ms = lot.get("temps_limite_ms")
+
+    resultats = []
+    with ProcessPoolExecutor(max_workers=nb_workers, mp_context=contexte, initializer=initialiser_worker, initargs=(donnees_zones,)) as executor:
+        futures = [executor.submit(executer_groupe, groupe, temps_limite_ms) for groupe in groupes]
+        for future in futures:
+            for ligne in future.result():
+                resultats.append(ligne)
+                print(f"Scénario {ligne['scenario'] + 1}/{len(scenarios)} ({ligne['zone_id']}) : {ligne['statut']}")
+    resultats.sort(key=lambda ligne: ligne["scenario"])
+
+    dossier = os.path.dirname(sortie)
+    if dossier:
+        os.makedirs(dossier, exist_ok=True)
+    with open(sortie, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLONNES_RESULTATS, extrasaction='ignore', restval="")
+        writer.writeheader()
+        writer.writerows(resultats)
+
+    print(f"Résultats du lot sauvegardés dans '{sortie}' ({time.perf_counter() - debut:.2f} s).")
+    return resultats
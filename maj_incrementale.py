@@ -0,0 +1,294 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+from geopy.distance import geodesic
+
+import traitement_donnees
+from entites import lire_meta_matrice
+
+
+def empreinte(item):
+    """
+    Empreinte courte d'un enregistrement source, pour détecter ses modifications d'un rafraîchissement à l'autre.
+    """
+    return hashlib.blake2b(json.dumps(item, sort_keys=True, ensure_ascii=False).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def lire_instantane(snapshot_path):
+    """
+    Lit un instantané {"parametres": {...}, "empreintes": {gml_id: empreinte}}. Un instantané
+    d'ancien format (empreintes seules) est renvoyé sans paramètres, ce qui force un recalcul complet.
+    """
+    with open(snapshot_path, 'r', encoding='utf-8') as f:
+        instantane = json.load(f)
+    if "empreintes" not in instantane:
+        return None, instantane
+    return instantane["parametres"], instantane["empreintes"]
+
+
+def ecrire_instantane(snapshot_path, parametres, empreintes):
+    with open(snapshot_path, 'w', encoding='utf-8') as f:
+        json.dump({"parametres": parametres, "empreintes": empreintes}, f)
+
+
+def mettre_a_jour_entites(source, zone_polygon, output_path, snapshot_path, parametres, cle_liste, nettoyer, recapituler):
+    """
+    Met à jour un fichier filtré (bâtiments ou parkings) à partir d'une nouvelle version de la source,
+    en ne traitant que les enregistrements dont l'empreinte a changé depuis l'instantané précédent.
+
+    Args:
+        - source (list): Nouvelle version des enregistrements source.
+        - zone_polygon (shapely.Polygon): Polygone de la zone cible.
+        - output_path (str): Chemin du fichier JSON filtré, mis à jour sur place.
+        - snapshot_path (str): Chemin de l'instantané (voir `lire_instantane`), mis à jour sur place.
+        - parametres (dict): Paramètres de dérivation des entités filtrées, enregistrés dans l'instantané.
+        - cle_liste (str): Clé de la liste des entités dans le fichier filtré ("batiments" ou "parkings").
+        - nettoyer (callable): Nettoyage d'un enregistrement source en entité filtrée.
+        - recapituler (callable): Calcul du récapitulatif à partir des entités filtrées.
+
+    Returns:
+        - changements : dict, identifiants "ajoutes", "supprimes", "deplaces" et "modifies" dans le fichier filtré.
+    """
+    _, ancien = lire_instantane(snapshot_path)
+    with open(output_path, 'r', encoding='utf-8') as f:
+        filtre = json.load(f)
+
+    nouveau = {item["gml_id"]: (empreinte(item), item) for item in source if "gml_id" in item}
+    entites = {entite["gml_id"]: entite for entite in filtre.get(cle_liste, [])}
+    changements = {"ajoutes": [], "supprimes": [], "deplaces": [], "modifies": []}
+
+    # Enregistrements disparus de la source
+    for gml_id in ancien.keys() - nouveau.keys():
+        if entites.pop(gml_id, None) is not None:
+            changements["supprimes"].append(gml_id)
+
+    # Enregistrements nouveaux ou modifiés
+    for gml_id, (h, item) in nouveau.items():
+        if ancien.get(gml_id) == h:
+            continue
+        dans_zone = traitement_donnees.est_dans_zone(item, zone_polygon)
+        if gml_id in entites:
+            if not dans_zone:
+                del entites[gml_id]
+                changements["supprimes"].append(gml_id)
+                continue
+            entite = nettoyer(item)
+            if entite["geo_point_2d"] != entites[gml_id]["geo_point_2d"]:
+                changements["deplaces"].append(gml_id)
+            else:
+                changements["modifies"].append(gml_id)
+            entites[gml_id] = entite
+        elif dans_zone:
+            entites[gml_id] = nettoyer(item)
+            changements["ajoutes"].append(gml_id)
+
+    if any(changements.values()):
+        entites = list(entites.values())
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump({"recapitulatif": recapituler(entites), cle_liste: entites}, f, ensure_ascii=False, separators=(",", ":"))
+
+    ecrire_instantane(snapshot_path, parametres, {gml_id: h for gml_id, (h, _) in nouveau.items()})
+
+    return changements
+
+
+def mettre_a_jour_matrice_distances(bat_output_path, parkings_output_path, matrice_path, changements_bat, changements_park, index=None, Rmax=None):
+    """
+    Met à jour la matrice des distances bâtiments-parkings : seules les lignes des bâtiments ajoutés ou
+    déplacés et les colonnes des parkings ajoutés ou déplacés sont recalculées ; les supprimés sont retirés.
+
+    Avec un index spatial (matrice creuse, voir traitement_donnees.calculer_matrice_distances_index), les
+    lignes et colonnes recalculées sont lues dans l'index et ne gardent que les distances <= Rmax ; sinon
+    elles sont calculées en géodésique pour tous les couples.
+
+    Args:
+        - bat_output_path (str): Chemin du fichier JSON des bâtiments filtrés (à jour).
+        - parkings_output_path (str): Chemin du fichier JSON des parkings filtrés (à jour).
+        - matrice_path (str): Chemin de la matrice des distances, mise à jour sur place.
+        - changements_bat (dict), changements_park (dict): Changements renvoyés par `mettre_a_jour_entites`.
+        - index (IndexSpatial, optional): Index spatial à jour des sources.
+        - Rmax (float, optional): Rayon de coupure de la matrice creuse (avec `index`).
+
+    Returns:
+        - int : nombre de distances recalculées.
+    """
+    with open(bat_output_path, 'r', encoding='utf-8') as f:
+        batiments = json.load(f).get("batiments", [])
+    with open(parkings_output_path, 'r', encoding='utf-8') as f:
+        parkings = json.load(f).get("parkings", [])
+    with open(matrice_path, 'r', encoding='utf-8') as f:
+        lignes = {entry["batiment_id"]: entry["distances"] for entry in json.load(f)}
+
+    points_batiments = {b["gml_id"]: (b["geo_point_2d"]["lat"], b["geo_point_2d"]["lon"]) for b in batiments}
+    points_parkings = {p["gml_id"]: (p["geo_point_2d"]["lat"], p["geo_point_2d"]["lon"]) for p in parkings}
+
+    # Colonnes des parkings supprimés ou à recalculer
+    parkings_a_calculer = changements_park["ajoutes"] + changements_park["deplaces"]
+    for distances in lignes.values():
+        for parking_id in changements_park["supprimes"] + parkings_a_calculer:
+            distances.pop(parking_id, None)
+
+    nb_calculs = 0
+    batiments_a_calculer = set(changements_bat["ajoutes"] + changements_bat["deplaces"])
+
+    if index is not None:
+        import numpy as np # import local : seul le mode index spatial en a besoin
+        from index_spatial import distances_locales
+
+        # Lignes des bâtiments ajoutés ou déplacés : parkings de la zone à moins de Rmax
+        ids_parkings = index.tableaux["parkings"]["ids"]
+        for batiment_id in batiments_a_calculer:
+            positions, distances = index.autour("parkings", *points_batiments[batiment_id], Rmax)
+            lignes[batiment_id] = {
+                str(ids_parkings[k]): d for k, d in zip(positions.tolist(), distances.tolist()) if str(ids_parkings[k]) in points_parkings
+            }
+            nb_calculs += len(positions)
+
+        # Colonnes des parkings ajoutés ou déplacés : bâtiments de la zone à moins de Rmax. Les candidats sont
+        # cherchés autour du parking avec une marge, puis la distance est évaluée depuis le bâtiment, comme
+        # pour une ligne (distances_locales n'est pas exactement symétrique).
+        ids_batiments = index.tableaux["batiments"]["ids"]
+        for parking_id in parkings_a_calculer:
+            lat_parking, lon_parking = points_parkings[parking_id]
+            positions, _ = index.autour("batiments", lat_parking, lon_parking, Rmax + 1)
+            for k in positions.tolist():
+                batiment_id = str(ids_batiments[k])
+                if batiment_id not in points_batiments or batiment_id in batiments_a_calculer:
+                    continue
+                lat, lon = points_batiments[batiment_id]
+                d = float(distances_locales(lat, lon, np.array([lat_parking]), np.array([lon_parking]))[0])
+                if d <= Rmax:
+                    lignes.setdefault(batiment_id, {})[parking_id] = d
+            nb_calculs += len(positions)
+    else:
+        # Lignes des bâtiments ajoutés ou déplacés : toutes les colonnes
+        for batiment_id in batiments_a_calculer:
+            lignes[batiment_id] = {
+                parking_id: geodesic(points_batiments[batiment_id], coord_parking).meters
+                for parking_id, coord_parking in points_parkings.items()
+            }
+            nb_calculs += len(points_parkings)
+
+        # Colonnes des parkings ajoutés ou déplacés, pour les autres bâtiments
+        for batiment_id, coord_batiment in points_batiments.items():
+            if batiment_id in batiments_a_calculer:
+                continue
+            distances = lignes.setdefault(batiment_id, {})
+            for parking_id in parkings_a_calculer:
+                distances[parking_id] = geodesic(coord_batiment, points_parkings[parking_id]).meters
+                nb_calculs += 1
+
+    # Les lignes sont réécrites dans l'ordre du fichier des bâtiments (les supprimés disparaissent), sans indentation
+    matrice_distances = [{"batiment_id": batiment_id, "distances": lignes[batiment_id]} for batiment_id in points_batiments]
+    with open(matrice_path, 'w', encoding='utf-8') as f:
+        json.dump(matrice_distances, f, ensure_ascii=False, separators=(",", ":"))
+
+    return nb_calculs
+
+
+def rafraichir_zone(bat_file_path, parkings_file_path, iris_file_path, bat_output_path, parkings_output_path, matrice_path,
+                    snapshot_bat_path, snapshot_park_path, journal_path, zone_id, N_ve_2000, maj_matrice=True,
+                    dossier_index=None, taille_cellule_index_m=200, Rmax=None):
+    """
+    Rafraîchit les fichiers filtrés et la matrice des distances d'une zone après mise à jour des sources.
+    Lors du premier appel (pas d'instantané), les fichiers sont entièrement recalculés et les instantanés créés ;
+    ensuite, le coût est proportionnel au nombre d'enregistrements modifiés. Les instantanés conservent aussi
+    les paramètres de dérivation (N_ve_2000 pour les bâtiments) : s'ils ont changé, tout est recalculé, les
+    champs dérivés (nb_ve_potentiel) des enregistrements inchangés étant sinon périmés. Chaque rafraîchissement
+    ajoute une ligne au journal des changements (JSON Lines).
+
+    Avec un index spatial, celui-ci est d'abord reconstruit si les sources ont changé, puis la matrice creuse
+    (distances <= Rmax) est mise à jour à partir de l'index. Une matrice d'un autre type ou d'un autre rayon de
+    coupure que celui demandé est entièrement recalculée.
+
+    Args:
+        - bat_file_path (str), parkings_file_path (str), iris_file_path (str): Fichiers source.
+        - bat_output_path (str), parkings_output_path (str), matrice_path (str): Fichiers filtrés de la zone.
+        - snapshot_bat_path (str), snapshot_park_path (str): Instantanés des sources (paramètres et empreintes).
+        - journal_path (str): Chemin du journal des changements.
+        - zone_id (str): Identifiant (gml_id) de la zone iris cible.
+        - N_ve_2000 (int): Quantité de véhicules électriques normalisée sur 2 000 personnes.
+        - maj_matrice (bool): Mettre à jour la matrice à vol d'oiseau (False si elle est recalculée autrement, ex: réseau piéton).
+        - dossier_index (str, optional): Dossier de l'index spatial des sources (matrice creuse, voir index_spatial.py).
+        - taille_cellule_index_m (float): Taille des cellules de l'index spatial, en mètres.
+        - Rmax (float, optional): Rayon de coupure de la matrice creuse (avec `dossier_index`).
+
+    Returns:
+        - entree_journal : dict, changements enregistrés dans le journal.
+    """
+    with open(bat_file_path, 'r', encoding='utf-8') as f:
+        source_bat = json.load(f)
+    with open(parkings_file_path, 'r', encoding='utf-8') as f:
+        source_park = json.load(f)
+
+    index = None
+    if dossier_index is not None:
+        from index_spatial import IndexSpatial, construire_index
+        construire_index(bat_file_path, parkings_file_path, dossier_index, taille_cellule_m=taille_cellule_index_m)
+        index = IndexSpatial(dossier_index)
+
+    def calculer_matrice():
+        if index is not None:
+            traitement_donnees.calculer_matrice_distances_index(bat_output_path, parkings_output_path, dossier_index, matrice_path, Rmax)
+        else:
+            traitement_donnees.calculer_matrice_distances_bat_parkings(bat_output_path, parkings_output_path, matrice_path)
+
+    parametres_bat, parametres_park = {"N_ve_2000": N_ve_2000}, {}
+    fichiers = [bat_output_path, parkings_output_path, snapshot_bat_path, snapshot_park_path] + ([matrice_path] if maj_matrice else [])
+    complet = not all(os.path.exists(chemin) for chemin in fichiers)
+    if not complet:
+        complet = (lire_instantane(snapshot_bat_path)[0] != parametres_bat or lire_instantane(snapshot_park_path)[0] != parametres_park)
+        if complet:
+            print(f"Paramètres de dérivation modifiés depuis le dernier rafraîchissement de la zone '{zone_id}' : recalcul complet.")
+
+    if complet:
+        # Premier passage ou paramètres modifiés : calcul complet puis instantanés
+        traitement_donnees.traiter_batiments(bat_file_path, iris_file_path, bat_output_path, zone_id, N_ve_2000)
+        traitement_donnees.traiter_parkings(parkings_file_path, iris_file_path, parkings_output_path, zone_id)
+        if maj_matrice:
+            calculer_matrice()
+        for source, snapshot_path, parametres in [(source_bat, snapshot_bat_path, parametres_bat), (source_park, snapshot_park_path, parametres_park)]:
+            ecrire_instantane(snapshot_path, parametres, {item["gml_id"]: empreinte(item) for item in source if "gml_id" in item})
+        entree_journal = {"date": datetime.now().isoformat(timespec="seconds"), "zone_id": zone_id, "complet": True}
+    else:
+        zone_polygon = traitement_donnees.trouver_zone(iris_file_path, zone_id)
+        changements_bat = mettre_a_jour_entites(
+            source_bat, zone_polygon, bat_output_path, snapshot_bat_path, parametres_bat, "batiments",
+            lambda item: traitement_donnees.nettoyer_batiment(item, N_ve_2000),
+            lambda entites: traitement_donnees.recapitulatif_batiments(entites, N_ve_2000)
+        )
+        changements_park = mettre_a_jour_entites(
+            source_park, zone_polygon, parkings_output_path, snapshot_park_path, parametres_park, "parkings",
+            traitement_donnees.nettoyer_parking, traitement_donnees.recapitulatif_parkings
+        )
+        nb_calculs, matrice_recalculee = 0, False
+        meta_attendue = {"source": "index", "rayon_max": Rmax} if index is not None else {"source": "geodesique", "rayon_max": None}
+        if maj_matrice and lire_meta_matrice(matrice_path) != meta_attendue:
+            print(f"Matrice des distances de la zone '{zone_id}' d'un autre type ou rayon de coupure : recalcul complet de la matrice.")
+            calculer_matrice()
+            matrice_recalculee = True
+        elif maj_matrice and (any(changements_bat.values()) or any(changements_park.values())):
+            nb_calculs = mettre_a_jour_matrice_distances(
+                bat_output_path, parkings_output_path, matrice_path, changements_bat, changements_park, index=index, Rmax=Rmax
+            )
+        entree_journal = {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "zone_id": zone_id,
+            "complet": False,
+            "batiments": changements_bat,
+            "parkings": changements_park,
+            "nb_distances_recalculees": nb_calculs,
+            "matrice_recalculee": matrice_recalculee,
+        }
+
+    with open(journal_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entree_journal, ensure_ascii=False) + "\n")
+
+    if entree_journal["complet"]:
+        print(f"Zone '{zone_id}' entièrement recalculée, instantanés créés.")
+    else:
+        resume = {cle: {type_changement: len(ids) for type_changement, ids in entree_journal[cle].items()} for cle in ("batiments", "parkings")}
+        print(f"Zone '{zone_id}' rafraîchie : {resume}, {entree_journal['nb_distances_recalculees']} distances recalculées.")
+    print(f"Journal des changements mis à jour dans '{journal_path}'.")
+    return entree_journal
@@ -1,149 +1,515 @@
+import csv
 import json
-from ortools.linear_solver import pywraplp
-from geopy.distance import geodesic
+from array import array
+from bisect import bisect_right
+from math import cos, radians
+
+from entites import TableEntites, arcs_matrice, lire_matrice, verifier_rayon
 
     
-def mclp_deloc(bat_file_path, parkings_file_path, mat_distances_file_path, selected_sites_path, p, Rmax):
+def preparer_instance(data_bat, data_parkings, T, meta=None):
     """
-    Résout le problème Maximal Covering Location Problem (MCLP) à partir de données JSON.
+    Construit en mémoire une instance MCLP réutilisable pour plusieurs résolutions (p, Rmax différents).
+    Bâtiments et parkings sont stockés dans des tables d'entités (indices entiers denses), et les arcs
+    de couverture bâtiment-parking sont triés par distance croissante, ce qui permet d'extraire les arcs
+    à distance <= Rmax par simple recherche dichotomique.
 
     Args:
-        - bat_file_path (str): Chemin du fichier JSON contenant les bâtiments de la zone à couvrir.
-        - parkings_file_path (str): Chemin du fichier JSON contenant les parkings de la zone à couvrir.
-        - mat_distances_file_path (str): Chemin du fichier JSON contenant la matrice des distances entre les batiments de bat_file_path et les parkings de parkings_file_path.
-        - p (int): Nombre maximal de bornes à implanter.
+        - data_bat (dict): Contenu du fichier JSON des bâtiments filtrés.
+        - data_parkings (dict): Contenu du fichier JSON des parkings filtrés.
+        - T (list): Matrice des distances bâtiments-parkings.
+        - meta (dict, optional): Source et rayon de coupure de la matrice (voir entites.lire_matrice) ;
+          par défaut, matrice géodésique complète.
+
+    Returns:
+        - instance : dict, tables des bâtiments (demande non nulle) et des parkings, arcs triés par distance,
+          source des distances et rayon de coupure des arcs.
+    """
+    meta = meta or {"source": "geodesique", "rayon_max": None}
+    batiments = TableEntites.depuis_batiments(data_bat)
+    parkings = TableEntites.depuis_parkings(data_parkings)
+
+    # Arcs (indice bâtiment, indice parking, distance) entre demandes et sites, triés par distance
+    arc_bat, arc_park, arc_dist = arcs_matrice(T, batiments, parkings)
+    ordre = sorted(range(len(arc_dist)), key=arc_dist.__getitem__)
+
+    return {
+        "batiments": batiments,
+        "parkings": parkings,
+        "arc_bat": array('i', (arc_bat[a] for a in ordre)),
+        "arc_park": array('i', (arc_park[a] for a in ordre)),
+        "arc_dist": array('d', (arc_dist[a] for a in ordre)),
+        "source_distances": meta["source"],
+        "rayon_max": meta["rayon_max"],
+    }
+
+
+def preparer_instance_index(data_bat, data_parkings, index, Rmax):
+    """
+    Variante de `preparer_instance` sans matrice des distances : les listes de couverture de chaque
+    bâtiment (parkings à moins de Rmax) sont lues à la demande dans un index spatial persistant
+    (voir index_spatial.py). L'instance ne contient que les arcs de distance <= Rmax : Rmax est donc
+    aussi son rayon de coupure.
+
+    Args:
+        - data_bat (dict): Contenu du fichier JSON des bâtiments filtrés.
+        - data_parkings (dict): Contenu du fichier JSON des parkings filtrés.
+        - index (IndexSpatial): Index spatial contenant au moins les parkings de la zone.
         - Rmax (float): Distance maximale de couverture.
 
     Returns:
-        - selected_sites : dict, nombre de bornes à implanter dans chaque parking {parking_id: nombre_de_bornes}.
-        - max_coverage : float, couverture totale maximale.
+        - instance : dict, même structure que celle de `preparer_instance`.
     """
-    # Charger les données des bâtiments
-    with open(bat_file_path, 'r', encoding='utf-8') as f:
-        data_bat = json.load(f)
+    batiments = TableEntites.depuis_batiments(data_bat)
+    parkings = TableEntites.depuis_parkings(data_parkings)
 
-    # Charger les données des parkings
-    with open(parkings_file_path, 'r', encoding='utf-8') as f:
-        data_parkings = json.load(f)
-    
-    # Charger la matrice des distances
-    with open(mat_distances_file_path, 'r', encoding='utf-8') as f:
-        T = json.load(f)  # Liste des distances
+    # Position dans l'index -> indice dans la table des parkings de la zone
+    try:
+        indice_parking = {index.position("parkings", gml_id): i for i, gml_id in enumerate(parkings.ids)}
+    except KeyError as e:
+        raise ValueError(f"Index spatial incomplet, à reconstruire : {e}")
 
-    # Extraire les informations nécessaires
-    demande_ids = [batiment['gml_id'] for batiment in data_bat.get("batiments", []) if batiment['nb_ve_potentiel'] > 0]
-    demande_weights = {batiment['gml_id']: batiment['nb_ve_potentiel'] for batiment in data_bat.get("batiments", []) if batiment['nb_ve_potentiel'] > 0}
+    arcs = []
+    for j in range(len(batiments)):
+        positions, distances = index.autour("parkings", batiments.lat[j], batiments.lon[j], Rmax)
+        for position, distance in zip(positions.tolist(), distances.tolist()):
+            i = indice_parking.get(position)
+            if i is not None:
+                arcs.append((distance, j, i))
+    arcs.sort()
 
-    site_ids = [parking['gml_id'] for parking in data_parkings.get("parkings", [])]
-    C = {parking['gml_id']: parking['max_bornes'] for parking in data_parkings.get("parkings", [])}
+    return {
+        "batiments": batiments,
+        "parkings": parkings,
+        "arc_bat": array('i', (j for _, j, _ in arcs)),
+        "arc_park": array('i', (i for _, _, i in arcs)),
+        "arc_dist": array('d', (d for d, _, _ in arcs)),
+        "source_distances": "index",
+        "rayon_max": Rmax,
+    }
 
-    # Charger les données des parkings pour récupérer les informations de localisation pour les sites sélectionnés
-    parking_info = {parking["gml_id"]: parking["geo_point_2d"] for parking in data_parkings.get("parkings", [])}
 
-    # Initialisation du solveur
-    solver = pywraplp.Solver.CreateSolver('SCIP')
-    if not solver:
-        raise Exception("Erreur lors de la création du solveur.")
+def arcs_couverture(instance, Rmax):
+    """
+    Renvoie les arcs à distance <= Rmax d'une instance, sous forme de deux tableaux
+    (indices des bâtiments, indices des parkings). Lève une ValueError si Rmax dépasse le rayon de
+    coupure des arcs de l'instance.
+    """
+    verifier_rayon(instance.get("rayon_max"), Rmax)
+    k = bisect_right(instance["arc_dist"], Rmax)
+    return instance["arc_bat"][:k], instance["arc_park"][:k]
+
+
+def construire_modele(solver, instance, p, Rmax):
+    """
+    Construit les variables, contraintes et l'objectif du MCLP dans un solveur ortools.
 
-    # Variables de décision
-    x = {i: solver.IntVar(0, C[i], f"x[{i}]") for i in site_ids}  # Nombre de bornes installées
-    y = {j: solver.NumVar(0, demande_weights[j], f"y[{j}]") for j in demande_ids}  # Demande couverte
-    z = {}
+    Args:
+        - solver (pywraplp.Solver): Solveur SCIP.
+        - instance (dict): Instance MCLP (voir `preparer_instance`).
+        - p (int): Nombre maximal de bornes à implanter.
+        - Rmax (float): Distance maximale de couverture.
 
-    # Création de z uniquement pour les parkings à distance <= Rmax
-    for entry in T:
-        batiment_id = entry["batiment_id"]
-        if batiment_id in demande_ids:
-            for parking_id, distance in entry["distances"].items():
-                if distance <= Rmax and parking_id in site_ids:
-                    z[(batiment_id, parking_id)] = solver.NumVar(0, demande_weights[batiment_id], f"z[{batiment_id},{parking_id}]")
+    Returns:
+        - tuple : (x, y, z, contrainte_budget), les variables étant indexées par les indices des tables.
+    """
+    batiments = instance["batiments"]
+    parkings = instance["parkings"]
+    demande_weights = batiments["nb_ve_potentiel"]
+    C = parkings["max_bornes"]
+    arc_bat, arc_park = arcs_couverture(instance, Rmax)
+
+    # Variables de décision, indexées par les indices entiers des tables (pas de nom : inutile au solveur)
+    x = [solver.IntVar(0, C[i], "") for i in range(len(parkings))]  # Nombre de bornes installées
+    y = [solver.NumVar(0, demande_weights[j], "") for j in range(len(batiments))]  # Demande couverte
+
+    # Création de z uniquement pour les parkings à distance <= Rmax (un z par arc)
+    z = [solver.NumVar(0, demande_weights[j], "") for j in arc_bat]
+    arcs_par_batiment = [[] for _ in range(len(batiments))]
+    arcs_par_parking = [[] for _ in range(len(parkings))]
+    for a, (j, i) in enumerate(zip(arc_bat, arc_park)):
+        arcs_par_batiment[j].append(a)
+        arcs_par_parking[i].append(a)
 
     # Contraintes
-    solver.Add(solver.Sum(x[i] for i in site_ids) <= p)  # Limite du nombre de bornes
+    contrainte_budget = solver.Add(solver.Sum(x) <= p)  # Limite du nombre de bornes
 
-    for j in demande_ids:
-        solver.Add(y[j] == solver.Sum(z[(j, i)] for i in site_ids if (j, i) in z))  # Demande couverte
+    for j in range(len(batiments)):
+        solver.Add(y[j] == solver.Sum(z[a] for a in arcs_par_batiment[j]))  # Demande couverte
 
-    for j in demande_ids:
-        for i in site_ids:
-            if (j, i) in z:
-                solver.Add(z[(j, i)] <= demande_weights[j])  # Limite de couverture par bâtiment
-                solver.Add(z[(j, i)] <= x[i] * demande_weights[j])  # Dépend des bornes disponibles
+    for a, (j, i) in enumerate(zip(arc_bat, arc_park)):
+        solver.Add(z[a] <= demande_weights[j])  # Limite de couverture par bâtiment
+        solver.Add(z[a] <= x[i] * demande_weights[j])  # Dépend des bornes disponibles
 
-    for i in site_ids:
-        solver.Add(solver.Sum(z[(j, i)] for j in demande_ids if (j, i) in z) <= x[i] * C[i])  # Capacité du parking
+    for i in range(len(parkings)):
+        solver.Add(solver.Sum(z[a] for a in arcs_par_parking[i]) <= x[i] * C[i])  # Capacité du parking
 
     # Objectif : maximiser la demande couverte
-    solver.Maximize(solver.Sum(y[j] for j in demande_ids))
+    solver.Maximize(solver.Sum(y))
+
+    return x, y, z, contrainte_budget
+
+
+def couverture_arcs(instance, Rmax, valeurs_z, bornes=None):
+    """
+    Couverture affectée par la solution à chaque arc bâtiment-parking (variables z), triée dans l'ordre
+    de la table des bâtiments : [(batiment_id, parking_id, z), ...] pour les arcs où z > 0.
+    Si `bornes` (nombre de bornes arrondi par parking) est donné, seuls les arcs vers des parkings équipés
+    sont gardés : le solveur laisse des z de l'ordre de sa tolérance sur des parkings où x vaut 0.
+    """
+    batiments, parkings = instance["batiments"], instance["parkings"]
+    arc_bat, arc_park = arcs_couverture(instance, Rmax)
+    arcs = sorted(
+        (j, i, z) for j, i, z in zip(arc_bat, arc_park, valeurs_z)
+        if z > 1e-9 and (bornes is None or bornes[i] > 0)
+    )
+    return [(batiments.ids[j], parkings.ids[i], z) for j, i, z in arcs]
+
+
+def ecrire_couverture(couverture_path, couverture):
+    """
+    Écrit la couverture par arc (voir `couverture_arcs`) dans un fichier CSV, lu en flux par l'export des solutions.
+    """
+    with open(couverture_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["batiment_id", "parking_id", "z"])
+        writer.writerows(couverture)
+
+
+def resoudre_mclp(instance, p, Rmax, temps_limite_ms=None, indice=None, couverture=False):
+    """
+    Résout le MCLP sur une instance préparée par `preparer_instance`.
+
+    Args:
+        - instance (dict): Instance MCLP.
+        - p (int): Nombre maximal de bornes à implanter.
+        - Rmax (float): Distance maximale de couverture.
+        - temps_limite_ms (int, optional): Temps limite accordé au solveur, en millisecondes.
+        - indice (list, optional): Sites sélectionnés d'une solution voisine, donnés au solveur comme point de départ.
+        - couverture (bool): Renvoyer aussi la couverture affectée à chaque arc (voir `couverture_arcs`).
+
+    Returns:
+        - selected_sites : list, parkings sélectionnés avec le nombre de bornes à implanter.
+        - max_coverage : float, couverture totale maximale.
+        - (si couverture) arcs_couverts : list, [(batiment_id, parking_id, z), ...].
+
+    Raises:
+        - TimeoutError : le temps limite est atteint avant la preuve d'optimalité.
+    """
+    from ortools.linear_solver import pywraplp # import local : seule la résolution a besoin d'ortools
+
+    parkings = instance["parkings"]
+    C = parkings["max_bornes"]
+
+    # Initialisation du solveur
+    solver = pywraplp.Solver.CreateSolver('SCIP')
+    if not solver:
+        raise Exception("Erreur lors de la création du solveur.")
+    if temps_limite_ms is not None:
+        solver.SetTimeLimit(int(temps_limite_ms))
+
+    x, _, z, _ = construire_modele(solver, instance, p, Rmax)
+
+    # Point de départ du solveur à partir d'une solution voisine (warm start)
+    if indice:
+        bornes_indice = {site["gml_id"]: site["nb_bornes_installees"] for site in indice}
+        solver.SetHint(x, [float(min(bornes_indice.get(parkings.ids[i], 0), C[i])) for i in range(len(parkings))])
 
     # Résolution
     status = solver.Solve()
     if status == pywraplp.Solver.OPTIMAL:
+        bornes = [int(round(var.solution_value())) for var in x]
         selected_sites = [
             {
-                "gml_id": i,
-                "nb_bornes_installees": int(x[i].solution_value()),
-                "geo_point": parking_info.get(i, None)
+                "gml_id": parkings.ids[i],
+                "nb_bornes_installees": bornes[i],
+                "geo_point": {"lon": parkings.lon[i], "lat": parkings.lat[i]}
             }
-            for i in site_ids if x[i].solution_value() > 0
+            for i in range(len(parkings)) if bornes[i] > 0
         ]
         max_coverage = solver.Objective().Value()
-        with open(selected_sites_path, 'w', encoding='utf-8') as f:
-            json.dump(selected_sites, f, ensure_ascii=False, indent=4)
+        if couverture:
+            return selected_sites, max_coverage, couverture_arcs(instance, Rmax, [var.solution_value() for var in z], bornes)
         return selected_sites, max_coverage
+    elif temps_limite_ms is not None and status in (pywraplp.Solver.FEASIBLE, pywraplp.Solver.NOT_SOLVED):
+        raise TimeoutError(f"Temps limite de {int(temps_limite_ms)} ms atteint avant la solution optimale.")
     else:
         raise Exception("Le solveur n'a pas trouvé de solution optimale.")
 
 
-def association_bornes_transfo(selected_sites_path, transfo_filtres_path, asso_tf_bornes_path, max_connections_per_transformer):
-    # Charger les données des fichiers JSON
-    with open(selected_sites_path, 'r') as f:
-        selected_sites = json.load(f)
-        
-    with open(transfo_filtres_path, 'r') as f:
-        transfos = json.load(f)
+def mclp_deloc(bat_file_path, parkings_file_path, mat_distances_file_path, selected_sites_path, p, Rmax, cache=None, index_spatial=None, couverture_path=None):
+    """
+    Résout le problème Maximal Covering Location Problem (MCLP) à partir de données JSON.
+
+    Args:
+        - bat_file_path (str): Chemin du fichier JSON contenant les bâtiments de la zone à couvrir.
+        - parkings_file_path (str): Chemin du fichier JSON contenant les parkings de la zone à couvrir.
+        - mat_distances_file_path (str): Chemin du fichier JSON contenant la matrice des distances entre les batiments de bat_file_path et les parkings de parkings_file_path.
+        - p (int): Nombre maximal de bornes à implanter.
+        - Rmax (float): Distance maximale de couverture.
+        - cache (CacheSolutions, optional): Cache disque des solutions (voir cache_solutions.py).
+        - index_spatial (str, optional): Dossier d'un index spatial (voir index_spatial.py) ; s'il est donné,
+          les listes de couverture y sont lues et la matrice des distances n'est pas chargée.
+        - couverture_path (str, optional): Fichier CSV où enregistrer la couverture affectée à chaque arc (voir `ecrire_couverture`).
+
+    Returns:
+        - selected_sites : dict, nombre de bornes à implanter dans chaque parking {parking_id: nombre_de_bornes}.
+        - max_coverage : float, couverture totale maximale.
+    """
+    # Charger les données des bâtiments
+    with open(bat_file_path, 'r', encoding='utf-8') as f:
+        data_bat = json.load(f)
+
+    # Charger les données des parkings
+    with open(parkings_file_path, 'r', encoding='utf-8') as f:
+        data_parkings = json.load(f)
     
+    if index_spatial is not None:
+        from index_spatial import IndexSpatial
+        instance = preparer_instance_index(data_bat, data_parkings, IndexSpatial(index_spatial), Rmax)
+    else:
+        # Charger la matrice des distances
+        T, meta = lire_matrice(mat_distances_file_path)
+        instance = preparer_instance(data_bat, data_parkings, T, meta)
+    couverture = couverture_path is not None
+    if cache is not None:
+        from cache_solutions import resoudre_mclp_avec_cache
+        resultat = resoudre_mclp_avec_cache(instance, p, Rmax, cache, couverture=couverture)
+    else:
+        resultat = resoudre_mclp(instance, p, Rmax, couverture=couverture)
+    selected_sites, max_coverage = resultat[:2]
+
+    with open(selected_sites_path, 'w', encoding='utf-8') as f:
+        json.dump(selected_sites, f, ensure_ascii=False, indent=4)
+    if couverture:
+        ecrire_couverture(couverture_path, resultat[2])
+    return selected_sites, max_coverage
+
+
+def associer_bornes_transfo(selected_sites, transfos, max_connections_per_transformer):
+    """
+    Associe chaque borne installée au transformateur non saturé le plus proche.
+
+    Args:
+        - selected_sites (list): Parkings sélectionnés (gml_id, nb_bornes_installees, geo_point).
+        - transfos (list): Transformateurs filtrés (gml_id, "Geo Point").
+        - max_connections_per_transformer (int): Nombre maximal de bornes par transformateur.
+
+    Returns:
+        - transfo_to_bornes_assoc : dict, {tf_id: [borne_id, ...]}.
+    """
+    from geopy.distance import geodesic # import local : seuls les raccordements ont besoin de geopy
+
+    sites = TableEntites.depuis_sites(selected_sites)
+    table_tf = TableEntites.depuis_transfos(transfos)
+
     # Initialiser la capacité des transformateurs
-    transfos_capacity = {tf["gml_id"]: 0 for tf in transfos}
-    
-    # Convertir les coordonnées des transformateurs en tuples (lat, lon)
-    for tf in transfos:
-        lat, lon = map(float, tf["Geo Point"].split(", "))
-        tf["geo_point"] = (lat, lon)
+    transfos_capacity = array('i', [0] * len(table_tf))
     
-    # Créer une structure de sortie
-    transfo_to_bornes_assoc = {tf["gml_id"]: [] for tf in transfos}
+    # Créer une structure de sortie, par indice de transformateur
+    transfo_to_bornes = [[] for _ in range(len(table_tf))]
     
     # Associer chaque borne à un transformateur
-    for parking in selected_sites:
-        parking_id = parking["gml_id"]
-        nb_bornes = parking["nb_bornes_installees"]
-        parking_point = (parking["geo_point"]["lat"], parking["geo_point"]["lon"])
+    for k in range(len(sites)):
+        parking_id = sites.ids[k]
+        parking_point = sites.point(k)
+        # Distances du parking aux transformateurs, calculées une seule fois pour toutes ses bornes
+        distances = [geodesic(parking_point, table_tf.point(t)).meters for t in range(len(table_tf))]
         
-        for i in range(nb_bornes):
+        for i in range(sites["nb_bornes_installees"][k]):
             # Trouver le transformateur le plus proche non saturé
             closest_tf = None
             closest_distance = float('inf')
             
-            for tf in transfos:
-                if transfos_capacity[tf["gml_id"]] < max_connections_per_transformer:  # Vérifier la saturation
-                    distance = geodesic(parking_point, tf["geo_point"]).meters
+            for t, distance in enumerate(distances):
+                if transfos_capacity[t] < max_connections_per_transformer:  # Vérifier la saturation
                     if distance < closest_distance:
                         closest_distance = distance
-                        closest_tf = tf
+                        closest_tf = t
             
-            if closest_tf:
+            if closest_tf is not None:
                 # Créer un identifiant unique pour la borne
                 borne_id = f"{parking_id}.borne_{i+1}"
                 
                 # Associer la borne au transformateur
-                transfo_to_bornes_assoc[closest_tf["gml_id"]].append(borne_id)
+                transfo_to_bornes[closest_tf].append(borne_id)
                 
                 # Augmenter la capacité utilisée du transformateur
-                transfos_capacity[closest_tf["gml_id"]] += 1
+                transfos_capacity[closest_tf] += 1
             else:
                 # Aucun transformateur disponible
                 raise ValueError(f"Aucun transformateur disponible pour la borne {i+1} du parking {parking_id}.")
+
+    return {table_tf.ids[t]: bornes for t, bornes in enumerate(transfo_to_bornes)}
+
+
+def arcs_transfo(parkings, table_tf, distance_max):
+    """
+    Arcs parking-transformateur à moins de `distance_max` (longueur de câble admissible), triés par distance.
+    Un filtre sur les écarts de latitude et de longitude évite le calcul géodésique des couples trop éloignés.
+
+    Returns:
+        - tuple : (array('i') des parkings, array('i') des transformateurs, array('d') des distances).
+    """
+    from geopy.distance import geodesic # import local : seuls les raccordements ont besoin de geopy
+
+    dlat_max = distance_max / 110500 # borne basse du nombre de mètres par degré de latitude
+    arcs = []
+    for i in range(len(parkings)):
+        lat, lon = parkings.point(i)
+        dlon_max = dlat_max / max(cos(radians(lat)), 1e-6)
+        for t in range(len(table_tf)):
+            if abs(table_tf.lat[t] - lat) > dlat_max or abs(table_tf.lon[t] - lon) > dlon_max:
+                continue
+            distance = geodesic((lat, lon), table_tf.point(t)).meters
+            if distance <= distance_max:
+                arcs.append((distance, i, t))
+    arcs.sort()
+    return array('i', (i for _, i, _ in arcs)), array('i', (t for _, _, t in arcs)), array('d', (d for d, _, _ in arcs))
+
+
+def resoudre_mclp_reseau(instance, transfos, p, Rmax, distance_cable_max, max_connections_per_transformer,
+                         puissance_tf_kw=None, puissance_borne_kw=22.0, temps_limite_ms=None):
+    """
+    Résout conjointement l'implantation des bornes et leur raccordement aux transformateurs.
+
+    Au MCLP s'ajoutent des variables entières w (nombre de bornes d'un parking raccordées à un transformateur),
+    créées uniquement pour les couples à moins de `distance_cable_max` : chaque borne installée doit être
+    raccordée, et chaque transformateur accepte au plus `max_connections_per_transformer` bornes (et au plus
+    `puissance_tf_kw / puissance_borne_kw` si sa puissance est précisée). Une fois la couverture maximale
+    trouvée, les bornes sont fixées et le raccordement est réoptimisé pour minimiser la longueur de câble.
+
+    Args:
+        - instance (dict): Instance MCLP (voir `preparer_instance`).
+        - transfos (list): Transformateurs filtrés (gml_id, "Geo Point").
+        - p (int): Nombre maximal de bornes à implanter.
+        - Rmax (float): Distance maximale de couverture.
+        - distance_cable_max (float): Distance maximale entre un parking et le transformateur qui l'alimente.
+        - max_connections_per_transformer (int): Nombre maximal de bornes par transformateur.
+        - puissance_tf_kw (float, optional): Puissance admissible d'un transformateur.
+        - puissance_borne_kw (float): Puissance d'une borne.
+        - temps_limite_ms (int, optional): Temps limite accordé au solveur, en millisecondes.
+
+    Returns:
+        - selected_sites : list, parkings sélectionnés avec le nombre de bornes à implanter.
+        - max_coverage : float, couverture totale maximale.
+        - transfo_to_bornes_assoc : dict, {tf_id: [borne_id, ...]}, au format de `associer_bornes_transfo`.
+        - arcs_couverts : list, couverture affectée à chaque arc (voir `couverture_arcs`).
+    """
+    from ortools.linear_solver import pywraplp # import local : seule la résolution a besoin d'ortools
+
+    parkings = instance["parkings"]
+    C = parkings["max_bornes"]
+    table_tf = TableEntites.depuis_transfos(transfos)
+
+    capacite_tf = max_connections_per_transformer
+    if puissance_tf_kw is not None:
+        capacite_tf = min(capacite_tf, int(puissance_tf_kw // puissance_borne_kw))
+
+    solver = pywraplp.Solver.CreateSolver('SCIP')
+    if not solver:
+        raise Exception("Erreur lors de la création du solveur.")
+    if temps_limite_ms is not None:
+        solver.SetTimeLimit(int(temps_limite_ms))
+
+    x, _, z, _ = construire_modele(solver, instance, p, Rmax)
+
+    # Raccordements possibles, uniquement à moins de distance_cable_max (un w par arc)
+    arc_park, arc_tf, arc_dist = arcs_transfo(parkings, table_tf, distance_cable_max)
+    w = [solver.IntVar(0, C[i], "") for i in arc_park]
+    arcs_par_parking = [[] for _ in range(len(parkings))]
+    arcs_par_tf = [[] for _ in range(len(table_tf))]
+    for b, (i, t) in enumerate(zip(arc_park, arc_tf)):
+        arcs_par_parking[i].append(b)
+        arcs_par_tf[t].append(b)
+
+    for i in range(len(parkings)):
+        solver.Add(solver.Sum(w[b] for b in arcs_par_parking[i]) == x[i])  # Toute borne installée est raccordée
+    for t in range(len(table_tf)):
+        if arcs_par_tf[t]:
+            solver.Add(solver.Sum(w[b] for b in arcs_par_tf[t]) <= capacite_tf)  # Capacité du transformateur
+
+    status = solver.Solve()
+    if temps_limite_ms is not None and status in (pywraplp.Solver.FEASIBLE, pywraplp.Solver.NOT_SOLVED):
+        raise TimeoutError(f"Temps limite de {int(temps_limite_ms)} ms atteint avant la solution optimale.")
+    if status != pywraplp.Solver.OPTIMAL:
+        raise Exception("Le solveur n'a pas trouvé de solution optimale.")
+    max_coverage = solver.Objective().Value()
+    bornes = [int(round(var.solution_value())) for var in x]
+    arcs_couverts = couverture_arcs(instance, Rmax, [var.solution_value() for var in z], bornes)
+
+    # Bornes fixées : raccordement de longueur de câble minimale
+    for i in range(len(parkings)):
+        x[i].SetBounds(bornes[i], bornes[i])
+    solver.Minimize(solver.Sum(arc_dist[b] * w[b] for b in range(len(w))))
+    if solver.Solve() != pywraplp.Solver.OPTIMAL:
+        raise Exception("Le solveur n'a pas trouvé de raccordement optimal.")
+
+    selected_sites = [
+        {
+            "gml_id": parkings.ids[i],
+            "nb_bornes_installees": bornes[i],
+            "geo_point": {"lon": parkings.lon[i], "lat": parkings.lat[i]}
+        }
+        for i in range(len(parkings)) if bornes[i] > 0
+    ]
+
+    # Numérotation des bornes de chaque parking, du transformateur le plus proche au plus éloigné
+    transfo_to_bornes = [[] for _ in range(len(table_tf))]
+    numero = [0] * len(parkings)
+    for b, (i, t) in enumerate(zip(arc_park, arc_tf)):
+        for _ in range(int(round(w[b].solution_value()))):
+            numero[i] += 1
+            transfo_to_bornes[t].append(f"{parkings.ids[i]}.borne_{numero[i]}")
+
+    return selected_sites, max_coverage, {table_tf.ids[t]: bornes_tf for t, bornes_tf in enumerate(transfo_to_bornes)}, arcs_couverts
+
+
+def mclp_deloc_reseau(bat_file_path, parkings_file_path, mat_distances_file_path, transfo_filtres_path, selected_sites_path, asso_tf_bornes_path,
+                      p, Rmax, distance_cable_max, max_connections_per_transformer, puissance_tf_kw=None, puissance_borne_kw=22.0, couverture_path=None):
+    """
+    Variante de mclp_deloc résolvant conjointement implantation et raccordement (voir `resoudre_mclp_reseau`) :
+    la solution est raccordable par construction, sans passer par `association_bornes_transfo`.
+    La couverture par arc est enregistrée dans `couverture_path` si ce chemin est donné.
+
+    Returns:
+        - selected_sites : list, parkings sélectionnés avec le nombre de bornes à implanter.
+        - max_coverage : float, couverture totale maximale.
+    """
+    with open(bat_file_path, 'r', encoding='utf-8') as f:
+        data_bat = json.load(f)
+    with open(parkings_file_path, 'r', encoding='utf-8') as f:
+        data_parkings = json.load(f)
+    T, meta = lire_matrice(mat_distances_file_path)
+    with open(transfo_filtres_path, 'r', encoding='utf-8') as f:
+        transfos = json.load(f)
+
+    instance = preparer_instance(data_bat, data_parkings, T, meta)
+    selected_sites, max_coverage, transfo_to_bornes_assoc, arcs_couverts = resoudre_mclp_reseau(
+        instance, transfos, p, Rmax, distance_cable_max, max_connections_per_transformer,
+        puissance_tf_kw=puissance_tf_kw, puissance_borne_kw=puissance_borne_kw
+    )
+
+    with open(selected_sites_path, 'w', encoding='utf-8') as f:
+        json.dump(selected_sites, f, ensure_ascii=False, indent=4)
+    with open(asso_tf_bornes_path, 'w') as f:
+        json.dump(transfo_to_bornes_assoc, f, indent=4)
+    if couverture_path is not None:
+        ecrire_couverture(couverture_path, arcs_couverts)
+
+    print("Implantation et raccordement résolus conjointement. Résultats enregistrés dans", selected_sites_path, "et", asso_tf_bornes_path)
+    return selected_sites, max_coverage
+
+
+def association_bornes_transfo(selected_sites_path, transfo_filtres_path, asso_tf_bornes_path, max_connections_per_transformer):
+    # Charger les données des fichiers JSON
+    with open(selected_sites_path, 'r') as f:
+        selected_sites = json.load(f)
+        
+    with open(transfo_filtres_path, 'r') as f:
+        transfos = json.load(f)
+
+    transfo_to_bornes_assoc = associer_bornes_transfo(selected_sites, transfos, max_connections_per_transformer)
     
     # Sauvegarder la sortie dans le fichier spécifié
     with open(asso_tf_bornes_path, 'w') as f:
@@ -157,6 +523,7 @@ if __name__ == '__main__':
     p=10
     Rmax=500
     cout_unitaire = 3000
+    max_connections_per_transformer = 3
 
     bat_file = "../batiments-rennes-metropole.json" # fichier volumineux, mis à part pour pouvoir faire des git push
     iris_file = "data_global/iris_version_rennes_metropole.json"
@@ -173,7 +540,7 @@ if __name__ == '__main__':
     asso_tf_bornes_path = "data_local/SOLUTION_asso_tf_bornes" + zone_id.split(".")[0] + "_" + zone_id.split(".")[1] + ".json"
 
     selected_sites, rapport_couverture_cout = mclp_deloc(bat_filtres, parkings_filtres, matrice_distances_bat_park, selected_sites_path, p, Rmax)
-    association_bornes_transfo(selected_sites_path, transfo_filtres_path, asso_tf_bornes_path)
+    association_bornes_transfo(selected_sites_path, transfo_filtres_path, asso_tf_bornes_path, max_connections_per_transformer)
 
     print("Sites sélectionnés:", selected_sites)
     print("Couverture maximale:", rapport_couverture_cout)
@@ -0,0 +1,167 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+
+class Etape:
+    """
+    Étape d'un pipeline : une fonction, ses arguments et les étapes dont elle dépend.
+    """
+
+    __slots__ = ("nom", "fonction", "args", "kwargs", "dependances", "processus")
+
+    def __init__(self, nom, fonction, args=(), kwargs=None, dependances=(), processus=False):
+        """
+        Args:
+            - nom (str): Nom unique de l'étape.
+            - fonction (callable): Fonction exécutée (fonction de module si processus=True, pour être sérialisable).
+            - args (tuple), kwargs (dict): Arguments de la fonction.
+            - dependances (iterable): Noms des étapes devant être terminées avant celle-ci.
+            - processus (bool): Exécuter l'étape dans un processus séparé (calcul lourd ou bibliothèque
+              non thread-safe comme matplotlib) plutôt que dans un thread (lectures/écritures de fichiers).
+        """
+        self.nom = nom
+        self.fonction = fonction
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self.dependances = tuple(dependances)
+        self.processus = processus
+
+
+def executer_etape(fonction, args, kwargs):
+    """
+    Exécute une étape dans son thread ou processus et horodate son début et sa fin réels (horloge
+    murale, comparable entre processus), sans compter l'attente dans la file du pool.
+
+    Returns:
+        - tuple : (valeur renvoyée par la fonction, début, fin)
+    """
+    debut = time.time()
+    resultat = fonction(*args, **kwargs)
+    return resultat, debut, time.time()
+
+
+def ordre_topologique(etapes):
+    """
+    Vérifie le graphe des dépendances (étapes inconnues, cycles) et renvoie les noms dans un ordre topologique.
+    """
+    par_nom = {etape.nom: etape for etape in etapes}
+    if len(par_nom) != len(etapes):
+        raise ValueError("Noms d'étapes en double dans le pipeline.")
+    for etape in etapes:
+        inconnues = [d for d in etape.dependances if d not in par_nom]
+        if inconnues:
+            raise ValueError(f"L'étape '{etape.nom}' dépend d'étapes inconnues : {inconnues}")
+
+    ordre, etat = [], {}
+    def visiter(nom, chemin):
+        if etat.get(nom) == "fait":
+            return
+        if etat.get(nom) == "en_cours":
+            raise ValueError(f"Cycle dans le pipeline : {' -> '.join(chemin + [nom])}")
+        etat[nom] = "en_cours"
+        for dependance in par_nom[nom].dependances:
+            visiter(dependance, chemin + [nom])
+        etat[nom] = "fait"
+        ordre.append(nom)
+
+    for etape in etapes:
+        visiter(etape.nom, [])
+    return ordre
+
+
+def chemin_critique(etapes, durees):
+    """
+    Chemin le plus long (en durée) du graphe des dépendances : c'est lui qui borne la durée totale du pipeline.
+
+    Returns:
+        - tuple : (liste des noms d'étapes du chemin, durée totale en secondes)
+    """
+    par_nom = {etape.nom: etape for etape in etapes}
+    fin_au_plus_tot, predecesseur = {}, {}
+    for nom in ordre_topologique(etapes):
+        debut, pred = 0.0, None
+        for dependance in par_nom[nom].dependances:
+            if fin_au_plus_tot[dependance] > debut:
+                debut, pred = fin_au_plus_tot[dependance], dependance
+        fin_au_plus_tot[nom] = debut + durees[nom]
+        predecesseur[nom] = pred
+
+    nom = max(fin_au_plus_tot, key=fin_au_plus_tot.get)
+    total = fin_au_plus_tot[nom]
+    chemin = []
+    while nom is not None:
+        chemin.append(nom)
+        nom = predecesseur[nom]
+    return chemin[::-1], total
+
+
+def executer_pipeline(etapes, nb_workers=4, verbeux=True):
+    """
+    Exécute les étapes d'un pipeline dès que leurs dépendances sont terminées, en parallèle
+    sur un pool de threads (et un pool de processus pour les étapes marquées `processus`).
+
+    Args:
+        - etapes (list): Liste d'objets Etape.
+        - nb_workers (int): Nombre maximal d'étapes exécutées simultanément dans chaque pool.
+        - verbeux (bool): Afficher le déroulement et le chemin critique.
+
+    Returns:
+        - resultats : dict, {nom_etape: valeur renvoyée par la fonction}.
+        - rapport : dict, débuts, durées et attentes (soumission -> début) des étapes, durée totale et chemin critique.
+    """
+    ordre_topologique(etapes) # validation du graphe
+    par_nom = {etape.nom: etape for etape in etapes}
+    restantes = {etape.nom: set(etape.dependances) for etape in etapes}
+
+    resultats, soumissions, debuts, durees = {}, {}, {}, {}
+    en_cours = {}
+    t0 = time.time()
+
+    with ThreadPoolExecutor(max_workers=nb_workers) as threads, ProcessPoolExecutor(max_workers=nb_workers) as processus:
+
+        def lancer_pretes():
+            pretes = [nom for nom, deps in restantes.items() if not deps]
+            for nom in pretes:
+                del restantes[nom]
+                etape = par_nom[nom]
+                pool = processus if etape.processus else threads
+                soumissions[nom] = time.time() - t0
+                if verbeux:
+                    print(f"[pipeline] lancement de '{nom}' à {soumissions[nom]:.2f} s")
+                en_cours[pool.submit(executer_etape, etape.fonction, etape.args, etape.kwargs)] = nom
+
+        lancer_pretes()
+        while en_cours:
+            terminees, _ = wait(list(en_cours), return_when=FIRST_COMPLETED)
+            for future in terminees:
+                nom = en_cours.pop(future)
+                try:
+                    resultats[nom], debut, fin = future.result()
+                except Exception:
+                    for autre in en_cours:
+                        autre.cancel()
+                    print(f"[pipeline] échec de l'étape '{nom}'.")
+                    raise
+                debuts[nom], durees[nom] = debut - t0, fin - debut
+                if verbeux:
+                    print(f"[pipeline] fin de '{nom}' ({durees[nom]:.2f} s, après {debuts[nom] - soumissions[nom]:.2f} s d'attente)")
+                for deps in restantes.values():
+                    deps.discard(nom)
+            lancer_pretes()
+
+    duree_totale = time.time() - t0
+    chemin, duree_chemin = chemin_critique(etapes, durees)
+    rapport = {
+        "debuts_s": debuts,
+        "durees_s": durees,
+        "attentes_s": {nom: debuts[nom] - soumissions[nom] for nom in debuts},
+        "duree_totale_s": duree_totale,
+        "duree_sequentielle_s": sum(durees.values()),
+        "chemin_critique": chemin,
+        "duree_chemin_critique_s": duree_chemin,
+    }
+
+    if verbeux:
+        print(f"[pipeline] durée totale : {duree_totale:.2f} s (somme des étapes : {rapport['duree_sequentielle_s']:.2f} s)")
+        print(f"[pipeline] chemin critique ({duree_chemin:.2f} s) : {' -> '.join(chemin)}")
+    return resultats, rapport
@@ -0,0 +1,179 @@
+import json
+import heapq
+from math import radians, sin, cos, asin, sqrt
+
+
+RAYON_TERRE = 6371008.8 # rayon moyen de la Terre en mètres
+
+
+def distance_haversine(lat1, lon1, lat2, lon2):
+    """
+    Distance à vol d'oiseau (en mètres) entre deux points, suffisante pour les distances de rattachement au réseau.
+    """
+    phi1, phi2 = radians(lat1), radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = radians(lon2 - lon1)
+    h = sin(dphi / 2) ** 2 + cos(phi1) * cos(phi2) * sin(dlambda / 2) ** 2
+    return 2 * RAYON_TERRE * asin(sqrt(h))
+
+
+def charger_graphe(graphe_file_path):
+    """
+    Charge un graphe piéton au format JSON, obtenu par conversion hors ligne d'un extrait OSM :
+
+        {
+            "noeuds": {"<id_noeud>": [lon, lat], ...},
+            "aretes": [["<id_noeud_1>", "<id_noeud_2>", longueur_m], ...]
+        }
+
+    Les arêtes sont considérées comme non orientées (réseau piéton). Si la longueur est absente,
+    elle est calculée à vol d'oiseau entre les deux noeuds.
+
+    Args:
+        - graphe_file_path (str): Chemin du fichier JSON du graphe.
+
+    Returns:
+        - noeuds : dict, {id_noeud: (lat, lon)}.
+        - adjacence : dict, {id_noeud: [(id_voisin, longueur_m), ...]}.
+    """
+    with open(graphe_file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    noeuds = {str(id_noeud): (coord[1], coord[0]) for id_noeud, coord in data.get("noeuds", {}).items()}
+    adjacence = {id_noeud: [] for id_noeud in noeuds}
+
+    for arete in data.get("aretes", []):
+        u, v = str(arete[0]), str(arete[1])
+        if u not in noeuds or v not in noeuds:
+            continue
+        longueur = arete[2] if len(arete) > 2 and arete[2] is not None else distance_haversine(*noeuds[u], *noeuds[v])
+        adjacence[u].append((v, longueur))
+        adjacence[v].append((u, longueur))
+
+    return noeuds, adjacence
+
+
+class IndexNoeuds:
+    """
+    Grille régulière (en degrés) sur les noeuds du graphe, pour rattacher rapidement un point à son noeud le plus proche.
+    """
+
+    def __init__(self, noeuds, pas=0.002):
+        """
+        Args:
+            - noeuds (dict): {id_noeud: (lat, lon)}.
+            - pas (float): Taille d'une cellule de la grille, en degrés (~150 à 220 m à Rennes).
+        """
+        self.noeuds = noeuds
+        self.pas = pas
+        self.cellules = {}
+        for id_noeud, (lat, lon) in noeuds.items():
+            self.cellules.setdefault(self.cellule(lat, lon), []).append(id_noeud)
+
+    def cellule(self, lat, lon):
+        return (int(lat // self.pas), int(lon // self.pas))
+
+    def plus_proche(self, lat, lon, anneaux_max=10):
+        """
+        Renvoie le noeud le plus proche d'un point et la distance de rattachement (en mètres).
+        La recherche s'étend par anneaux de cellules autour du point, jusqu'à `anneaux_max`.
+
+        Returns:
+            - tuple : (id_noeud, distance_m), ou (None, inf) si aucun noeud n'est trouvé.
+        """
+        ci, cj = self.cellule(lat, lon)
+        meilleur, meilleure_distance = None, float('inf')
+
+        for k in range(anneaux_max + 1):
+            for i in range(ci - k, ci + k + 1):
+                for j in range(cj - k, cj + k + 1):
+                    if max(abs(i - ci), abs(j - cj)) != k:
+                        continue # seules les cellules de l'anneau k sont nouvelles
+                    for id_noeud in self.cellules.get((i, j), []):
+                        distance = distance_haversine(lat, lon, *self.noeuds[id_noeud])
+                        if distance < meilleure_distance:
+                            meilleur, meilleure_distance = id_noeud, distance
+            # Un noeud hors des anneaux déjà parcourus est au moins à k cellules du point
+            if meilleur is not None and meilleure_distance <= k * self.pas * 111000 * cos(radians(lat)):
+                break
+
+        return meilleur, meilleure_distance
+
+
+def dijkstra_borne(adjacence, sources, Rmax):
+    """
+    Dijkstra multi-sources interrompu au-delà de Rmax.
+
+    Args:
+        - adjacence (dict): {id_noeud: [(id_voisin, longueur_m), ...]}.
+        - sources (dict): {id_noeud: distance_initiale_m}.
+        - Rmax (float): Distance au-delà de laquelle l'exploration s'arrête.
+
+    Returns:
+        - dict : {id_noeud: distance_m} pour tous les noeuds atteints à distance <= Rmax.
+    """
+    distances = {}
+    tas = [(d, n) for n, d in sources.items() if d <= Rmax]
+    heapq.heapify(tas)
+
+    while tas:
+        d, n = heapq.heappop(tas)
+        if n in distances:
+            continue
+        distances[n] = d
+        for voisin, longueur in adjacence[n]:
+            nd = d + longueur
+            if nd <= Rmax and voisin not in distances:
+                heapq.heappush(tas, (nd, voisin))
+
+    return distances
+
+
+def distances_reseau(points_batiments, points_parkings, noeuds, adjacence, Rmax):
+    """
+    Calcule les distances piétonnes bâtiments-parkings inférieures ou égales à Rmax.
+
+    Chaque point est rattaché à son noeud le plus proche ; la distance totale est
+    rattachement du parking + chemin dans le graphe + rattachement du bâtiment.
+    Un Dijkstra borné à Rmax est lancé depuis chaque noeud portant au moins un parking
+    (les parkings rattachés au même noeud partagent la même exploration).
+
+    Args:
+        - points_batiments (list): [(gml_id, (lat, lon)), ...].
+        - points_parkings (list): [(gml_id, (lat, lon)), ...].
+        - noeuds (dict), adjacence (dict): Graphe renvoyé par `charger_graphe`.
+        - Rmax (float): Distance maximale conservée.
+
+    Returns:
+        - dict : {batiment_id: {parking_id: distance_m}} (matrice creuse).
+    """
+    index = IndexNoeuds(noeuds)
+
+    # Rattacher les bâtiments aux noeuds du graphe
+    batiments_par_noeud = {}
+    for id_batiment, (lat, lon) in points_batiments:
+        noeud, rattachement = index.plus_proche(lat, lon)
+        if noeud is not None and rattachement <= Rmax:
+            batiments_par_noeud.setdefault(noeud, []).append((id_batiment, rattachement))
+
+    # Regrouper les parkings par noeud de rattachement
+    parkings_par_noeud = {}
+    for id_parking, (lat, lon) in points_parkings:
+        noeud, rattachement = index.plus_proche(lat, lon)
+        if noeud is not None and rattachement <= Rmax:
+            parkings_par_noeud.setdefault(noeud, []).append((id_parking, rattachement))
+
+    matrice = {id_batiment: {} for id_batiment, _ in points_batiments}
+    for noeud_parking, parkings in parkings_par_noeud.items():
+        # L'exploration est bornée par le plus petit rattachement des parkings de ce noeud
+        rattachement_min = min(rattachement for _, rattachement in parkings)
+        atteints = dijkstra_borne(adjacence, {noeud_parking: 0.0}, Rmax - rattachement_min)
+
+        for noeud, d_graphe in atteints.items():
+            for id_batiment, rattachement_bat in batiments_par_noeud.get(noeud, []):
+                for id_parking, rattachement_park in parkings:
+                    distance = rattachement_park + d_graphe + rattachement_bat
+                    if distance <= Rmax:
+                        matrice[id_batiment][id_parking] = distance
+
+    return matrice
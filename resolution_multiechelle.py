@@ -0,0 +1,297 @@
+import json
+import time
+from math import cos, radians, sqrt, ceil
+from array import array
+
+import mclp
+from entites import TableEntites, lire_matrice
+
+
+RAYON_TERRE_M = 6371000.0
+
+
+class GrilleHexagonale:
+    """
+    Grille hexagonale (hexagones à sommet en haut, coordonnées axiales q, r) sur une projection
+    équirectangulaire locale, suffisante à l'échelle d'une métropole.
+    """
+
+    def __init__(self, taille_m, lat_ref):
+        """
+        Args:
+            - taille_m (float): Rayon des hexagones (distance centre-sommet), en mètres.
+            - lat_ref (float): Latitude de référence de la projection.
+        """
+        self.taille = taille_m
+        self.echelle_x = RAYON_TERRE_M * cos(radians(lat_ref)) * radians(1)
+        self.echelle_y = RAYON_TERRE_M * radians(1)
+
+    def cellule(self, lat, lon):
+        """
+        Coordonnées axiales (q, r) de l'hexagone contenant le point.
+        """
+        x, y = lon * self.echelle_x, lat * self.echelle_y
+        q = (sqrt(3) / 3 * x - y / 3) / self.taille
+        r = (2 / 3 * y) / self.taille
+        # Arrondi en coordonnées cubiques
+        s = -q - r
+        rq, rr, rs = round(q), round(r), round(s)
+        dq, dr, ds = abs(rq - q), abs(rr - r), abs(rs - s)
+        if dq > dr and dq > ds:
+            rq = -rr - rs
+        elif dr > ds:
+            rr = -rq - rs
+        return (rq, rr)
+
+    def voisines(self, cellule, anneaux):
+        """
+        Hexagones à au plus `anneaux` pas de `cellule` (cellule comprise).
+        """
+        q, r = cellule
+        return [
+            (q + dq, r + dr)
+            for dq in range(-anneaux, anneaux + 1)
+            for dr in range(max(-anneaux, -dq - anneaux), min(anneaux, -dq + anneaux) + 1)
+        ]
+
+    def anneaux_pour_distance(self, distance):
+        """
+        Nombre d'anneaux à parcourir pour atteindre tous les points à moins de `distance` d'un point d'un hexagone.
+        """
+        return int(ceil(distance / (sqrt(3) * self.taille))) + 1
+
+
+def agreger_demande(batiments, grille):
+    """
+    Agrège la demande des bâtiments par hexagone : une pseudo-entité par hexagone non vide,
+    placée au barycentre de la demande.
+
+    Returns:
+        - hexagones : TableEntites, avec l'attribut `nb_ve_potentiel` (somme des demandes).
+        - cellules_batiments : list, cellule (q, r) de chaque bâtiment.
+    """
+    nb_ve = batiments["nb_ve_potentiel"]
+    cellules_batiments = [grille.cellule(batiments.lat[j], batiments.lon[j]) for j in range(len(batiments))]
+
+    sommes = {} # cellule -> [demande, somme lat pondérée, somme lon pondérée]
+    for j, cellule in enumerate(cellules_batiments):
+        somme = sommes.setdefault(cellule, [0.0, 0.0, 0.0])
+        somme[0] += nb_ve[j]
+        somme[1] += nb_ve[j] * batiments.lat[j]
+        somme[2] += nb_ve[j] * batiments.lon[j]
+
+    cellules = list(sommes)
+    hexagones = TableEntites(
+        [f"hex_{q}_{r}" for q, r in cellules],
+        [sommes[c][1] / sommes[c][0] for c in cellules],
+        [sommes[c][2] / sommes[c][0] for c in cellules],
+        nb_ve_potentiel=('d', [sommes[c][0] for c in cellules]),
+    )
+    return hexagones, cellules_batiments
+
+
+def instance_agregee(hexagones, cellules_batiments, instance, Rmax):
+    """
+    Instance MCLP grossière : demande agrégée par hexagone, et un arc hexagone-parking dès qu'un bâtiment
+    de l'hexagone est couvert par le parking, à la plus petite distance des arcs fins correspondants.
+    Les arcs grossiers sont ainsi de la même nature que ceux de l'instance complète (vol d'oiseau,
+    distances à pied ou index spatial).
+    """
+    indice_hexagone = [hexagones.indice(f"hex_{q}_{r}") for q, r in cellules_batiments]
+
+    distances = {} # (hexagone, parking) -> plus petite distance d'un bâtiment de l'hexagone au parking
+    k = len(mclp.arcs_couverture(instance, Rmax)[0])
+    for j, i, distance in zip(instance["arc_bat"][:k], instance["arc_park"][:k], instance["arc_dist"][:k]):
+        cle = (indice_hexagone[j], i)
+        if distance < distances.get(cle, Rmax + 1):
+            distances[cle] = distance
+    arcs = sorted((distance, h, i) for (h, i), distance in distances.items())
+
+    return {
+        "batiments": hexagones,
+        "parkings": instance["parkings"],
+        "arc_bat": array('i', (h for _, h, _ in arcs)),
+        "arc_park": array('i', (i for _, _, i in arcs)),
+        "arc_dist": array('d', (d for d, _, _ in arcs)),
+        "source_distances": instance["source_distances"],
+        "rayon_max": Rmax,
+    }
+
+
+def sous_instance(instance, batiments_gardes, parkings_gardes):
+    """
+    Restreint une instance MCLP à un sous-ensemble de bâtiments et de parkings (indices des tables),
+    en conservant l'ordre des arcs (donc leur tri par distance).
+    """
+    def restreindre(table, indices):
+        return TableEntites(
+            [table.ids[k] for k in indices],
+            [table.lat[k] for k in indices],
+            [table.lon[k] for k in indices],
+            **{nom: (valeurs.typecode, [valeurs[k] for k in indices]) for nom, valeurs in table.attributs.items()}
+        )
+
+    nouvel_indice_bat = {j: k for k, j in enumerate(batiments_gardes)}
+    nouvel_indice_park = {i: k for k, i in enumerate(parkings_gardes)}
+    arc_bat, arc_park, arc_dist = array('i'), array('i'), array('d')
+    for j, i, distance in zip(instance["arc_bat"], instance["arc_park"], instance["arc_dist"]):
+        if j in nouvel_indice_bat and i in nouvel_indice_park:
+            arc_bat.append(nouvel_indice_bat[j])
+            arc_park.append(nouvel_indice_park[i])
+            arc_dist.append(distance)
+
+    return {
+        "batiments": restreindre(instance["batiments"], batiments_gardes),
+        "parkings": restreindre(instance["parkings"], parkings_gardes),
+        "arc_bat": arc_bat,
+        "arc_park": arc_park,
+        "arc_dist": arc_dist,
+        "source_distances": instance["source_distances"],
+        "rayon_max": instance["rayon_max"],
+    }
+
+
+def flot_solution(instance, Rmax, selected_sites):
+    """
+    Flot maximal, sur l'instance complète, à bornes fixées par une solution : sa valeur est la couverture
+    exacte de la solution, et le flot sur chaque arc la couverture qui lui est affectée.
+    """
+    from analyse_marginale import FlotCouverture
+
+    parkings = instance["parkings"]
+    bornes_installees = {site["gml_id"]: site["nb_bornes_installees"] for site in selected_sites}
+    return FlotCouverture(instance, Rmax, [bornes_installees.get(parkings.ids[i], 0) for i in range(len(parkings))])
+
+
+def resoudre_multiechelle(instance, p, Rmax, taille_hexagone=None, anneaux=1, temps_limite_ms=None, couverture=False):
+    """
+    Résolution grossière puis fine du MCLP :
+        1. la demande est agrégée sur une grille hexagonale et le MCLP est résolu sur les hexagones ;
+        2. les zones prometteuses sont les hexagones couverts par les parkings retenus, élargies de `anneaux` anneaux ;
+        3. le MCLP est résolu au niveau des bâtiments, restreint à ces zones, à partir de la solution grossière.
+
+    Args:
+        - instance (dict): Instance MCLP complète (voir mclp.preparer_instance).
+        - p (int): Nombre maximal de bornes à implanter.
+        - Rmax (float): Distance maximale de couverture.
+        - taille_hexagone (float, optional): Rayon des hexagones en mètres (par défaut Rmax).
+        - anneaux (int): Nombre d'anneaux d'hexagones ajoutés autour des zones prometteuses.
+        - temps_limite_ms (int, optional): Temps limite de chaque résolution, en millisecondes.
+        - couverture (bool): Renvoyer aussi la couverture affectée à chaque arc (voir mclp.couverture_arcs).
+
+    Returns:
+        - selected_sites : list, parkings sélectionnés avec le nombre de bornes à implanter.
+        - max_coverage : float, couverture de la solution sur l'instance complète.
+        - rapport : dict, tailles des instances et durées des deux niveaux.
+        - (si couverture) arcs_couverts : list, [(batiment_id, parking_id, z), ...].
+    """
+    batiments, parkings = instance["batiments"], instance["parkings"]
+    if len(batiments) == 0:
+        return ([], 0.0, {}, []) if couverture else ([], 0.0, {})
+    grille = GrilleHexagonale(taille_hexagone or Rmax, sum(batiments.lat) / len(batiments))
+
+    # Niveau grossier
+    t0 = time.perf_counter()
+    hexagones, cellules_batiments = agreger_demande(batiments, grille)
+    grossiere = instance_agregee(hexagones, cellules_batiments, instance, Rmax)
+    sites_grossiers, couverture_grossiere = mclp.resoudre_mclp(grossiere, p, Rmax, temps_limite_ms=temps_limite_ms)
+    duree_grossiere = time.perf_counter() - t0
+
+    # Zones prometteuses : hexagones couverts par les parkings retenus, élargis
+    retenus = {parkings.indice(site["gml_id"]) for site in sites_grossiers}
+    cellules_couvertes = {
+        grille.cellule(*hexagones.point(h))
+        for h, i in zip(*mclp.arcs_couverture(grossiere, Rmax)) if i in retenus
+    }
+    cellules_couvertes.update(grille.cellule(parkings.lat[i], parkings.lon[i]) for i in retenus)
+    zone = {voisine for cellule in cellules_couvertes for voisine in grille.voisines(cellule, anneaux)}
+
+    # Niveau fin : bâtiments et parkings des zones prometteuses
+    t0 = time.perf_counter()
+    batiments_gardes = [j for j, cellule in enumerate(cellules_batiments) if cellule in zone]
+    parkings_gardes = [i for i in range(len(parkings)) if grille.cellule(parkings.lat[i], parkings.lon[i]) in zone]
+    fine = sous_instance(instance, batiments_gardes, parkings_gardes)
+    selected_sites, _ = mclp.resoudre_mclp(fine, p, Rmax, temps_limite_ms=temps_limite_ms, indice=sites_grossiers)
+    duree_fine = time.perf_counter() - t0
+
+    # Les parkings retenus couvrent aussi des bâtiments hors zone : couverture recalculée sur l'instance complète
+    flot = flot_solution(instance, Rmax, selected_sites)
+    max_coverage = flot.couverture()
+
+    rapport = {
+        "taille_hexagone_m": grille.taille,
+        "anneaux": anneaux,
+        "grossier": {
+            "nb_hexagones": len(hexagones),
+            "nb_arcs": len(grossiere["arc_bat"]),
+            "couverture_estimee": couverture_grossiere,
+            "duree_s": duree_grossiere,
+        },
+        "fin": {
+            "nb_batiments": len(batiments_gardes),
+            "nb_parkings": len(parkings_gardes),
+            "nb_arcs": len(mclp.arcs_couverture(fine, Rmax)[0]),
+            "duree_s": duree_fine,
+        },
+        "couverture": max_coverage,
+    }
+    if couverture:
+        return selected_sites, max_coverage, rapport, mclp.couverture_arcs(instance, Rmax, flot.flot, flot.bornes)
+    return selected_sites, max_coverage, rapport
+
+
+def mclp_multiechelle(bat_file_path, parkings_file_path, mat_distances_file_path, selected_sites_path, rapport_path,
+                      p, Rmax, taille_hexagone=None, anneaux=1, comparer=False, couverture_path=None):
+    """
+    Variante de mclp_deloc résolue par agrégation hexagonale puis raffinement (voir resoudre_multiechelle).
+    Avec `comparer`, le MCLP complet est aussi résolu pour mesurer l'écart de couverture et le gain de temps.
+
+    Args:
+        - bat_file_path (str): Chemin du fichier JSON des bâtiments filtrés.
+        - parkings_file_path (str): Chemin du fichier JSON des parkings filtrés.
+        - mat_distances_file_path (str): Chemin de la matrice des distances bâtiments-parkings.
+        - selected_sites_path (str): Chemin du fichier JSON des sites sélectionnés.
+        - rapport_path (str): Chemin du fichier JSON du rapport (tailles, durées, écart à la résolution complète).
+        - p (int): Nombre maximal de bornes à implanter.
+        - Rmax (float): Distance maximale de couverture.
+        - taille_hexagone (float, optional): Rayon des hexagones en mètres (par défaut Rmax).
+        - anneaux (int): Nombre d'anneaux d'hexagones ajoutés autour des zones prometteuses.
+        - comparer (bool): Résoudre aussi le MCLP complet et rapporter l'écart.
+        - couverture_path (str, optional): Fichier CSV où enregistrer la couverture affectée à chaque arc.
+
+    Returns:
+        - selected_sites : list, parkings sélectionnés avec le nombre de bornes à implanter.
+        - max_coverage : float, couverture totale.
+    """
+    with open(bat_file_path, 'r', encoding='utf-8') as f:
+        data_bat = json.load(f)
+    with open(parkings_file_path, 'r', encoding='utf-8') as f:
+        data_parkings = json.load(f)
+    T, meta = lire_matrice(mat_distances_file_path)
+
+    instance = mclp.preparer_instance(data_bat, data_parkings, T, meta)
+    selected_sites, max_coverage, rapport, *arcs_couverts = resoudre_multiechelle(
+        instance, p, Rmax, taille_hexagone=taille_hexagone, anneaux=anneaux, couverture=couverture_path is not None
+    )
+
+    if comparer:
+        t0 = time.perf_counter()
+        _, couverture_complete = mclp.resoudre_mclp(instance, p, Rmax)
+        rapport["complet"] = {
+            "nb_arcs": len(mclp.arcs_couverture(instance, Rmax)[0]),
+            "couverture": couverture_complete,
+            "duree_s": time.perf_counter() - t0,
+        }
+        rapport["ecart_couverture"] = couverture_complete - max_coverage
+        rapport["ecart_relatif"] = rapport["ecart_couverture"] / couverture_complete if couverture_complete else 0.0
+
+    with open(selected_sites_path, 'w', encoding='utf-8') as f:
+        json.dump(selected_sites, f, ensure_ascii=False, indent=4)
+    if couverture_path is not None:
+        mclp.ecrire_couverture(couverture_path, arcs_couverts[0])
+    with open(rapport_path, 'w', encoding='utf-8') as f:
+        json.dump(rapport, f, ensure_ascii=False, indent=4)
+
+    print(f"Résolution multi-échelle : rapport sauvegardé dans '{rapport_path}'.")
+    print(f"Résumé : {rapport}")
+    return selected_sites, max_coverage
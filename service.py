@@ -0,0 +1,358 @@
+import json
+import math
+import time
+import threading
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import mclp
+import simulation
+from entites import lire_matrice
+from cache_solutions import CacheSolutions, empreinte_instance, resoudre_mclp_avec_cache
+
+
+def lire_entier(requete, cle, defaut, minimum):
+    """
+    Lit un paramètre entier d'une requête : un flottant n'est accepté que s'il est entier (2.0 mais pas 2.9).
+    """
+    valeur = requete.get(cle, defaut)
+    if isinstance(valeur, bool) or not isinstance(valeur, (int, float, str)):
+        raise ValueError(f"Paramètre '{cle}' invalide : {valeur!r} (entier attendu).")
+    try:
+        nombre = float(valeur)
+    except ValueError:
+        raise ValueError(f"Paramètre '{cle}' invalide : {valeur!r} (entier attendu).")
+    if not nombre.is_integer():
+        raise ValueError(f"Paramètre '{cle}' invalide : {valeur!r} (entier attendu).")
+    if nombre < minimum:
+        raise ValueError(f"Paramètre '{cle}' invalide : {valeur!r} (doit être supérieur ou égal à {minimum}).")
+    return int(nombre)
+
+
+def lire_reel_positif(requete, cle, defaut):
+    """
+    Lit un paramètre réel, fini et strictement positif, d'une requête.
+    """
+    valeur = requete.get(cle, defaut)
+    if isinstance(valeur, bool) or not isinstance(valeur, (int, float, str)):
+        raise ValueError(f"Paramètre '{cle}' invalide : {valeur!r} (nombre attendu).")
+    try:
+        nombre = float(valeur)
+    except ValueError:
+        raise ValueError(f"Paramètre '{cle}' invalide : {valeur!r} (nombre attendu).")
+    if not (math.isfinite(nombre) and nombre > 0):
+        raise ValueError(f"Paramètre '{cle}' invalide : {valeur!r} (nombre fini strictement positif attendu).")
+    return nombre
+
+
+class ServiceOptimisation:
+    """
+    Service d'optimisation gardant en mémoire les données filtrées de plusieurs zones.
+
+    Les fichiers de chaque zone (bâtiments, parkings, matrice des distances, transformateurs) sont
+    chargés une seule fois au démarrage, et l'instance MCLP (arcs de couverture triés par distance)
+    est construite à ce moment. Chaque requête ne paie donc que la construction du modèle et la résolution.
+    Les résolutions sont exécutées dans un pool de workers borné, avec une file d'attente limitée.
+    """
+
+    def __init__(self, zones, params=None, nb_workers=2, taille_max_file=16, timeout_s=60, taille_historique=1000, cache=None):
+        """
+        Args:
+            - zones (list): Identifiants des zones IRIS à précharger (ex: ["iris.163"]).
+            - params (dict, optional): Paramètres de la simulation (voir simulation.PARAMETRES_DEFAUT).
+            - nb_workers (int): Nombre de résolutions exécutées simultanément.
+            - taille_max_file (int): Nombre maximal de requêtes en cours ou en attente.
+            - timeout_s (float): Temps maximal de traitement d'une requête, en secondes.
+            - taille_historique (int): Nombre de latences conservées pour les métriques.
+            - cache (CacheSolutions, optional): Cache disque des solutions du MCLP.
+        """
+        self.params = dict(simulation.PARAMETRES_DEFAUT)
+        self.params.update(params or {})
+        self.timeout_s = timeout_s
+        self.taille_max_file = taille_max_file
+        self.executor = ThreadPoolExecutor(max_workers=nb_workers)
+        self.cache = cache
+
+        # Métriques
+        self.verrou = threading.Lock()
+        self.en_attente = 0
+        self.en_cours = 0
+        self.nb_requetes = 0
+        self.nb_erreurs = 0
+        self.nb_timeouts = 0
+        self.nb_rejets = 0
+        self.latences = deque(maxlen=taille_historique)
+
+        # Préchargement des zones
+        self.zones = {}
+        for zone_id in zones:
+            self.zones[zone_id] = self.charger_zone(zone_id)
+            print(f"Zone '{zone_id}' chargée : {len(self.zones[zone_id]['instance']['arc_dist'])} arcs de couverture.")
+
+    def charger_zone(self, zone_id):
+        """
+        Charge les fichiers filtrés d'une zone et prépare son instance MCLP, ainsi que son empreinte
+        pour le cache (calculée une fois ici plutôt qu'à chaque requête).
+        """
+        params = dict(self.params, zone_id=zone_id)
+        chemins = simulation.chemins_fichiers(params)
+
+        with open(chemins["bat_filtres"], 'r', encoding='utf-8') as f:
+            data_bat = json.load(f)
+        with open(chemins["parkings_filtres"], 'r', encoding='utf-8') as f:
+            data_parkings = json.load(f)
+        T, meta = lire_matrice(chemins["matrice_distances_bat_park"])
+        with open(chemins["transfo_filtres"], 'r', encoding='utf-8') as f:
+            transfos = json.load(f)
+
+        instance = mclp.preparer_instance(data_bat, data_parkings, T, meta)
+        return {
+            "instance": instance,
+            "empreinte": empreinte_instance(instance) if self.cache is not None else None,
+            "transfos": transfos,
+        }
+
+    def valider(self, requete):
+        """
+        Vérifie une requête d'optimisation et complète ses paramètres par les valeurs par défaut.
+
+        Args:
+            - requete (dict): {"zone_id", "p", "Rmax", "max_connections_per_transformer" (optionnels)}.
+
+        Returns:
+            - dict : {"zone_id", "p", "Rmax", "max_connections_per_transformer"}, convertis.
+
+        Raises:
+            - ValueError : p non entier ou négatif, Rmax non fini ou non positif, max_connections_per_transformer < 1.
+        """
+        if not isinstance(requete, dict):
+            raise TypeError("Le corps de la requête doit être un objet JSON.")
+        zone_id = requete.get("zone_id", self.params["zone_id"])
+        if zone_id not in self.zones:
+            raise KeyError(f"Zone '{zone_id}' non chargée par le service.")
+        return {
+            "zone_id": zone_id,
+            "p": lire_entier(requete, "p", self.params["p"], 0),
+            "Rmax": lire_reel_positif(requete, "Rmax", self.params["Rmax"]),
+            "max_connections_per_transformer": lire_entier(
+                requete, "max_connections_per_transformer", self.params["max_connections_per_transformer"], 1
+            ),
+        }
+
+    def optimiser(self, parametres, echeance):
+        """
+        Traite une requête d'optimisation validée : MCLP puis association bornes-transformateurs.
+        Le solveur ne reçoit que le temps restant avant l'échéance de la requête (attente en file déduite).
+
+        Args:
+            - parametres (dict): Paramètres renvoyés par `valider`.
+            - echeance (float): Instant limite de la requête (horloge time.perf_counter).
+
+        Returns:
+            - dict : sites sélectionnés, couverture maximale et association transformateurs-bornes.
+
+        Raises:
+            - TimeoutError : l'échéance est dépassée avant ou pendant la résolution.
+        """
+        with self.verrou:
+            self.en_attente -= 1
+            self.en_cours += 1
+        try:
+            temps_restant_ms = int((echeance - time.perf_counter()) * 1000)
+            if temps_restant_ms <= 0:
+                raise TimeoutError("Délai dépassé pendant l'attente en file.")
+            zone_id, p, Rmax = parametres["zone_id"], parametres["p"], parametres["Rmax"]
+            zone = self.zones[zone_id]
+            if self.cache is not None:
+                selected_sites, max_coverage = resoudre_mclp_avec_cache(
+                    zone["instance"], p, Rmax, self.cache, temps_limite_ms=temps_restant_ms, empreinte=zone["empreinte"]
+                )
+            else:
+                selected_sites, max_coverage = mclp.resoudre_mclp(zone["instance"], p, Rmax, temps_limite_ms=temps_restant_ms)
+            association = mclp.associer_bornes_transfo(selected_sites, zone["transfos"], parametres["max_connections_per_transformer"])
+        finally:
+            with self.verrou:
+                self.en_cours -= 1
+
+        return {
+            "zone_id": zone_id,
+            "p": p,
+            "Rmax": Rmax,
+            "max_coverage": max_coverage,
+            "selected_sites": selected_sites,
+            "asso_tf_bornes": association,
+        }
+
+    def erreur_requete(self, message, debut):
+        """
+        Compte une requête rejetée comme invalide (400) avant toute résolution.
+
+        Returns:
+            - tuple : (code HTTP, corps de la réponse)
+        """
+        with self.verrou:
+            self.nb_requetes += 1
+            self.nb_erreurs += 1
+            self.latences.append(time.perf_counter() - debut)
+        return 400, {"erreur": message}
+
+    def soumettre(self, requete, debut=None):
+        """
+        Soumet une requête au pool de workers et attend son résultat dans la limite du timeout.
+
+        Args:
+            - requete (dict): Corps JSON de la requête.
+            - debut (float, optional): Instant de réception de la requête (time.perf_counter), par défaut maintenant.
+
+        Returns:
+            - tuple : (code HTTP, corps de la réponse)
+        """
+        if debut is None:
+            debut = time.perf_counter()
+        echeance = debut + self.timeout_s
+
+        # Une requête invalide est rejetée avant de prendre une place dans la file
+        try:
+            parametres = self.valider(requete)
+        except (KeyError, ValueError, TypeError) as e:
+            return self.erreur_requete(str(e), debut)
+
+        with self.verrou:
+            if self.en_attente + self.en_cours >= self.taille_max_file:
+                self.nb_rejets += 1
+                return 503, {"erreur": "File d'attente pleine, réessayez plus tard."}
+            self.en_attente += 1
+            self.nb_requetes += 1
+
+        future = self.executor.submit(self.optimiser, parametres, echeance)
+        try:
+            code, reponse = 200, future.result(timeout=max(echeance - time.perf_counter(), 0))
+        except (FuturesTimeoutError, TimeoutError):
+            # Une requête encore en attente n'est jamais démarrée ; une résolution en cours s'arrête
+            # d'elle-même à l'échéance (temps limite du solveur)
+            if future.cancel():
+                with self.verrou:
+                    self.en_attente -= 1
+            with self.verrou:
+                self.nb_timeouts += 1
+            code, reponse = 504, {"erreur": f"Délai de {self.timeout_s} s dépassé."}
+        except (KeyError, ValueError, TypeError) as e:
+            with self.verrou:
+                self.nb_erreurs += 1
+            code, reponse = 400, {"erreur": str(e)}
+        except Exception as e:
+            with self.verrou:
+                self.nb_erreurs += 1
+            code, reponse = 500, {"erreur": str(e)}
+
+        with self.verrou:
+            self.latences.append(time.perf_counter() - debut)
+        return code, reponse
+
+    def metriques(self):
+        """
+        Renvoie les métriques du service : latences, profondeur de file, compteurs.
+        """
+        with self.verrou:
+            latences = sorted(self.latences)
+            metriques = {
+                "zones": sorted(self.zones),
+                "en_attente": self.en_attente,
+                "en_cours": self.en_cours,
+                "nb_requetes": self.nb_requetes,
+                "nb_erreurs": self.nb_erreurs,
+                "nb_timeouts": self.nb_timeouts,
+                "nb_rejets": self.nb_rejets,
+            }
+
+        def quantile(q):
+            return latences[min(int(q * len(latences)), len(latences) - 1)] if latences else None
+
+        if self.cache is not None:
+            metriques["cache"] = self.cache.stats()
+
+        metriques["latence_s"] = {
+            "moyenne": sum(latences) / len(latences) if latences else None,
+            "p50": quantile(0.50),
+            "p95": quantile(0.95),
+            "max": latences[-1] if latences else None,
+        }
+        return metriques
+
+
+def creer_handler(service):
+    """
+    Construit la classe de handler HTTP associée à un service.
+
+    Routes :
+        - POST /optimiser : corps JSON {"zone_id", "p", "Rmax", "max_connections_per_transformer"}
+        - GET /metriques : métriques du service
+    """
+    class Handler(BaseHTTPRequestHandler):
+
+        def repondre(self, code, corps):
+            donnees = json.dumps(corps, ensure_ascii=False, allow_nan=False).encode('utf-8')
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(donnees)))
+            self.end_headers()
+            self.wfile.write(donnees)
+
+        def do_GET(self):
+            if self.path == "/metriques":
+                self.repondre(200, service.metriques())
+            else:
+                self.repondre(404, {"erreur": f"Route inconnue : {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/optimiser":
+                self.repondre(404, {"erreur": f"Route inconnue : {self.path}"})
+                return
+            debut = time.perf_counter()
+            try:
+                longueur = int(self.headers.get("Content-Length", 0))
+                requete = json.loads(self.rfile.read(longueur) or b"{}")
+            except ValueError as e:
+                self.repondre(*service.erreur_requete(f"JSON invalide : {e}", debut))
+                return
+            self.repondre(*service.soumettre(requete, debut))
+
+        def log_message(self, format, *args):
+            pass # les métriques remplacent le journal d'accès
+
+    return Handler
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Service HTTP/JSON d'optimisation des bornes de recharge.")
+    parser.add_argument("--zones", nargs="+", default=[simulation.PARAMETRES_DEFAUT["zone_id"]], help="Zones IRIS à précharger")
+    parser.add_argument("--hote", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2, help="Nombre de résolutions simultanées")
+    parser.add_argument("--taille-max-file", type=int, default=16, help="Nombre maximal de requêtes en cours ou en attente")
+    parser.add_argument("--timeout", type=float, default=60, help="Temps maximal par requête (s)")
+    parser.add_argument("--dossier-local", default=simulation.PARAMETRES_DEFAUT["dossier_local"])
+    parser.add_argument("--dossier-cache", help="Dossier du cache disque des solutions du MCLP")
+    parser.add_argument("--taille-max-cache-mo", type=float, default=100, help="Taille maximale du cache des solutions (Mo)")
+    args = parser.parse_args()
+
+    cache = None
+    if args.dossier_cache:
+        cache = CacheSolutions(args.dossier_cache, taille_max_octets=int(args.taille_max_cache_mo * 1024 * 1024))
+
+    service = ServiceOptimisation(
+        args.zones, params={"dossier_local": args.dossier_local},
+        nb_workers=args.workers, taille_max_file=args.taille_max_file, timeout_s=args.timeout, cache=cache
+    )
+    serveur = ThreadingHTTPServer((args.hote, args.port), creer_handler(service))
+    print(f"Service démarré sur http://{args.hote}:{args.port} (POST /optimiser, GET /metriques)")
+    try:
+        serveur.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        serveur.server_close()
+        service.executor.shutdown(wait=False)
@@ -0,0 +1,161 @@
+import json
+import heapq
+import random
+from math import log
+from array import array
+
+from entites import TableEntites, arcs_matrice, lire_matrice, verifier_rayon
+
+
+def affecter_batiments_parkings(data_bat, selected_sites, T, Rmax):
+    """
+    Affecte chaque bâtiment ayant une demande au parking sélectionné le plus proche qui le couvre (distance <= Rmax).
+
+    Args:
+        - data_bat (dict): Contenu du fichier JSON des bâtiments filtrés.
+        - selected_sites (list): Parkings sélectionnés (gml_id, nb_bornes_installees, geo_point).
+        - T (list): Matrice des distances bâtiments-parkings.
+        - Rmax (float): Distance maximale de couverture.
+
+    Returns:
+        - affectation : dict, {parking_id: nombre de VE affectés}.
+        - nb_ve_non_couverts : float, nombre de VE sans parking sélectionné à portée.
+    """
+    batiments = TableEntites.depuis_batiments(data_bat)
+    sites = TableEntites.depuis_sites([site for site in selected_sites if site.get("nb_bornes_installees", 0) > 0])
+    nb_ve = batiments["nb_ve_potentiel"]
+
+    # Parking couvrant le plus proche de chaque bâtiment (indice -1 : non couvert)
+    plus_proche = array('i', [-1] * len(batiments))
+    distance_min = array('d', [float('inf')] * len(batiments))
+    for j, i, distance in zip(*arcs_matrice(T, batiments, sites, Rmax=Rmax)):
+        if distance < distance_min[j]:
+            distance_min[j] = distance
+            plus_proche[j] = i
+
+    ve_par_site = [0.0] * len(sites)
+    nb_ve_non_couverts = 0.0
+    for j, i in enumerate(plus_proche):
+        if i >= 0:
+            ve_par_site[i] += nb_ve[j]
+        else:
+            nb_ve_non_couverts += nb_ve[j]
+
+    return {sites.ids[i]: ve_par_site[i] for i in range(len(sites))}, nb_ve_non_couverts
+
+
+def simuler_parking(nb_bornes, taux_arrivee_h, duree_moyenne_h, duree_h, rng):
+    """
+    Simule par événements discrets la file d'attente FIFO d'un parking équipé de `nb_bornes` bornes.
+
+    Les arrivées suivent un processus de Poisson de taux `taux_arrivee_h` (superposition des
+    arrivées des bâtiments affectés au parking) et les durées de charge une loi exponentielle.
+    Le tas contient les instants de libération des bornes : chaque arrivée prend la borne libérée
+    le plus tôt, ce qui suffit à dérouler la file FIFO sans échéancier global.
+
+    Args:
+        - nb_bornes (int): Nombre de bornes du parking.
+        - taux_arrivee_h (float): Nombre moyen d'arrivées par heure.
+        - duree_moyenne_h (float): Durée moyenne d'une charge, en heures.
+        - duree_h (float): Horizon de simulation, en heures.
+        - rng (random.Random): Générateur aléatoire.
+
+    Returns:
+        - dict : nombre de sessions, attentes (moyenne, p95, max, en minutes), part des VE ayant attendu, taux d'utilisation.
+    """
+    if taux_arrivee_h <= 0:
+        return {"nb_sessions": 0, "attente_moyenne_min": 0.0, "attente_p95_min": 0.0, "attente_max_min": 0.0,
+                "part_sessions_avec_attente": 0.0, "taux_utilisation": 0.0}
+
+    liberations = [0.0] * nb_bornes # instants de libération des bornes (tas)
+    random_ = rng.random
+    heappushpop = heapq.heappushpop
+    taux_service = 1.0 / duree_moyenne_h
+
+    attentes = []
+    temps_occupation = 0.0
+    t = -log(1.0 - random_()) / taux_arrivee_h
+    while t < duree_h:
+        duree = -log(1.0 - random_()) / taux_service
+        liberation = liberations[0]
+        debut = liberation if liberation > t else t
+        heappushpop(liberations, debut + duree)
+        attentes.append(debut - t)
+        temps_occupation += duree
+        t += -log(1.0 - random_()) / taux_arrivee_h
+
+    nb_sessions = len(attentes)
+    if nb_sessions == 0:
+        return {"nb_sessions": 0, "attente_moyenne_min": 0.0, "attente_p95_min": 0.0, "attente_max_min": 0.0,
+                "part_sessions_avec_attente": 0.0, "taux_utilisation": 0.0}
+
+    attentes.sort()
+    return {
+        "nb_sessions": nb_sessions,
+        "attente_moyenne_min": 60 * sum(attentes) / nb_sessions,
+        "attente_p95_min": 60 * attentes[min(int(0.95 * nb_sessions), nb_sessions - 1)],
+        "attente_max_min": 60 * attentes[-1],
+        "part_sessions_avec_attente": sum(1 for a in attentes if a > 0) / nb_sessions,
+        "taux_utilisation": min(temps_occupation / (nb_bornes * duree_h), 1.0),
+    }
+
+
+def simuler_recharge(bat_file_path, selected_sites_path, mat_distances_file_path, output_file, Rmax,
+                     nb_jours=365, sessions_par_ve_jour=0.3, duree_charge_h=2.0, graine=None):
+    """
+    Rejoue sur `nb_jours` les arrivées de VE générées à partir de `nb_ve_potentiel` de chaque bâtiment
+    contre les bornes installées dans les sites sélectionnés, et mesure attentes et utilisation par parking.
+
+    Args:
+        - bat_file_path (str): Chemin du fichier JSON des bâtiments filtrés.
+        - selected_sites_path (str): Chemin du fichier JSON des sites sélectionnés.
+        - mat_distances_file_path (str): Chemin du fichier JSON de la matrice des distances bâtiments-parkings.
+        - output_file (str): Chemin du fichier JSON de sortie.
+        - Rmax (float): Distance maximale de couverture.
+        - nb_jours (int): Nombre de jours simulés.
+        - sessions_par_ve_jour (float): Nombre moyen de charges par VE et par jour.
+        - duree_charge_h (float): Durée moyenne d'une charge (22kW), en heures.
+        - graine (int, optional): Graine du générateur aléatoire, pour des simulations reproductibles.
+
+    Returns:
+        - resultats : dict, indicateurs par parking et récapitulatif.
+    """
+    with open(bat_file_path, 'r', encoding='utf-8') as f:
+        data_bat = json.load(f)
+    with open(selected_sites_path, 'r', encoding='utf-8') as f:
+        selected_sites = json.load(f)
+    T, meta = lire_matrice(mat_distances_file_path)
+    verifier_rayon(meta["rayon_max"], Rmax)
+
+    affectation, nb_ve_non_couverts = affecter_batiments_parkings(data_bat, selected_sites, T, Rmax)
+    rng = random.Random(graine)
+    duree_h = 24.0 * nb_jours
+
+    parkings = {}
+    for site in selected_sites:
+        parking_id = site["gml_id"]
+        if parking_id not in affectation:
+            continue
+        taux_arrivee_h = affectation[parking_id] * sessions_par_ve_jour / 24.0
+        indicateurs = simuler_parking(site["nb_bornes_installees"], taux_arrivee_h, duree_charge_h, duree_h, rng)
+        parkings[parking_id] = dict({"nb_bornes": site["nb_bornes_installees"], "nb_ve_affectes": affectation[parking_id]}, **indicateurs)
+
+    nb_sessions = sum(p["nb_sessions"] for p in parkings.values())
+    resultats = {
+        "recapitulatif": {
+            "nb_jours": nb_jours,
+            "nb_sessions": nb_sessions,
+            "nb_ve_non_couverts": nb_ve_non_couverts,
+            "attente_moyenne_min": sum(p["attente_moyenne_min"] * p["nb_sessions"] for p in parkings.values()) / nb_sessions if nb_sessions else 0.0,
+            "attente_max_min": max((p["attente_max_min"] for p in parkings.values()), default=0.0),
+            "taux_utilisation_moyen": sum(p["taux_utilisation"] * p["nb_bornes"] for p in parkings.values()) / max(sum(p["nb_bornes"] for p in parkings.values()), 1),
+        },
+        "parkings": parkings,
+    }
+
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(resultats, f, ensure_ascii=False, indent=4)
+
+    print(f"Simulation de la recharge sur {nb_jours} jours sauvegardée dans '{output_file}'.")
+    print(f"Résumé : {resultats['recapitulatif']}")
+    return resultats
@@ -1,9 +1,10 @@
-import traitement_donnees
-import mclp 
-import tracer_cartes
 import os # Pour le nettoyage des fichiers au lancement de la simulation
-import matplotlib.pyplot as plt
 import json
+import argparse # Pour les sous-commandes en ligne de commande
+
+# Les modules traitement_donnees, mclp et tracer_cartes importent des bibliothèques lourdes
+# (shapely, ortools, geopandas, matplotlib, contextily). Ils ne sont importés que dans les
+# sous-commandes qui en ont besoin, pour qu'un simple `solve` ou `prepare` démarre rapidement.
 
 def nettoyer_dossier(dossier):
     """
@@ -40,87 +41,591 @@ def couts (selected_sites_path, cout_unitaire) :
     with open(selected_sites_path, 'r', encoding='utf-8') as f:
         selected_sites = json.load(f)
 
+    cout_total = cout_installation(selected_sites, cout_unitaire)
+    
+    print(f"Coût total d'installation des bornes de recharge : {cout_total} €")
+    return cout_total
+
+
+def cout_installation(selected_sites, cout_unitaire):
+    """
+    Coût total d'installation des bornes des sites sélectionnés, avec une remise par borne supplémentaire
+    sur un même parking (10 % par borne, plafonnée à 50 %).
+    """
     # cout_total = sum(site.get("nb_bornes_installees", 0) or 0 for site in selected_sites) * cout_unitaire
     cout_total = 0
     for site in selected_sites:
         nb_bornes = site.get("nb_bornes_installees", 0)
         cout_total += nb_bornes * cout_unitaire * (1 - min(0.1 * (nb_bornes - 1), 0.5))
-    
-    print(f"Coût total d'installation des bornes de recharge : {cout_total} €")
     return cout_total
 
 
-if __name__ == "__main__":
-
-    ############################################################
-    # Paramètres de la simulation : Variables
-    ############################################################
+############################################################
+# Paramètres de la simulation
+############################################################
 
-    zone_id = "iris.163"                    # identifiant de la zone cible
-    N_ve_2000 = 50                          # nombre de véhicules électriques à générer, normalisé pour 2000 habitants
-    cout_moy_22kW = 3000                    # cout moyen d'installation d'une borne de recharge 22kW
-    Rmax=200                                # rayon de couverture d'une borne de recharge
-    p=20                                    # nombre de bornes à sélectionner
-    max_connections_per_transformer = 3     # nombre maximal de bornes connectées à un poste de transformation pour être assuré de la sécurité du réseau
+PARAMETRES_DEFAUT = {
+    "zone_id": "iris.163",                          # identifiant de la zone cible
+    "N_ve_2000": 50,                                # nombre de véhicules électriques à générer, normalisé pour 2000 habitants
+    "cout_moy_22kW": 3000,                          # cout moyen d'installation d'une borne de recharge 22kW
+    "Rmax": 200,                                    # rayon de couverture d'une borne de recharge
+    "p": 20,                                        # nombre de bornes à sélectionner
+    "max_connections_per_transformer": 3,           # nombre maximal de bornes connectées à un poste de transformation pour être assuré de la sécurité du réseau
 
+    # Simulation de la recharge (sous-commande simulate)
+    "nb_jours_simules": 365,                        # horizon de la simulation à événements discrets
+    "sessions_par_ve_jour": 0.3,                    # nombre moyen de charges par VE et par jour
+    "duree_charge_h": 2.0,                          # durée moyenne d'une charge sur une borne 22kW
+    "graine": None,                                 # graine aléatoire (None : non reproductible)
 
-    ############################################################
-    # Paramètres de la simulation : Chemins des fichiers
-    ############################################################
+    # Charge des transformateurs (sous-commande load)
+    "fichier_profil": None,                         # profil de puissance des bornes (.npy) ; si None, un profil type est généré
+    "pas_min": 60,                                  # résolution du profil en minutes (60 ou 15)
+    "puissance_tf_kw": 250.0,                       # puissance admissible d'un poste de transformation
 
     # Fichiers de données initiaux
-    bat_file = "../batiments-rennes-metropole.json" # fichier volumineux, mis à part pour pouvoir faire des git push
-    iris_file = "data_global/iris_version_rennes_metropole.json"
-    parkings_file = "data_global/parkings.json"
-    transfo_file = "data_global/poste-electrique-total.csv"
+    "bat_file": "../batiments-rennes-metropole.json", # fichier volumineux, mis à part pour pouvoir faire des git push
+    "iris_file": "data_global/iris_version_rennes_metropole.json",
+    "parkings_file": "data_global/parkings.json",
+    "transfo_file": "data_global/poste-electrique-total.csv",
 
-    # Fichiers de données intermédiaires
-    bat_filtres = "data_local/batiments_rennes_" + zone_id.split(".")[0] + "_" + zone_id.split(".")[1] + ".json"
-    parkings_filtres = "data_local/parkings_rennes_" + zone_id.split(".")[0] + "_" + zone_id.split(".")[1] + ".json"
-    transfo_filtres = "data_local/transfo_rennes_" + zone_id.split(".")[0] + "_" + zone_id.split(".")[1] + ".json"
-    matrice_distances_bat_park = "data_local/matrice_distances_bat-park_" + zone_id.split(".")[0] + "_" + zone_id.split(".")[1] + ".json"
-    matrice_distances_tf_park = "data_local/matrice_distances_tf-park_" + zone_id.split(".")[0] + "_" + zone_id.split(".")[1] + ".json"
+    # Calcul des distances bâtiments-parkings (sous-commandes prepare, refresh, index)
+    "graphe_pietons": None,                         # graphe piéton JSON : si renseigné, la couverture utilise les distances à pied
+    "index_spatial": None,                          # dossier d'un index spatial persistant (sous-commande index) : couverture lue dans l'index
+    "taille_cellule_index_m": 200,                  # taille des cellules de la grille de l'index spatial
 
+    # Cache des solutions (sous-commande solve)
+    "dossier_cache": None,                          # cache disque des solutions du MCLP (None : pas de cache)
+    "taille_max_cache_mo": 100,                     # taille maximale du cache des solutions
 
-    # Fichiers de sortie
-    selected_sites_path = "output/SOLUTION_sites_" + zone_id.split(".")[0] + "_" + zone_id.split(".")[1] + ".json"
-    asso_tf_bornes_path = "output/SOLUTION_asso_tf_bornes" + zone_id.split(".")[0] + "_" + zone_id.split(".")[1] + ".json"
-    img_plot_park_bat = "output/img_plot_park_bat_" + zone_id.split(".")[0] + "_" + zone_id.split(".")[1] + ".png"
-    img_plot_tf_park = "output/img_plot_tf_park_" + zone_id.split(".")[0] + "_" + zone_id.split(".")[1] + ".png"
+    # Résolution multi-échelle (solve --multiechelle)
+    "multiechelle": False,                          # résolution grossière sur une grille hexagonale puis raffinement au bâtiment
+    "taille_hexagone": None,                        # rayon des hexagones en mètres (None : Rmax)
+    "anneaux_raffinement": 1,                       # anneaux d'hexagones ajoutés autour des zones prometteuses
+    "comparer_complet": False,                      # résoudre aussi le MCLP complet pour mesurer l'écart de couverture
 
+    # Résolution conjointe implantation-raccordement (solve --resolution-conjointe)
+    "resolution_conjointe": False,                  # implantation et raccordement aux transformateurs résolus dans un même MILP
+    "distance_cable_max": 300,                      # distance maximale parking-transformateur pour un raccordement
+    "puissance_borne_kw": 22.0,                     # puissance d'une borne, pour la capacité en puissance des transformateurs
 
-    ############################################################
-    # Simulation
-    ############################################################
+    # Tuiles de la carte (sous-commande tiles)
+    "zoom_min": 12,                                 # niveaux de zoom des tuiles
+    "zoom_max": 17,
 
-    # Nettoyage des fichiers locaux
-    nettoyer_dossier("data_local")
-    nettoyer_dossier("output")
-    
-    # Traitement des données
-    traitement_donnees.traiter_batiments(bat_file, iris_file, bat_filtres, zone_id, N_ve_2000)
-    traitement_donnees.traiter_parkings(parkings_file, iris_file, parkings_filtres, zone_id)
-    traitement_donnees.traiter_transfo(transfo_file, iris_file, transfo_filtres, zone_id)
-    traitement_donnees.calculer_matrice_distances_bat_parkings(bat_filtres, parkings_filtres, matrice_distances_bat_park)
+    # Exécution parallèle et lots de scénarios (sous-commandes run, tiles, batch)
+    "nb_workers": 4,                                # nombre de tâches exécutées en parallèle
+    "fichier_lot": None,                            # fichier JSON de lot de scénarios (sous-commande batch)
+
+    # Dossiers des fichiers intermédiaires et de sortie
+    "dossier_local": "data_local",
+    "dossier_sortie": "output",
+}
+
+
+def chemins_fichiers(params):
+    """
+    Construit les chemins des fichiers intermédiaires et de sortie associés à une zone.
 
-    # Résolution du problème
-    selected_sites, max_coverage = mclp.mclp_deloc(bat_filtres, parkings_filtres, matrice_distances_bat_park, selected_sites_path, p, Rmax)    
-    cout_total = couts(selected_sites_path, cout_moy_22kW)
+    Args:
+        params (dict): Paramètres de la simulation (voir PARAMETRES_DEFAUT).
+
+    Returns:
+        dict: Chemins des fichiers, indexés par leur nom dans la simulation.
+    """
+    zone_id = params["zone_id"]
+    suffixe = zone_id.split(".")[0] + "_" + zone_id.split(".")[1]
+    local = params["dossier_local"]
+    sortie = params["dossier_sortie"]
+
+    return {
+        # Fichiers de données intermédiaires
+        "bat_filtres": os.path.join(local, "batiments_rennes_" + suffixe + ".json"),
+        "parkings_filtres": os.path.join(local, "parkings_rennes_" + suffixe + ".json"),
+        "transfo_filtres": os.path.join(local, "transfo_rennes_" + suffixe + ".json"),
+        "matrice_distances_bat_park": os.path.join(local, "matrice_distances_bat-park_" + suffixe + ".json"),
+        "matrice_distances_tf_park": os.path.join(local, "matrice_distances_tf-park_" + suffixe + ".json"),
+
+        # Fichiers de sortie
+        "selected_sites_path": os.path.join(sortie, "SOLUTION_sites_" + suffixe + ".json"),
+        "couverture_path": os.path.join(sortie, "COUVERTURE_" + suffixe + ".csv"),
+        "asso_tf_bornes_path": os.path.join(sortie, "SOLUTION_asso_tf_bornes" + suffixe + ".json"),
+        "img_plot_park_bat": os.path.join(sortie, "img_plot_park_bat_" + suffixe + ".png"),
+        "img_plot_tf_park": os.path.join(sortie, "img_plot_tf_park_" + suffixe + ".png"),
+        "simulation_recharge_path": os.path.join(sortie, "SIMULATION_recharge_" + suffixe + ".json"),
+        "rapport_multiechelle_path": os.path.join(sortie, "RAPPORT_multiechelle_" + suffixe + ".json"),
+        "analyse_marginale_path": os.path.join(sortie, "ANALYSE_marginale_" + suffixe + ".json"),
+        "profil_type_borne": os.path.join(local, "profil_type_borne_" + str(params["pas_min"]) + "min.npy"),
+        "charges_tf_path": os.path.join(local, "charges_tf_" + suffixe + ".npy"),
+        "rapport_charges_tf_path": os.path.join(sortie, "CHARGES_tf_" + suffixe + ".json"),
+        "dossier_tuiles": os.path.join(sortie, "tuiles"),
+        "dossier_export": os.path.join(sortie, "export_" + suffixe),
+        "snapshot_bat": os.path.join(local, "snapshot_batiments_" + suffixe + ".json"),
+        "snapshot_park": os.path.join(local, "snapshot_parkings_" + suffixe + ".json"),
+        "journal_maj": os.path.join(local, "journal_maj_" + suffixe + ".jsonl"),
+    }
+
+
+def charger_parametres(args):
+    """
+    Fusionne les paramètres par défaut, ceux d'un éventuel fichier de configuration JSON
+    et ceux passés en ligne de commande (prioritaires).
 
-    traitement_donnees.calculer_matrice_distances_tf_parkings(transfo_filtres, selected_sites_path, matrice_distances_tf_park)
-    mclp.association_bornes_transfo(selected_sites_path, transfo_filtres, asso_tf_bornes_path, max_connections_per_transformer)
+    Args:
+        args (argparse.Namespace): Arguments de la ligne de commande.
+
+    Returns:
+        dict: Paramètres de la simulation.
+    """
+    params = dict(PARAMETRES_DEFAUT)
+
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        inconnus = set(config) - set(PARAMETRES_DEFAUT)
+        if inconnus:
+            raise ValueError(f"Paramètres inconnus dans '{args.config}' : {sorted(inconnus)}")
+        params.update(config)
 
+    for cle in PARAMETRES_DEFAUT:
+        valeur = getattr(args, cle, None)
+        if valeur is not None:
+            params[cle] = valeur
 
-    # Affichage de la carte
-    tracer_cartes.plot_parking_and_buildings_with_basemap(iris_file, bat_filtres, zone_id, selected_sites_path, Rmax, img_plot_park_bat )
-    tracer_cartes.plot_parking_and_tf_with_basemap(iris_file, transfo_filtres, selected_sites_path, asso_tf_bornes_path, zone_id, Rmax, output_file=img_plot_tf_park)
+    return params
 
 
-    # Affichage des résultats
+############################################################
+# Étapes de la simulation
+############################################################
+
+def etape_prepare(params, chemins):
+    """
+    Filtre les données de la zone cible et calcule la matrice des distances bâtiments-parkings.
+    """
+    import traitement_donnees
+
+    os.makedirs(params["dossier_local"], exist_ok=True)
+    traitement_donnees.traiter_batiments(params["bat_file"], params["iris_file"], chemins["bat_filtres"], params["zone_id"], params["N_ve_2000"])
+    traitement_donnees.traiter_parkings(params["parkings_file"], params["iris_file"], chemins["parkings_filtres"], params["zone_id"])
+    traitement_donnees.traiter_transfo(params["transfo_file"], params["iris_file"], chemins["transfo_filtres"], params["zone_id"])
+    if params["graphe_pietons"]:
+        traitement_donnees.calculer_matrice_distances_reseau(chemins["bat_filtres"], chemins["parkings_filtres"], params["graphe_pietons"], chemins["matrice_distances_bat_park"], params["Rmax"])
+    elif params["index_spatial"]:
+        traitement_donnees.calculer_matrice_distances_index(chemins["bat_filtres"], chemins["parkings_filtres"], params["index_spatial"], chemins["matrice_distances_bat_park"], params["Rmax"])
+    else:
+        traitement_donnees.calculer_matrice_distances_bat_parkings(chemins["bat_filtres"], chemins["parkings_filtres"], chemins["matrice_distances_bat_park"])
+
+
+def etape_refresh(params, chemins):
+    """
+    Rafraîchit incrémentalement les bâtiments, parkings et la matrice des distances de la zone
+    après une mise à jour des fichiers source (seuls les gml_id modifiés sont retraités).
+    """
+    import traitement_donnees
+    import maj_incrementale
+
+    os.makedirs(params["dossier_local"], exist_ok=True)
+    maj_incrementale.rafraichir_zone(
+        params["bat_file"], params["parkings_file"], params["iris_file"],
+        chemins["bat_filtres"], chemins["parkings_filtres"], chemins["matrice_distances_bat_park"],
+        chemins["snapshot_bat"], chemins["snapshot_park"], chemins["journal_maj"],
+        params["zone_id"], params["N_ve_2000"], maj_matrice=not params["graphe_pietons"],
+        dossier_index=params["index_spatial"], taille_cellule_index_m=params["taille_cellule_index_m"], Rmax=params["Rmax"]
+    )
+    if params["graphe_pietons"]:
+        traitement_donnees.calculer_matrice_distances_reseau(chemins["bat_filtres"], chemins["parkings_filtres"], params["graphe_pietons"], chemins["matrice_distances_bat_park"], params["Rmax"])
+
+
+def etape_index(params, chemins):
+    """
+    Construit (ou vérifie à jour) l'index spatial persistant des bâtiments et parkings de la métropole.
+    """
+    import index_spatial
+
+    if not params["index_spatial"]:
+        raise ValueError("La sous-commande index nécessite un dossier d'index (--index-spatial).")
+    index_spatial.construire_index(params["bat_file"], params["parkings_file"], params["index_spatial"], taille_cellule_m=params["taille_cellule_index_m"])
+
+
+def creer_cache(params):
+    """
+    Ouvre le cache disque des solutions du MCLP si un dossier de cache est paramétré, sinon renvoie None.
+    """
+    if not params["dossier_cache"]:
+        return None
+    from cache_solutions import CacheSolutions
+    return CacheSolutions(params["dossier_cache"], taille_max_octets=int(params["taille_max_cache_mo"] * 1024 * 1024))
+
+
+def etape_solve(params, chemins):
+    """
+    Résout le MCLP sur les données filtrées et calcule le coût d'installation.
+    La couverture affectée à chaque arc est enregistrée pour l'export de la solution.
+
+    Returns:
+        tuple: (selected_sites, max_coverage, cout_total)
+    """
+    import mclp
+
+    cache = creer_cache(params)
+
+    os.makedirs(params["dossier_sortie"], exist_ok=True)
+    if params["resolution_conjointe"]:
+        selected_sites, max_coverage = mclp.mclp_deloc_reseau(
+            chemins["bat_filtres"], chemins["parkings_filtres"], chemins["matrice_distances_bat_park"], chemins["transfo_filtres"],
+            chemins["selected_sites_path"], chemins["asso_tf_bornes_path"], params["p"], params["Rmax"], params["distance_cable_max"],
+            params["max_connections_per_transformer"], puissance_tf_kw=params["puissance_tf_kw"], puissance_borne_kw=params["puissance_borne_kw"],
+            couverture_path=chemins["couverture_path"]
+        )
+    elif params["multiechelle"]:
+        import resolution_multiechelle
+        selected_sites, max_coverage = resolution_multiechelle.mclp_multiechelle(
+            chemins["bat_filtres"], chemins["parkings_filtres"], chemins["matrice_distances_bat_park"], chemins["selected_sites_path"],
+            chemins["rapport_multiechelle_path"], params["p"], params["Rmax"], taille_hexagone=params["taille_hexagone"],
+            anneaux=params["anneaux_raffinement"], comparer=params["comparer_complet"], couverture_path=chemins["couverture_path"]
+        )
+    else:
+        selected_sites, max_coverage = mclp.mclp_deloc(chemins["bat_filtres"], chemins["parkings_filtres"], chemins["matrice_distances_bat_park"], chemins["selected_sites_path"], params["p"], params["Rmax"],
+                                                       cache=cache, index_spatial=params["index_spatial"], couverture_path=chemins["couverture_path"])
+    if cache is not None:
+        print(f"Cache des solutions : {cache.stats()}")
+    cout_total = couts(chemins["selected_sites_path"], params["cout_moy_22kW"])
+    return selected_sites, max_coverage, cout_total
+
+
+def etape_assign(params, chemins):
+    """
+    Associe les bornes installées aux transformateurs les plus proches.
+    """
+    import traitement_donnees
+    import mclp
+
+    traitement_donnees.calculer_matrice_distances_tf_parkings(chemins["transfo_filtres"], chemins["selected_sites_path"], chemins["matrice_distances_tf_park"])
+    if params["resolution_conjointe"]:
+        print(f"Association bornes-transformateurs déjà produite par la résolution conjointe dans '{chemins['asso_tf_bornes_path']}'.")
+        return
+    mclp.association_bornes_transfo(chemins["selected_sites_path"], chemins["transfo_filtres"], chemins["asso_tf_bornes_path"], params["max_connections_per_transformer"])
+
+
+def etape_plot(params, chemins):
+    """
+    Trace les cartes parkings-bâtiments et parkings-transformateurs.
+    """
+    import tracer_cartes
+
+    tracer_cartes.plot_parking_and_buildings_with_basemap(params["iris_file"], chemins["bat_filtres"], params["zone_id"], chemins["selected_sites_path"], params["Rmax"], chemins["img_plot_park_bat"])
+    tracer_cartes.plot_parking_and_tf_with_basemap(params["iris_file"], chemins["transfo_filtres"], chemins["selected_sites_path"], chemins["asso_tf_bornes_path"], params["zone_id"], params["Rmax"], output_file=chemins["img_plot_tf_park"])
+
+
+def etape_export(params, chemins):
+    """
+    Exporte la solution (sites, couverture par bâtiment, raccordements, indicateurs) en GeoJSON, GeoJSONSeq et colonnes.
+    """
+    import export_solutions
+
+    export_solutions.exporter_solution(
+        chemins["bat_filtres"], chemins["selected_sites_path"], chemins["couverture_path"],
+        chemins["asso_tf_bornes_path"], chemins["transfo_filtres"], chemins["dossier_export"], params["Rmax"]
+    )
+
+
+def etape_simulate(params, chemins):
+    """
+    Simule par événements discrets la recharge des VE sur les bornes installées (attentes, utilisation).
+    """
+    import simulateur_recharge
+
+    simulateur_recharge.simuler_recharge(
+        chemins["bat_filtres"], chemins["selected_sites_path"], chemins["matrice_distances_bat_park"], chemins["simulation_recharge_path"], params["Rmax"],
+        nb_jours=params["nb_jours_simules"], sessions_par_ve_jour=params["sessions_par_ve_jour"], duree_charge_h=params["duree_charge_h"], graine=params["graine"]
+    )
+
+
+def etape_analyse(params, chemins):
+    """
+    Classe les parkings selon la valeur marginale d'une borne supplémentaire, à partir de la solution enregistrée.
+    """
+    import analyse_marginale
+
+    analyse_marginale.analyser_valeurs_marginales(
+        chemins["bat_filtres"], chemins["parkings_filtres"], chemins["matrice_distances_bat_park"],
+        chemins["selected_sites_path"], chemins["analyse_marginale_path"], params["p"], params["Rmax"]
+    )
+
+
+def etape_batch(params, chemins):
+    """
+    Exécute un lot de scénarios (grille de paramètres sur plusieurs zones) et consolide les résultats.
+    """
+    import lot_scenarios
+
+    if not params["fichier_lot"]:
+        raise ValueError("La sous-commande batch nécessite un fichier de lot (--fichier-lot).")
+    lot_scenarios.executer_lot(params["fichier_lot"], params)
+
+
+def etape_load(params, chemins):
+    """
+    Agrège les profils de puissance des bornes en courbes de charge des transformateurs (pic, surcharge, marge).
+    """
+    import charge_transfo
+
+    fichier_profil = params["fichier_profil"]
+    if not fichier_profil:
+        fichier_profil = chemins["profil_type_borne"]
+        charge_transfo.generer_profil_type(fichier_profil, pas_min=params["pas_min"])
+
+    charge_transfo.calculer_charges_transfo(
+        chemins["asso_tf_bornes_path"], fichier_profil, chemins["charges_tf_path"], chemins["rapport_charges_tf_path"],
+        pas_min=params["pas_min"], puissance_tf_kw=params["puissance_tf_kw"]
+    )
+
+
+def etape_tiles(params, chemins):
+    """
+    Génère les tuiles XYZ de toutes les zones déjà résolues (carte de la métropole), en ne
+    régénérant que les tuiles dont le contenu a changé.
+    """
+    import tuiles
+
+    bat_files, selected_sites_files, asso_files, transfo_files = tuiles.fichiers_zones(params["dossier_local"], params["dossier_sortie"])
+    tuiles.generer_tuiles(
+        bat_files, selected_sites_files, asso_files, transfo_files, chemins["dossier_tuiles"], params["Rmax"],
+        zooms=range(params["zoom_min"], params["zoom_max"] + 1), nb_workers=params["nb_workers"],
+        max_connections_per_transformer=params["max_connections_per_transformer"]
+    )
+
+
+def afficher_resultats(params, selected_sites, cout_total):
+    """
+    Affiche le récapitulatif de la simulation.
+    """
     print ("\n")
     print("########################################################################################")
     print("Résultats de la simulation \n")
-    print("Zone cible :", zone_id)
+    print("Zone cible :", params["zone_id"])
     print("Nombre de sites sélectionnés :", sum(1 for _ in selected_sites))
     print("Nombre de bornes installées :", sum(site.get("nb_bornes_installees", 0) or 0 for site in selected_sites))
     print(f"Cout de l'installation : {cout_total} \n")
+
+
+def etape_run(params, chemins):
+    """
+    Enchaîne toutes les étapes de la simulation, après nettoyage des dossiers locaux.
+    Les étapes forment un graphe de dépendances exécuté par pipeline.py : les traitements
+    indépendants (bâtiments, parkings, transformateurs, les deux cartes...) tournent en parallèle.
+    """
+    import traitement_donnees
+    import mclp
+    import tracer_cartes
+    from pipeline import Etape, executer_pipeline
+
+    # Nettoyage des fichiers locaux
+    nettoyer_dossier(params["dossier_local"])
+    nettoyer_dossier(params["dossier_sortie"])
+    os.makedirs(params["dossier_local"], exist_ok=True)
+    os.makedirs(params["dossier_sortie"], exist_ok=True)
+
+    if params["graphe_pietons"]:
+        etape_matrice = Etape("matrice_bat_park", traitement_donnees.calculer_matrice_distances_reseau,
+                              (chemins["bat_filtres"], chemins["parkings_filtres"], params["graphe_pietons"], chemins["matrice_distances_bat_park"], params["Rmax"]),
+                              dependances=["batiments", "parkings"], processus=True)
+    elif params["index_spatial"]:
+        etape_matrice = Etape("matrice_bat_park", traitement_donnees.calculer_matrice_distances_index,
+                              (chemins["bat_filtres"], chemins["parkings_filtres"], params["index_spatial"], chemins["matrice_distances_bat_park"], params["Rmax"]),
+                              dependances=["batiments", "parkings"], processus=True)
+    else:
+        etape_matrice = Etape("matrice_bat_park", traitement_donnees.calculer_matrice_distances_bat_parkings,
+                              (chemins["bat_filtres"], chemins["parkings_filtres"], chemins["matrice_distances_bat_park"]),
+                              dependances=["batiments", "parkings"], processus=True)
+
+    if params["resolution_conjointe"]:
+        etape_resolution = Etape("solve", mclp.mclp_deloc_reseau,
+                                 (chemins["bat_filtres"], chemins["parkings_filtres"], chemins["matrice_distances_bat_park"], chemins["transfo_filtres"],
+                                  chemins["selected_sites_path"], chemins["asso_tf_bornes_path"], params["p"], params["Rmax"], params["distance_cable_max"],
+                                  params["max_connections_per_transformer"]),
+                                 {"puissance_tf_kw": params["puissance_tf_kw"], "puissance_borne_kw": params["puissance_borne_kw"],
+                                  "couverture_path": chemins["couverture_path"]},
+                                 dependances=["matrice_bat_park", "transfo"])
+    elif params["multiechelle"]:
+        import resolution_multiechelle
+        etape_resolution = Etape("solve", resolution_multiechelle.mclp_multiechelle,
+                                 (chemins["bat_filtres"], chemins["parkings_filtres"], chemins["matrice_distances_bat_park"], chemins["selected_sites_path"],
+                                  chemins["rapport_multiechelle_path"], params["p"], params["Rmax"]),
+                                 {"taille_hexagone": params["taille_hexagone"], "anneaux": params["anneaux_raffinement"], "comparer": params["comparer_complet"],
+                                  "couverture_path": chemins["couverture_path"]},
+                                 dependances=["matrice_bat_park"])
+    else:
+        etape_resolution = Etape("solve", mclp.mclp_deloc,
+                                 (chemins["bat_filtres"], chemins["parkings_filtres"], chemins["matrice_distances_bat_park"], chemins["selected_sites_path"], params["p"], params["Rmax"]),
+                                 {"cache": creer_cache(params), "index_spatial": params["index_spatial"], "couverture_path": chemins["couverture_path"]},
+                                 dependances=["matrice_bat_park"])
+
+    etapes = [
+        # Traitement des données
+        Etape("batiments", traitement_donnees.traiter_batiments,
+              (params["bat_file"], params["iris_file"], chemins["bat_filtres"], params["zone_id"], params["N_ve_2000"]), processus=True),
+        Etape("parkings", traitement_donnees.traiter_parkings,
+              (params["parkings_file"], params["iris_file"], chemins["parkings_filtres"], params["zone_id"]), processus=True),
+        Etape("transfo", traitement_donnees.traiter_transfo,
+              (params["transfo_file"], params["iris_file"], chemins["transfo_filtres"], params["zone_id"]), processus=True),
+        etape_matrice,
+
+        # Résolution du problème
+        etape_resolution,
+        Etape("couts", couts, (chemins["selected_sites_path"], params["cout_moy_22kW"]), dependances=["solve"]),
+        Etape("matrice_tf_park", traitement_donnees.calculer_matrice_distances_tf_parkings,
+              (chemins["transfo_filtres"], chemins["selected_sites_path"], chemins["matrice_distances_tf_park"]),
+              dependances=["transfo", "solve"], processus=True),
+    ]
+    if not params["resolution_conjointe"]: # sinon l'association est produite par la résolution
+        etapes.append(Etape("assign", mclp.association_bornes_transfo,
+                            (chemins["selected_sites_path"], chemins["transfo_filtres"], chemins["asso_tf_bornes_path"], params["max_connections_per_transformer"]),
+                            dependances=["transfo", "solve"]))
+    etapes += [
+        # Export de la solution (GeoJSON, GeoJSONSeq et colonnes)
+        Etape("export", etape_export, (params, chemins), dependances=["solve" if params["resolution_conjointe"] else "assign"]),
+
+        # Affichage des cartes, chacune dans son processus (matplotlib n'est pas thread-safe)
+        Etape("carte_park_bat", tracer_cartes.plot_parking_and_buildings_with_basemap,
+              (params["iris_file"], chemins["bat_filtres"], params["zone_id"], chemins["selected_sites_path"], params["Rmax"], chemins["img_plot_park_bat"]),
+              dependances=["solve"], processus=True),
+        Etape("carte_tf_park", tracer_cartes.plot_parking_and_tf_with_basemap,
+              (params["iris_file"], chemins["transfo_filtres"], chemins["selected_sites_path"], chemins["asso_tf_bornes_path"], params["zone_id"], params["Rmax"]),
+              {"output_file": chemins["img_plot_tf_park"]}, dependances=["solve" if params["resolution_conjointe"] else "assign"], processus=True),
+    ]
+
+    resultats, _ = executer_pipeline(etapes, nb_workers=params["nb_workers"])
+
+    selected_sites, _ = resultats["solve"]
+    afficher_resultats(params, selected_sites, resultats["couts"])
+
+
+ETAPES = {
+    "prepare": etape_prepare,
+    "refresh": etape_refresh,
+    "index": etape_index,
+    "solve": etape_solve,
+    "assign": etape_assign,
+    "plot": etape_plot,
+    "tiles": etape_tiles,
+    "export": etape_export,
+    "simulate": etape_simulate,
+    "analyse": etape_analyse,
+    "load": etape_load,
+    "batch": etape_batch,
+    "run": etape_run,
+}
+
+
+def construire_parser():
+    """
+    Construit le parser de la ligne de commande, avec une sous-commande par étape.
+    Chaque option n'est acceptée que par les sous-commandes qui lisent le paramètre correspondant.
+
+    Returns:
+        argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(description="Optimisation de l'implantation de bornes de recharge (MCLP).")
+    sous_commandes = parser.add_subparsers(dest="commande", required=True)
+    parsers = {
+        "prepare": sous_commandes.add_parser("prepare", help="Filtrer les données de la zone et calculer les distances"),
+        "refresh": sous_commandes.add_parser("refresh", help="Rafraîchir incrémentalement les données après mise à jour des sources"),
+        "index": sous_commandes.add_parser("index", help="Construire l'index spatial persistant des bâtiments et parkings"),
+        "solve": sous_commandes.add_parser("solve", help="Résoudre le MCLP et calculer le coût"),
+        "assign": sous_commandes.add_parser("assign", help="Associer les bornes aux transformateurs"),
+        "plot": sous_commandes.add_parser("plot", help="Tracer les cartes de la solution"),
+        "tiles": sous_commandes.add_parser("tiles", help="Générer les tuiles XYZ de toutes les zones résolues"),
+        "export": sous_commandes.add_parser("export", help="Exporter la solution en GeoJSON, GeoJSONSeq et colonnes"),
+        "simulate": sous_commandes.add_parser("simulate", help="Simuler la recharge des VE sur les bornes installées"),
+        "analyse": sous_commandes.add_parser("analyse", help="Classer les parkings selon la valeur d'une borne supplémentaire"),
+        "load": sous_commandes.add_parser("load", help="Calculer la charge annuelle des transformateurs"),
+        "batch": sous_commandes.add_parser("batch", help="Exécuter un lot de scénarios et consolider les résultats"),
+        "run": sous_commandes.add_parser("run", help="Enchaîner toutes les étapes"),
+    }
+
+    def option(commandes, *flags, **kwargs):
+        for commande in commandes:
+            parsers[commande].add_argument(*flags, **kwargs)
+
+    toutes = list(parsers)
+    option(toutes, "--config", help="Fichier JSON de paramètres (surchargé par les options en ligne de commande)")
+    option(toutes, "--dossier-local", dest="dossier_local", help="Dossier des fichiers intermédiaires")
+    option(toutes, "--dossier-sortie", dest="dossier_sortie", help="Dossier des fichiers de sortie")
+
+    # Zone et paramètres du MCLP
+    option(["prepare", "refresh", "solve", "assign", "plot", "export", "simulate", "analyse", "load", "run"],
+           "--zone-id", dest="zone_id", help="Identifiant de la zone IRIS cible (ex: iris.163)")
+    option(["prepare", "refresh", "batch", "run"],
+           "--N-ve-2000", dest="N_ve_2000", type=float, help="Nombre de VE normalisé pour 2000 habitants")
+    option(["solve", "batch", "run"],
+           "--cout-moy-22kW", dest="cout_moy_22kW", type=float, help="Coût moyen d'installation d'une borne 22kW")
+    option(["prepare", "refresh", "solve", "plot", "tiles", "export", "simulate", "analyse", "batch", "run"],
+           "--Rmax", dest="Rmax", type=float, help="Rayon de couverture d'une borne (m)")
+    option(["solve", "analyse", "batch", "run"],
+           "-p", dest="p", type=int, help="Nombre de bornes à sélectionner")
+    option(["solve", "assign", "tiles", "batch", "run"],
+           "--max-connections-per-transformer", dest="max_connections_per_transformer", type=int, help="Nombre maximal de bornes par transformateur")
+
+    # Fichiers de données initiaux
+    option(["prepare", "refresh", "index", "batch", "run"], "--bat-file", dest="bat_file", help="Fichier JSON des bâtiments de la métropole")
+    option(["prepare", "refresh", "plot", "batch", "run"], "--iris-file", dest="iris_file", help="Fichier JSON des zones IRIS")
+    option(["prepare", "refresh", "index", "batch", "run"], "--parkings-file", dest="parkings_file", help="Fichier JSON des parkings")
+    option(["prepare", "batch", "run"], "--transfo-file", dest="transfo_file", help="Fichier CSV des transformateurs")
+
+    # Calcul des distances
+    option(["prepare", "refresh", "batch", "run"],
+           "--graphe-pietons", dest="graphe_pietons", help="Graphe piéton JSON : distances à pied au lieu du vol d'oiseau")
+    option(["prepare", "refresh", "index", "solve", "batch", "run"],
+           "--index-spatial", dest="index_spatial", help="Dossier de l'index spatial persistant")
+    option(["refresh", "index", "batch"],
+           "--taille-cellule-index-m", dest="taille_cellule_index_m", type=float, help="Taille des cellules de l'index spatial en mètres")
+
+    # Modes de résolution (solve, run)
+    option(["solve", "run"], "--dossier-cache", dest="dossier_cache", help="Dossier du cache disque des solutions du MCLP")
+    option(["solve", "run"], "--taille-max-cache-mo", dest="taille_max_cache_mo", type=float, help="Taille maximale du cache des solutions (Mo)")
+    option(["solve", "run"], "--multiechelle", dest="multiechelle", action="store_true", default=None, help="Résolution grossière sur grille hexagonale puis raffinement")
+    option(["solve", "run"], "--taille-hexagone", dest="taille_hexagone", type=float, help="Rayon des hexagones en mètres (--multiechelle)")
+    option(["solve", "run"], "--anneaux-raffinement", dest="anneaux_raffinement", type=int, help="Anneaux d'hexagones autour des zones prometteuses (--multiechelle)")
+    option(["solve", "run"], "--comparer-complet", dest="comparer_complet", action="store_true", default=None, help="Comparer à la résolution complète (--multiechelle)")
+    option(["solve", "assign", "run"], "--resolution-conjointe", dest="resolution_conjointe", action="store_true", default=None,
+           help="Résoudre implantation et raccordement aux transformateurs ensemble")
+    option(["solve", "run"], "--distance-cable-max", dest="distance_cable_max", type=float, help="Distance maximale parking-transformateur en mètres (--resolution-conjointe)")
+    option(["solve", "run"], "--puissance-borne-kw", dest="puissance_borne_kw", type=float, help="Puissance d'une borne en kW (--resolution-conjointe)")
+    option(["solve", "load", "run"], "--puissance-tf-kw", dest="puissance_tf_kw", type=float, help="Puissance admissible d'un transformateur en kW")
+
+    # Simulation de la recharge
+    option(["simulate"], "--nb-jours-simules", dest="nb_jours_simules", type=int, help="Nombre de jours simulés")
+    option(["simulate"], "--sessions-par-ve-jour", dest="sessions_par_ve_jour", type=float, help="Nombre moyen de charges par VE et par jour")
+    option(["simulate"], "--duree-charge-h", dest="duree_charge_h", type=float, help="Durée moyenne d'une charge en heures")
+    option(["simulate"], "--graine", dest="graine", type=int, help="Graine aléatoire")
+
+    # Charge des transformateurs
+    option(["load"], "--fichier-profil", dest="fichier_profil", help="Profil de puissance des bornes au format .npy")
+    option(["load"], "--pas-min", dest="pas_min", type=int, help="Résolution du profil en minutes")
+
+    # Tuiles, exécution parallèle et lots de scénarios
+    option(["tiles"], "--zoom-min", dest="zoom_min", type=int, help="Niveau de zoom minimal des tuiles")
+    option(["tiles"], "--zoom-max", dest="zoom_max", type=int, help="Niveau de zoom maximal des tuiles")
+    option(["tiles", "batch", "run"], "--nb-workers", dest="nb_workers", type=int, help="Nombre de tâches exécutées en parallèle")
+    option(["batch"], "--fichier-lot", dest="fichier_lot", help="Fichier JSON de lot de scénarios")
+    return parser
+
+
+def main(argv=None):
+    parser = construire_parser()
+    args = parser.parse_args(argv)
+    params = charger_parametres(args)
+    chemins = chemins_fichiers(params)
+
+    resultat = ETAPES[args.commande](params, chemins)
+
+    if args.commande == "solve":
+        selected_sites, max_coverage, cout_total = resultat
+        print("Couverture maximale :", max_coverage)
+        afficher_resultats(params, selected_sites, cout_total)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import random
+from array import array
+
+import pytest
+
+from entites import TableEntites
+from analyse_marginale import FlotCouverture
+
+
+def instance_test(demandes, capacites, arcs):
+    """
+    Instance MCLP minimale : `arcs` est une liste de (bâtiment, parking, distance).
+    """
+    arcs = sorted(arcs, key=lambda arc: arc[2])
+    return {
+        "batiments": TableEntites([f"b{j}" for j in range(len(demandes))], [0.0] * len(demandes), [0.0] * len(demandes),
+                                  nb_ve_potentiel=('d', demandes)),
+        "parkings": TableEntites([f"p{i}" for i in range(len(capacites))], [0.0] * len(capacites), [0.0] * len(capacites),
+                                 max_bornes=('i', capacites)),
+        "arc_bat": array('i', [j for j, _, _ in arcs]),
+        "arc_park": array('i', [i for _, i, _ in arcs]),
+        "arc_dist": array('d', [d for _, _, d in arcs]),
+        "source_distances": "geodesique",
+        "rayon_max": None,
+    }
+
+
+def couverture_max(instance, Rmax, bornes):
+    """
+    Couverture de référence : flot maximal calculé par ortools sur le même graphe.
+    """
+    from ortools.graph.python import max_flow
+
+    poids, C = instance["batiments"]["nb_ve_potentiel"], instance["parkings"]["max_bornes"]
+    source, puits = 0, 1
+    flot = max_flow.SimpleMaxFlow()
+    for j, demande in enumerate(poids):
+        flot.add_arc_with_capacity(source, 2 + j, int(demande))
+    for i in range(len(C)):
+        flot.add_arc_with_capacity(2 + len(poids) + i, puits, bornes[i] * C[i])
+    for j, i, d in zip(instance["arc_bat"], instance["arc_park"], instance["arc_dist"]):
+        if d <= Rmax:
+            flot.add_arc_with_capacity(2 + j, 2 + len(poids) + i, int(sum(poids)))
+    assert flot.solve(source, puits) == flot.OPTIMAL
+    return flot.optimal_flow()
+
+
+def test_gain_petite_instance():
+    # b0 (3) est à portée de p0 et p1, b1 (1) de p0, b2 (4) de p1 ; b2 est hors de portée pour Rmax = 100
+    instance = instance_test([3.0, 1.0, 4.0], [2, 2], [(0, 0, 10), (1, 0, 20), (0, 1, 30), (2, 1, 40), (2, 0, 150)])
+    flot = FlotCouverture(instance, 100, [1, 0])
+    assert flot.couverture() == pytest.approx(2.0)
+    assert flot.gain_borne_supplementaire(0) == pytest.approx(2.0)
+    assert flot.gain_borne_supplementaire(1) == pytest.approx(2.0)
+
+    # Parking plein : pas de gain
+    plein = FlotCouverture(instance, 100, [2, 0])
+    assert plein.gain_borne_supplementaire(0) == 0.0
+
+
+def test_gain_par_reroutage():
+    # p0 sert d'abord b0 ; b1 n'est à portée que de p0 : une borne en p1 reprend b0 pour libérer p0 au profit de b1
+    instance = instance_test([2.0, 2.0], [2, 2], [(0, 0, 10), (0, 1, 20), (1, 0, 30)])
+    flot = FlotCouverture(instance, 100, [1, 0])
+    assert flot.couverture() == pytest.approx(2.0)
+    assert flot.gain_borne_supplementaire(1) == pytest.approx(2.0)
+
+    # Même réaffectation dans la construction du flot initial
+    assert FlotCouverture(instance, 100, [1, 1]).couverture() == pytest.approx(4.0)
+
+
+@pytest.mark.parametrize("graine", range(5))
+def test_gain_egal_au_flot_recalcule(graine):
+    aleatoire = random.Random(graine)
+    nb_batiments, nb_parkings, Rmax = 30, 8, 100
+    demandes = [float(aleatoire.randint(0, 5)) for _ in range(nb_batiments)]
+    capacites = [aleatoire.randint(1, 3) for _ in range(nb_parkings)]
+    arcs = [(j, i, aleatoire.uniform(0, 200)) for j in range(nb_batiments) for i in range(nb_parkings) if aleatoire.random() < 0.3]
+    instance = instance_test(demandes, capacites, arcs)
+    bornes = [aleatoire.randint(0, c) for c in capacites]
+
+    flot = FlotCouverture(instance, Rmax, bornes)
+    assert flot.couverture() == pytest.approx(couverture_max(instance, Rmax, bornes))
+
+    etat = (flot.flot.tolist(), flot.reste_batiment.tolist(), flot.reste_parking.tolist())
+    for i in range(nb_parkings):
+        gain = flot.gain_borne_supplementaire(i)
+        if bornes[i] >= capacites[i]:
+            assert gain == 0.0
+            continue
+        avec_borne = bornes[:i] + [bornes[i] + 1] + bornes[i + 1:]
+        assert flot.couverture() + gain == pytest.approx(couverture_max(instance, Rmax, avec_borne))
+        # L'évaluation ne modifie pas le flot courant
+        assert (flot.flot.tolist(), flot.reste_batiment.tolist(), flot.reste_parking.tolist()) == etat
+        assert flot.journal is None
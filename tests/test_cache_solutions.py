@@ -0,0 +1,99 @@
+import os
+import time
+from array import array
+
+from entites import TableEntites
+from cache_solutions import CacheSolutions, empreinte_instance
+
+
+def instance_test(demande=(1.0, 2.0), source="geodesique"):
+    return {
+        "batiments": TableEntites(["b1", "b2"], [48.10, 48.11], [-1.67, -1.68], nb_ve_potentiel=('d', demande)),
+        "parkings": TableEntites(["p1"], [48.105], [-1.675], max_bornes=('i', [4])),
+        "arc_bat": array('i', [0, 1]),
+        "arc_park": array('i', [0, 0]),
+        "arc_dist": array('d', [50.0, 120.0]),
+        "source_distances": source,
+        "rayon_max": None,
+    }
+
+
+def sites(n):
+    return [{"gml_id": f"p{n}", "nb_bornes_installees": n}]
+
+
+def vieillir(cache, empreinte, p, Rmax, date):
+    chemin = cache.chemin(cache.cle(empreinte, p, Rmax))
+    os.utime(chemin, (date, date))
+
+
+def test_lecture_exacte_et_statistiques(tmp_path):
+    cache = CacheSolutions(str(tmp_path))
+    assert cache.lire("abc", 10, 200) is None
+    cache.ecrire("abc", 10, 200, sites(1), 12.5, couverture=[("b1", "p1", 1.0)])
+    assert cache.lire("abc", 10, 200.0) == (sites(1), 12.5)
+    assert cache.lire("abc", 10, 200, couverture=True) == (sites(1), 12.5, [("b1", "p1", 1.0)])
+    assert cache.lire("abc", 10, 300) is None
+
+    stats = cache.stats()
+    assert (stats["succes"], stats["echecs"], stats["nb_entrees"]) == (2, 2, 1)
+    assert stats["taux_succes"] == 0.5
+
+
+def test_eviction_lru(tmp_path):
+    cache = CacheSolutions(str(tmp_path))
+    cache.ecrire("abc", 1, 200, sites(1), 1.0)
+    taille_entree = os.path.getsize(cache.chemin(cache.cle("abc", 1, 200)))
+    cache.taille_max_octets = 2 * taille_entree
+
+    cache.ecrire("abc", 2, 200, sites(2), 2.0)
+    maintenant = time.time()
+    vieillir(cache, "abc", 1, 200, maintenant - 200)
+    vieillir(cache, "abc", 2, 200, maintenant - 100)
+    assert cache.lire("abc", 1, 200) is not None # p=1 redevient la plus récemment utilisée
+
+    cache.ecrire("abc", 3, 200, sites(3), 3.0)
+    assert cache.lire("abc", 2, 200) is None
+    assert cache.lire("abc", 1, 200) is not None
+    assert cache.lire("abc", 3, 200) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entree_plus_grande_que_le_cache_conservee(tmp_path):
+    cache = CacheSolutions(str(tmp_path), taille_max_octets=1)
+    cache.ecrire("abc", 1, 200, sites(1), 1.0)
+    cache.ecrire("abc", 2, 200, sites(2), 2.0)
+    assert [parametres for _, _, _, parametres in cache.entrees()] == [("abc", 2, 200.0)]
+
+
+def test_plus_proche(tmp_path):
+    cache = CacheSolutions(str(tmp_path))
+    assert cache.plus_proche("abc", 10, 200) is None
+    cache.ecrire("abc", 5, 200, sites(5), 5.0)
+    cache.ecrire("abc", 12, 250, sites(12), 12.0)
+    cache.ecrire("def", 10, 200, sites(99), 99.0)
+    assert cache.plus_proche("abc", 11, 240) == sites(12)
+    assert cache.plus_proche("abc", 6, 200) == sites(5)
+    assert cache.stats()["indices_utilises"] == 2
+
+
+def test_temporaires_abandonnes_supprimes(tmp_path):
+    cache = CacheSolutions(str(tmp_path))
+    recent, ancien = tmp_path / "recent.tmp", tmp_path / "ancien.tmp"
+    recent.write_text("{")
+    ancien.write_text("{")
+    date = time.time() - 2 * CacheSolutions.DUREE_TEMPORAIRES_S
+    os.utime(ancien, (date, date))
+    assert cache.entrees() == []
+    assert recent.exists() and not ancien.exists()
+
+
+def test_empreinte_instance():
+    reference = empreinte_instance(instance_test())
+    assert empreinte_instance(instance_test()) == reference
+    assert empreinte_instance(instance_test(demande=(1.0, 3.0))) != reference
+    assert empreinte_instance(instance_test(source="index")) != reference
+
+    # Les arcs ne font pas partie de l'empreinte (rayon de coupure d'une matrice creuse)
+    sans_arc = dict(instance_test(), arc_bat=array('i', [0]), arc_park=array('i', [0]), arc_dist=array('d', [50.0]))
+    assert empreinte_instance(sans_arc) == reference
@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pytest
+
+import export_solutions
+from export_solutions import TEXTE, EcrivainColonnes, lire_tableau_json
+
+
+DOCUMENT = {
+    "recapitulatif": {"nb_batiments": 3, "liste": [1, 2, {"a": "]}"}]},
+    "batiments": [
+        {"gml_id": "b1", "geo_point_2d": {"lat": 48.1, "lon": -1.67}, "nb_ve_potentiel": 1234.5678},
+        {"gml_id": "b2, \"guillemets\" [crochets]", "valeurs": [], "vide": {}},
+        12345678901234567890,
+        "texte",
+        None,
+    ],
+    "fin": [True, False],
+}
+
+
+@pytest.mark.parametrize("taille_lecture", [1, 2, 3, 7, 64, 1 << 20])
+@pytest.mark.parametrize("indent", [None, 4])
+def test_lire_tableau_json(tmp_path, taille_lecture, indent):
+    chemin = tmp_path / "batiments.json"
+    chemin.write_text(json.dumps(DOCUMENT, indent=indent, ensure_ascii=False), encoding="utf-8")
+    assert list(lire_tableau_json(str(chemin), "batiments", taille_lecture=taille_lecture)) == DOCUMENT["batiments"]
+    assert list(lire_tableau_json(str(chemin), "fin", taille_lecture=taille_lecture)) == [True, False]
+    assert list(lire_tableau_json(str(chemin), "absente", taille_lecture=taille_lecture)) == []
+
+
+@pytest.mark.parametrize("contenu", ['{}', '{"batiments": []}', ' { "batiments" : [ ] } '])
+def test_lire_tableau_json_vide(tmp_path, contenu):
+    chemin = tmp_path / "batiments.json"
+    chemin.write_text(contenu, encoding="utf-8")
+    assert list(lire_tableau_json(str(chemin), "batiments", taille_lecture=2)) == []
+
+
+@pytest.mark.parametrize("contenu", ['{"batiments": [{"gml_id": "b1"}, {"gml_', '[1, 2]', '{"batiments": [1 2]}'])
+def test_lire_tableau_json_invalide(tmp_path, contenu):
+    chemin = tmp_path / "batiments.json"
+    chemin.write_text(contenu, encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(lire_tableau_json(str(chemin), "batiments", taille_lecture=4))
+
+
+def test_ecrivain_colonnes(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_solutions, "TAILLE_BLOC", 2)
+    dossier = tmp_path / "liens"
+    ecrivain = EcrivainColonnes(str(dossier), {"batiment_id": TEXTE, "z": np.float64, "nb": np.int32})
+    lignes = [
+        {"batiment_id": "b1", "z": 0.5, "nb": 1},
+        {"batiment_id": "b2", "z": 1.0, "nb": 2},
+        {"batiment_id": "batiment_plus_long", "z": 2.5, "nb": 3}, # élargit la colonne de texte déjà écrite
+        {"batiment_id": "é", "z": -1.0, "nb": 4},
+        {"batiment_id": "b5", "z": 0.0, "nb": 5},
+    ]
+    for ligne in lignes:
+        ecrivain.ajouter(ligne)
+    ecrivain.fermer()
+
+    schema = json.loads((dossier / "schema.json").read_text(encoding="utf-8"))
+    assert schema == {"nb_lignes": 5, "colonnes": {"batiment_id": "<U18", "z": "<f8", "nb": "<i4"}}
+    for nom in ("batiment_id", "z", "nb"):
+        colonne = np.load(dossier / (nom + ".npy"), mmap_mode="r")
+        assert colonne.tolist() == [ligne[nom] for ligne in lignes]
+
+
+def test_ecrivain_colonnes_vide(tmp_path):
+    ecrivain = EcrivainColonnes(str(tmp_path), {"batiment_id": TEXTE, "z": np.float64})
+    ecrivain.fermer()
+    assert np.load(tmp_path / "batiment_id.npy").shape == (0,)
+    assert np.load(tmp_path / "z.npy").dtype == np.float64
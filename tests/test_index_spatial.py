@@ -0,0 +1,71 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from index_spatial import DECALAGE_CELLULE, IndexSpatial, construire_index, distances_locales
+
+
+def points(prefixe, nb, graine):
+    aleatoire = random.Random(graine)
+    # Autour de Rennes, à cheval sur le méridien de Greenwich pour avoir des numéros de cellule négatifs et positifs
+    return [
+        {"gml_id": f"{prefixe}{k}", "geo_point_2d": {"lat": aleatoire.uniform(48.09, 48.13), "lon": aleatoire.uniform(-0.02, 0.02)}}
+        for k in range(nb)
+    ]
+
+
+@pytest.fixture
+def index(tmp_path):
+    bat_file, parkings_file = tmp_path / "batiments.json", tmp_path / "parkings.json"
+    bat_file.write_text(json.dumps({"batiments": points("b", 300, 1)}), encoding="utf-8")
+    parkings_file.write_text(json.dumps(points("p", 60, 2)), encoding="utf-8") # liste brute, comme la source
+    construire_index(str(bat_file), str(parkings_file), str(tmp_path / "index"), taille_cellule_m=150)
+    return IndexSpatial(str(tmp_path / "index"))
+
+
+def test_cles_des_cellules(index):
+    for famille in ("batiments", "parkings"):
+        t = index.tableaux[famille]
+        cle = np.asarray(t["cle"])
+        assert np.all(np.diff(cle) >= 0)
+        cx = (cle >> 21) - DECALAGE_CELLULE
+        cy = (cle & ((1 << 21) - 1)) - DECALAGE_CELLULE
+        assert np.array_equal(cx, np.floor(np.asarray(t["lon"]) / index.pas_lon).astype(np.int64))
+        assert np.array_equal(cy, np.floor(np.asarray(t["lat"]) / index.pas_lat).astype(np.int64))
+        assert cx.min() < 0 <= cx.max()
+
+
+@pytest.mark.parametrize("R", [50, 149.9, 150, 420, 5000])
+def test_autour_identique_a_la_recherche_exhaustive(index, R):
+    t = index.tableaux["parkings"]
+    lats, lons = np.asarray(t["lat"]), np.asarray(t["lon"])
+    for k in range(0, 300, 7):
+        lat, lon = float(index.tableaux["batiments"]["lat"][k]), float(index.tableaux["batiments"]["lon"][k])
+        indices, distances = index.autour("parkings", lat, lon, R)
+        toutes = distances_locales(lat, lon, lats, lons)
+        assert sorted(indices.tolist()) == np.flatnonzero(toutes <= R).tolist()
+        assert distances == pytest.approx(toutes[indices])
+
+
+def test_position_et_couverture(index):
+    for gml_id in ("b0", "b17", "b299"):
+        assert index.identifiant("batiments", index.position("batiments", gml_id)) == gml_id
+    with pytest.raises(KeyError):
+        index.position("batiments", "b300")
+
+    couverture = index.parkings_autour_batiment("b17", 300)
+    k = index.position("batiments", "b17")
+    indices, distances = index.autour("parkings", float(index.tableaux["batiments"]["lat"][k]), float(index.tableaux["batiments"]["lon"][k]), 300)
+    assert couverture == {index.identifiant("parkings", i): pytest.approx(d) for i, d in zip(indices, distances)}
+
+
+def test_index_reconstruit_seulement_si_necessaire(tmp_path, index, capsys):
+    bat_file, parkings_file, dossier = str(tmp_path / "batiments.json"), str(tmp_path / "parkings.json"), str(tmp_path / "index")
+    capsys.readouterr()
+    construire_index(bat_file, parkings_file, dossier, taille_cellule_m=150)
+    assert "à jour" in capsys.readouterr().out
+    construire_index(bat_file, parkings_file, dossier, taille_cellule_m=300)
+    assert "construit" in capsys.readouterr().out
+    assert IndexSpatial(dossier).meta["taille_cellule_m"] == 300
@@ -0,0 +1,122 @@
+import json
+
+import pytest
+from shapely.geometry import box
+
+import traitement_donnees
+from index_spatial import IndexSpatial, construire_index
+from maj_incrementale import ecrire_instantane, mettre_a_jour_entites, mettre_a_jour_matrice_distances
+
+
+ZONE = box(-1.70, 48.10, -1.66, 48.12)
+
+
+def point(gml_id, lat, lon, **champs):
+    return dict(gml_id=gml_id, geo_point_2d={"lat": lat, "lon": lon}, **champs)
+
+
+def ecrire(chemin, contenu):
+    with open(chemin, 'w', encoding='utf-8') as f:
+        json.dump(contenu, f)
+
+
+def lire(chemin):
+    with open(chemin, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def rafraichir(tmp_path, source):
+    return mettre_a_jour_entites(
+        source, ZONE, str(tmp_path / "parkings.json"), str(tmp_path / "snapshot.json"), {"zone_id": "test"},
+        "parkings", nettoyer=dict, recapituler=lambda entites: {"nb_parkings": len(entites)}
+    )
+
+
+def test_mettre_a_jour_entites(tmp_path):
+    ecrire(tmp_path / "parkings.json", {"recapitulatif": {}, "parkings": []})
+    ecrire_instantane(str(tmp_path / "snapshot.json"), {"zone_id": "test"}, {})
+
+    source = [
+        point("a", 48.11, -1.68, nom="A"),
+        point("b", 48.11, -1.67),
+        point("c", 48.20, -1.68),            # hors zone
+        point("e", 48.105, -1.69),
+        point("f", 48.115, -1.69),
+    ]
+    changements = rafraichir(tmp_path, source)
+    assert sorted(changements["ajoutes"]) == ["a", "b", "e", "f"]
+
+    # Sans modification de la source, rien n'est retraité
+    assert not any(rafraichir(tmp_path, source).values())
+
+    source = [
+        point("a", 48.11, -1.68, nom="A2"),  # attribut modifié
+        point("b", 48.112, -1.67),           # déplacé dans la zone
+        point("c", 48.11, -1.675),           # entré dans la zone
+        point("d", 48.30, -1.68),            # nouveau, hors zone
+        point("f", 48.20, -1.69),            # sorti de la zone ; e disparaît de la source
+    ]
+    changements = rafraichir(tmp_path, source)
+    assert changements["modifies"] == ["a"]
+    assert changements["deplaces"] == ["b"]
+    assert changements["ajoutes"] == ["c"]
+    assert sorted(changements["supprimes"]) == ["e", "f"]
+
+    filtre = lire(tmp_path / "parkings.json")
+    assert filtre["recapitulatif"] == {"nb_parkings": 3}
+    assert {p["gml_id"]: p.get("nom") for p in filtre["parkings"]} == {"a": "A2", "b": None, "c": None}
+
+
+# Bâtiments et parkings avant et après une mise à jour des sources
+BATIMENTS_AVANT = [point(f"b{k}", 48.100 + 0.0007 * k, -1.680 + 0.0011 * (k % 4), nb_ve_potentiel=1.0) for k in range(8)]
+PARKINGS_AVANT = [point(f"p{k}", 48.101 + 0.0012 * k, -1.679 + 0.0009 * (k % 3), max_bornes=4) for k in range(5)]
+BATIMENTS_APRES = (
+    [b for b in BATIMENTS_AVANT if b["gml_id"] not in ("b1", "b2")]
+    + [point("b1", 48.1035, -1.6775, nb_ve_potentiel=1.0), point("b8", 48.1045, -1.6790, nb_ve_potentiel=2.0)]
+)
+PARKINGS_APRES = (
+    [p for p in PARKINGS_AVANT if p["gml_id"] not in ("p1", "p2")]
+    + [point("p1", 48.1020, -1.6800, max_bornes=4), point("p5", 48.1050, -1.6770, max_bornes=2)]
+)
+CHANGEMENTS_BAT = {"ajoutes": ["b8"], "supprimes": ["b2"], "deplaces": ["b1"], "modifies": []}
+CHANGEMENTS_PARK = {"ajoutes": ["p5"], "supprimes": ["p2"], "deplaces": ["p1"], "modifies": []}
+
+
+def ecrire_zone(dossier, batiments, parkings):
+    ecrire(dossier / "batiments.json", {"batiments": batiments})
+    ecrire(dossier / "parkings.json", {"parkings": parkings})
+    return str(dossier / "batiments.json"), str(dossier / "parkings.json")
+
+
+def comparer_matrices(obtenue, attendue):
+    assert [ligne["batiment_id"] for ligne in obtenue] == [ligne["batiment_id"] for ligne in attendue]
+    for ligne, ligne_attendue in zip(obtenue, attendue):
+        assert ligne["distances"] == pytest.approx(ligne_attendue["distances"], abs=1e-6)
+
+
+@pytest.mark.parametrize("avec_index", [False, True])
+def test_mettre_a_jour_matrice_identique_au_calcul_complet(tmp_path, avec_index):
+    Rmax = 250
+    for nom in ("avant", "apres", "reference"):
+        (tmp_path / nom).mkdir()
+    bat_avant, park_avant = ecrire_zone(tmp_path / "avant", BATIMENTS_AVANT, PARKINGS_AVANT)
+    bat_apres, park_apres = ecrire_zone(tmp_path / "apres", BATIMENTS_APRES, PARKINGS_APRES)
+    matrice = str(tmp_path / "matrice.json")
+    reference = str(tmp_path / "reference" / "matrice.json")
+
+    if avec_index:
+        construire_index(bat_avant, park_avant, str(tmp_path / "index_avant"), taille_cellule_m=100)
+        construire_index(bat_apres, park_apres, str(tmp_path / "index_apres"), taille_cellule_m=100)
+        traitement_donnees.calculer_matrice_distances_index(bat_avant, park_avant, str(tmp_path / "index_avant"), matrice, Rmax)
+        traitement_donnees.calculer_matrice_distances_index(bat_apres, park_apres, str(tmp_path / "index_apres"), reference, Rmax)
+        index = IndexSpatial(str(tmp_path / "index_apres"))
+    else:
+        traitement_donnees.calculer_matrice_distances_bat_parkings(bat_avant, park_avant, matrice)
+        traitement_donnees.calculer_matrice_distances_bat_parkings(bat_apres, park_apres, reference)
+        index, Rmax = None, None
+
+    nb_calculs = mettre_a_jour_matrice_distances(bat_apres, park_apres, matrice, CHANGEMENTS_BAT, CHANGEMENTS_PARK, index=index, Rmax=Rmax)
+    assert nb_calculs > 0
+    comparer_matrices(lire(matrice), lire(reference))
+    if avec_index:
+        assert all(d <= Rmax for ligne in lire(matrice) for d in ligne["distances"].values())
@@ -0,0 +1,63 @@
+import math
+
+import pytest
+
+from pipeline import Etape, chemin_critique, executer_pipeline, ordre_topologique
+
+
+def rien():
+    return None
+
+
+def diamant():
+    return [
+        Etape("d", rien, dependances=["b", "c"]),
+        Etape("b", rien, dependances=["a"]),
+        Etape("c", rien, dependances=["a"]),
+        Etape("a", rien),
+    ]
+
+
+def test_ordre_topologique():
+    ordre = ordre_topologique(diamant())
+    assert sorted(ordre) == ["a", "b", "c", "d"]
+    for etape in diamant():
+        for dependance in etape.dependances:
+            assert ordre.index(dependance) < ordre.index(etape.nom)
+
+
+def test_cycle_detecte():
+    etapes = [Etape("a", rien, dependances=["c"]), Etape("b", rien, dependances=["a"]), Etape("c", rien, dependances=["b"])]
+    with pytest.raises(ValueError, match="Cycle dans le pipeline : a -> c -> b -> a"):
+        ordre_topologique(etapes)
+    with pytest.raises(ValueError, match="Cycle"):
+        ordre_topologique([Etape("a", rien, dependances=["a"])])
+
+
+def test_graphe_invalide():
+    with pytest.raises(ValueError, match="inconnues"):
+        ordre_topologique([Etape("a", rien, dependances=["z"])])
+    with pytest.raises(ValueError, match="en double"):
+        ordre_topologique([Etape("a", rien), Etape("a", rien)])
+
+
+def test_chemin_critique():
+    durees = {"a": 1.0, "b": 5.0, "c": 2.0, "d": 1.0}
+    assert chemin_critique(diamant(), durees) == (["a", "b", "d"], 7.0)
+
+
+def test_executer_pipeline():
+    etapes = [
+        Etape("somme", sum, ([1, 2, 3],)),
+        Etape("factorielle", math.factorial, (10,), processus=True),
+        Etape("texte", str.format, ("{}-{}", 1, 2), dependances=["somme", "factorielle"]),
+    ]
+    resultats, rapport = executer_pipeline(etapes, nb_workers=2, verbeux=False)
+    assert resultats == {"somme": 6, "factorielle": 3628800, "texte": "1-2"}
+    assert rapport["chemin_critique"][-1] == "texte"
+    assert rapport["debuts_s"]["texte"] >= rapport["debuts_s"]["somme"] + rapport["durees_s"]["somme"] - 1e-6
+
+
+def test_echec_etape_propage():
+    with pytest.raises(ZeroDivisionError):
+        executer_pipeline([Etape("division", divmod, (1, 0))], nb_workers=1, verbeux=False)
@@ -0,0 +1,65 @@
+import math
+
+import pytest
+
+from service import ServiceOptimisation, lire_entier, lire_reel_positif
+
+
+@pytest.fixture
+def service():
+    # Service sans zone préchargée : seule la présence de la zone est vérifiée par valider
+    service = ServiceOptimisation([], params={"zone_id": "iris.163", "p": 20, "Rmax": 200, "max_connections_per_transformer": 3})
+    service.zones["iris.163"] = {}
+    yield service
+    service.executor.shutdown()
+
+
+@pytest.mark.parametrize("valeur, attendu", [(3, 3), (2.0, 2), ("7", 7), ("4.0", 4), (0, 0)])
+def test_lire_entier_valide(valeur, attendu):
+    assert lire_entier({"p": valeur}, "p", 20, 0) == attendu
+
+
+@pytest.mark.parametrize("valeur", [2.9, "2.5", True, None, [3], "abc", -1, float("nan"), float("inf")])
+def test_lire_entier_invalide(valeur):
+    with pytest.raises(ValueError):
+        lire_entier({"p": valeur}, "p", 20, 0)
+
+
+def test_lire_entier_defaut_et_minimum():
+    assert lire_entier({}, "p", 20, 0) == 20
+    with pytest.raises(ValueError, match="supérieur ou égal à 1"):
+        lire_entier({"max_connections_per_transformer": 0}, "max_connections_per_transformer", 3, 1)
+
+
+@pytest.mark.parametrize("valeur, attendu", [(150, 150.0), ("150.5", 150.5), (1e-3, 1e-3)])
+def test_lire_reel_positif_valide(valeur, attendu):
+    assert lire_reel_positif({"Rmax": valeur}, "Rmax", 200) == attendu
+
+
+@pytest.mark.parametrize("valeur", [0, -5, "nan", "inf", float("nan"), float("-inf"), False, "deux cents", {}])
+def test_lire_reel_positif_invalide(valeur):
+    with pytest.raises(ValueError):
+        lire_reel_positif({"Rmax": valeur}, "Rmax", 200)
+
+
+def test_valider_complete_par_defaut(service):
+    assert service.valider({"p": "5"}) == {"zone_id": "iris.163", "p": 5, "Rmax": 200.0, "max_connections_per_transformer": 3}
+
+
+def test_valider_rejette(service):
+    with pytest.raises(TypeError):
+        service.valider([1, 2])
+    with pytest.raises(KeyError):
+        service.valider({"zone_id": "iris.999"})
+    with pytest.raises(ValueError):
+        service.valider({"Rmax": math.inf})
+
+
+def test_requete_invalide_comptee(service):
+    code, corps = service.soumettre({"p": -3})
+    assert code == 400 and "p" in corps["erreur"]
+    metriques = service.metriques()
+    assert metriques["nb_requetes"] == 1
+    assert metriques["nb_erreurs"] == 1
+    assert metriques["en_attente"] == 0
+    assert metriques["latence_s"]["max"] is not None
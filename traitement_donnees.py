@@ -4,6 +4,85 @@ from shapely.geometry import shape, Point
 from geopy.distance import geodesic
 import random
 
+from entites import TableEntites, ecrire_meta_matrice
+
+
+
+CATEGORIES_BATIMENTS = ["geo_point_2d", "geo_shape", "gml_id", "nb_maison", "nb_appart", "nb_occ_theor_18plus"]
+CATEGORIES_PARKINGS = ["geo_point_2d", "geo_shape", "gml_id", "type", "nb_pl", "categorie"]
+
+
+def trouver_zone(iris_file_path, zone_id):
+    """
+    Renvoie le polygone (shapely) de la zone IRIS d'identifiant `zone_id`.
+    """
+    with open(iris_file_path, 'r', encoding='utf-8') as f:
+        zones = json.load(f)
+
+    for zone in zones:
+        if zone.get("gml_id") == zone_id:
+            return shape(zone.get("geo_shape")["geometry"])
+
+    raise ValueError(f"Zone avec l'identifiant '{zone_id}' non trouvée dans le fichier des zones.")
+
+
+def est_dans_zone(item, zone_polygon):
+    """
+    Indique si le centre (`geo_point_2d`) d'un bâtiment ou d'un parking est dans la zone.
+    """
+    if "geo_point_2d" not in item:
+        return False
+    lon, lat = item["geo_point_2d"]["lon"], item["geo_point_2d"]["lat"]
+    return Point(lon, lat).within(zone_polygon)
+
+
+def nettoyer_batiment(item, N_ve_2000):
+    """
+    Garde uniquement les champs utiles d'un bâtiment et calcule son nombre de VE potentiel.
+    """
+    batiment = {key: item[key] for key in CATEGORIES_BATIMENTS if key in item}
+    nb_occ_theor_18plus = batiment.get("nb_occ_theor_18plus", 0) or 0
+    batiment["nb_ve_potentiel"] =  N_ve_2000 * nb_occ_theor_18plus/2000 # Pas de VE si aucun adulte
+    return batiment
+
+
+def recapitulatif_batiments(batiments_nettoyes, N_ve_2000):
+    """
+    Calcule les totaux du récapitulatif du fichier des bâtiments filtrés.
+    """
+    nb_appart_total = sum(batiment.get("nb_appart", 0) or 0 for batiment in batiments_nettoyes)    
+    nb_maison_total = sum(batiment.get("nb_maison", 0) or 0 for batiment in batiments_nettoyes)
+    nb_occ_theor_18plus_total = sum(batiment.get("nb_occ_theor_18plus", 0) or 0 for batiment in batiments_nettoyes)
+    nb_ve_total = N_ve_2000 * nb_occ_theor_18plus_total // 2000
+
+    return {
+        "nb_appart_total": nb_appart_total,
+        "nb_maison_total": nb_maison_total,
+        "nb_occ_theor_18plus_total": nb_occ_theor_18plus_total,
+        "nb_ve_total": nb_ve_total
+    }
+
+
+def nettoyer_parking(item):
+    """
+    Garde uniquement les champs utiles d'un parking et ajoute le champ `max_bornes`.
+    """
+    parking = {key: item[key] for key in CATEGORIES_PARKINGS if key in item}
+
+    # Ajouter le champ `max_bornes` en fonction du nombre de places
+    nb_places = parking.get("nb_pl", 0) or 0
+    parking["max_bornes"] = int(0.1*nb_places) + 1 # Prendre la partie entière supérieure de 10% des places
+    return parking
+
+
+def recapitulatif_parkings(parkings_nettoyes):
+    """
+    Calcule les totaux du récapitulatif du fichier des parkings filtrés.
+    """
+    return {
+        "total_parkings": len(parkings_nettoyes),
+        "total_max_bornes": sum(parking["max_bornes"] for parking in parkings_nettoyes)
+    }
 
 
 def traiter_batiments(bat_file_path, iris_file_path, bat_output_path, zone_id, N_ve_2000):
@@ -28,74 +107,28 @@ def traiter_batiments(bat_file_path, iris_file_path, bat_output_path, zone_id, N
     with open(bat_file_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
 
-    # Charger le fichier JSON des zones
-    with open(iris_file_path, 'r', encoding='utf-8') as f:
-        zones = json.load(f)
-
     ###########################################################
     # Filtrer les bâtiments dans la zone cible
     ###########################################################
 
-    # Trouver la zone cible par son gml_id
-    zone_geographique = None
-    for zone in zones:
-        if zone.get("gml_id") == zone_id:
-            zone_geographique = zone.get("geo_shape")
-            break
-
-    if not zone_geographique:
-        raise ValueError(f"Zone avec l'identifiant '{zone_id}' non trouvée dans le fichier des zones.")
-
-    # Créer le polygone de la zone cible
-    zone_polygon = shape(zone_geographique["geometry"])
+    # Polygone de la zone cible, trouvée par son gml_id
+    zone_polygon = trouver_zone(iris_file_path, zone_id)
 
     # Filtrer les bâtiments en vérifiant si leur centre est dans la zone
-    batiments_dans_zone = []
-    for item in data:
-        if "geo_point_2d" in item:
-            lon, lat = item["geo_point_2d"]["lon"], item["geo_point_2d"]["lat"]
-            center_point = Point(lon, lat)
-            # Vérifier si le point central est dans la zone
-            if center_point.within(zone_polygon):
-                batiments_dans_zone.append(item)
-    
-    ###########################################################
-    # Nettoyer les champs inutiles
-    ###########################################################
-
-    # Garder uniquement les catégories souhaitées
-    categories_a_conserver = ["geo_point_2d", "geo_shape", "gml_id", "nb_maison", "nb_appart", "nb_occ_theor_18plus"]
-    batiments_nettoyes = [
-        {key: item[key] for key in categories_a_conserver if key in item}
-        for item in batiments_dans_zone
-    ]
-
+    batiments_dans_zone = [item for item in data if est_dans_zone(item, zone_polygon)]
 
     ###########################################################
-    # Générer un nombre aléatoire de véhicules électriques (VE)
+    # Nettoyer les champs inutiles et générer le nombre de VE
     ###########################################################
 
-    for batiment in batiments_nettoyes:
-        nb_occ_theor_18plus = batiment.get("nb_occ_theor_18plus", 0) or 0
-        batiment["nb_ve_potentiel"] =  N_ve_2000 * nb_occ_theor_18plus/2000 # Pas de VE si aucun adulte
+    batiments_nettoyes = [nettoyer_batiment(item, N_ve_2000) for item in batiments_dans_zone]
 
 
     ###########################################################
     # Calculer les totaux pour le récapitulatif
     ###########################################################
 
-    # Calculer les totaux pour le récapitulatif
-    nb_appart_total = sum(batiment.get("nb_appart", 0) or 0 for batiment in batiments_nettoyes)    
-    nb_maison_total = sum(batiment.get("nb_maison", 0) or 0 for batiment in batiments_nettoyes)
-    nb_occ_theor_18plus_total = sum(batiment.get("nb_occ_theor_18plus", 0) or 0 for batiment in batiments_nettoyes)
-    nb_ve_total = N_ve_2000 * nb_occ_theor_18plus_total // 2000
-
-    recapitulatif = {
-        "nb_appart_total": nb_appart_total,
-        "nb_maison_total": nb_maison_total,
-        "nb_occ_theor_18plus_total": nb_occ_theor_18plus_total,
-        "nb_ve_total": nb_ve_total
-    }
+    recapitulatif = recapitulatif_batiments(batiments_nettoyes, N_ve_2000)
 
     # Ajouter le récapitulatif au début du fichier JSON
     resultat = {
@@ -129,66 +162,27 @@ def traiter_parkings(park_file_path, iris_file_path, park_output_path, zone_id):
     Returns:
     - None
     """
-    import json
-    from shapely.geometry import shape, Point
-
     # Charger le fichier JSON des parkings
     with open(park_file_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
 
-    # Charger le fichier JSON des zones
-    with open(iris_file_path, 'r', encoding='utf-8') as f:
-        zones = json.load(f)
-
-    # Trouver la zone cible par son gml_id
-    zone_geographique = None
-    for zone in zones:
-        if zone.get("gml_id") == zone_id:
-            zone_geographique = zone.get("geo_shape")
-            break
-
-    if not zone_geographique:
-        raise ValueError(f"Zone avec l'identifiant '{zone_id}' non trouvée dans le fichier des zones.")
-
-    # Créer le polygone de la zone cible
-    zone_polygon = shape(zone_geographique["geometry"])
+    # Polygone de la zone cible, trouvée par son gml_id
+    zone_polygon = trouver_zone(iris_file_path, zone_id)
 
     # Filtrer les parkings en vérifiant si leur centre est dans la zone
-    parkings_dans_zone = []
-    for item in data:
-        if "geo_point_2d" in item:
-            lon, lat = item["geo_point_2d"]["lon"], item["geo_point_2d"]["lat"]
-            center_point = Point(lon, lat)
-            # Vérifier si le point central est dans la zone
-            if center_point.within(zone_polygon):
-                parkings_dans_zone.append(item)
-
-    # Garder uniquement les catégories souhaitées
-    categories_a_conserver = ["geo_point_2d", "geo_shape", "gml_id", "type", "nb_pl", "categorie"]
-    parkings_nettoyes = []
-    total_parkings = 0
-    total_max_bornes = 0
-
-    for item in parkings_dans_zone:
-        parking = {key: item[key] for key in categories_a_conserver if key in item}
+    parkings_dans_zone = [item for item in data if est_dans_zone(item, zone_polygon)]
 
-        # Ajouter le champ `max_bornes` en fonction du nombre de places
-        nb_places = parking.get("nb_pl", 0) or 0
+    # Garder uniquement les catégories souhaitées et ajouter le champ `max_bornes`
+    parkings_nettoyes = [nettoyer_parking(item) for item in parkings_dans_zone]
 
-        parking["max_bornes"] = int(0.1*nb_places) + 1 # Prendre la partie entière supérieure de 10% des places
-
-        # Compter les parkings et les bornes maximales
-        total_parkings += 1
-        total_max_bornes += parking["max_bornes"]
-
-        parkings_nettoyes.append(parking)
+    # Compter les parkings et les bornes maximales
+    recapitulatif = recapitulatif_parkings(parkings_nettoyes)
+    total_parkings = recapitulatif["total_parkings"]
+    total_max_bornes = recapitulatif["total_max_bornes"]
 
     # Ajouter les informations globales dans le JSON
     resultat = {
-        "recapitulatif": {
-            "total_parkings": total_parkings,
-            "total_max_bornes": total_max_bornes
-        },
+        "recapitulatif": recapitulatif,
         "parkings": parkings_nettoyes
     }
 
@@ -214,22 +208,8 @@ def traiter_transfo(tf_file_path, iris_file_path, tf_output_path, zone_id):
     Returns:
         - None
     """
-    # Charger le fichier JSON des zones IRIS
-    with open(iris_file_path, 'r', encoding='utf-8') as f:
-        zones = json.load(f)
-
-    # Trouver la zone cible par son gml_id
-    zone_geographique = None
-    for zone in zones:
-        if zone.get("gml_id") == zone_id:
-            zone_geographique = zone.get("geo_shape")
-            break
-
-    if not zone_geographique:
-        raise ValueError(f"Zone avec l'identifiant '{zone_id}' non trouvée dans le fichier des zones IRIS.")
-
-    # Créer le polygone de la zone cible
-    zone_polygon = shape(zone_geographique["geometry"])
+    # Polygone de la zone IRIS cible, trouvée par son gml_id
+    zone_polygon = trouver_zone(iris_file_path, zone_id)
 
     # Lire le fichier CSV des transformateurs
     transformateurs_dans_zone = []
@@ -283,47 +263,147 @@ def calculer_matrice_distances_bat_parkings(bat_file_path, parkings_file, output
     Returns:
     - None
     """
-    # Charger les fichiers JSON
+    # Charger les fichiers JSON en tables d'entités (tous les bâtiments, y compris sans demande)
     with open(bat_file_path, 'r', encoding='utf-8') as f:
-        data_bat = json.load(f)
-
-    # Extraire les bâtiments de la structure JSON
-    batiments = data_bat.get("batiments", [])
+        batiments = TableEntites.depuis_batiments(json.load(f), demande_seule=False)
 
     with open(parkings_file, 'r', encoding='utf-8') as f:
-        data_parkings = json.load(f)
-    
-    parkings = data_parkings.get("parkings", [])
-
-    # Extraire les points des bâtiments et des parkings
-    points_batiments = [
-        (batiment["gml_id"], (batiment["geo_point_2d"]["lat"], batiment["geo_point_2d"]["lon"]))
-        for batiment in batiments
-    ]
-    points_parkings = [
-        (parking["gml_id"], (parking["geo_point_2d"]["lat"], parking["geo_point_2d"]["lon"]))
-        for parking in parkings
-    ]
+        parkings = TableEntites.depuis_parkings(json.load(f))
 
     # Calculer la matrice des distances
     matrice_distances = []
-    for id_batiment, coord_batiment in points_batiments:
-        distances = {
-            "batiment_id": id_batiment,
-            "distances": {}
-        }
-        for id_parking, coord_parking in points_parkings:
-            distance = geodesic(coord_batiment, coord_parking).meters
-            distances["distances"][id_parking] = distance
-        matrice_distances.append(distances)
+    for j in range(len(batiments)):
+        coord_batiment = batiments.point(j)
+        matrice_distances.append({
+            "batiment_id": batiments.ids[j],
+            "distances": {parkings.ids[i]: geodesic(coord_batiment, parkings.point(i)).meters for i in range(len(parkings))}
+        })
 
     # Sauvegarder la matrice dans un fichier JSON
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(matrice_distances, f, ensure_ascii=False, indent=4)
+    ecrire_meta_matrice(output_file, "geodesique")
 
     print(f"La matrice des distances a été sauvegardée dans '{output_file}'.")
 
 
+def calculer_matrice_distances_reseau(bat_file_path, parkings_file, graphe_file_path, output_file, Rmax):
+    """
+    Calcule une matrice creuse des distances piétonnes entre bâtiments et parkings, à partir
+    d'un graphe piéton local (voir reseau_pietons.charger_graphe pour le format).
+    Seules les distances inférieures ou égales à Rmax sont conservées : la matrice produite a le
+    même format que celle de `calculer_matrice_distances_bat_parkings` et peut être passée telle quelle à mclp_deloc.
+
+    Le résultat est mis en cache : une clé (graphe, bâtiments, parkings, Rmax) est enregistrée à côté
+    de la matrice, et le calcul n'est pas refait si elle n'a pas changé.
+
+    Args:
+    - bat_file_path (str): Chemin du fichier JSON des bâtiments sélectionnés.
+    - parkings_file (str): Chemin du fichier JSON des parkings sélectionnés.
+    - graphe_file_path (str): Chemin du fichier JSON du graphe piéton.
+    - output_file (str): Chemin du fichier pour sauvegarder la matrice des distances.
+    - Rmax (float): Distance maximale de couverture.
+
+    Returns:
+    - None
+    """
+    import hashlib
+    import os
+    import reseau_pietons
+
+    # Charger les fichiers JSON en tables d'entités
+    with open(bat_file_path, 'r', encoding='utf-8') as f:
+        batiments = TableEntites.depuis_batiments(json.load(f), demande_seule=False)
+
+    with open(parkings_file, 'r', encoding='utf-8') as f:
+        parkings = TableEntites.depuis_parkings(json.load(f))
+
+    # Points des bâtiments et des parkings, au format de reseau_pietons.distances_reseau
+    points_batiments = [(batiments.ids[j], batiments.point(j)) for j in range(len(batiments))]
+    points_parkings = [(parkings.ids[i], parkings.point(i)) for i in range(len(parkings))]
+
+    # Clé du cache
+    stat_graphe = os.stat(graphe_file_path)
+    cle = hashlib.sha256(json.dumps(
+        [os.path.abspath(graphe_file_path), stat_graphe.st_size, stat_graphe.st_mtime_ns, Rmax, points_batiments, points_parkings]
+    ).encode('utf-8')).hexdigest()
+    cle_file = output_file + ".cle"
+    source = "reseau:" + hashlib.sha256(json.dumps(
+        [os.path.abspath(graphe_file_path), stat_graphe.st_size, stat_graphe.st_mtime_ns]
+    ).encode('utf-8')).hexdigest()[:16]
+
+    if os.path.exists(output_file) and os.path.exists(cle_file):
+        with open(cle_file, 'r', encoding='utf-8') as f:
+            if f.read().strip() == cle:
+                ecrire_meta_matrice(output_file, source, Rmax)
+                print(f"Matrice des distances piétonnes à jour dans '{output_file}' (cache).")
+                return
+
+    # Calculer la matrice creuse des distances
+    noeuds, adjacence = reseau_pietons.charger_graphe(graphe_file_path)
+    distances = reseau_pietons.distances_reseau(points_batiments, points_parkings, noeuds, adjacence, Rmax)
+    matrice_distances = [{"batiment_id": id_batiment, "distances": distances[id_batiment]} for id_batiment in batiments.ids]
+
+    # Sauvegarder la matrice dans un fichier JSON
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(matrice_distances, f, ensure_ascii=False, indent=4)
+    with open(cle_file, 'w', encoding='utf-8') as f:
+        f.write(cle)
+    ecrire_meta_matrice(output_file, source, Rmax)
+
+    nb_arcs = sum(len(entry["distances"]) for entry in matrice_distances)
+    print(f"La matrice des distances piétonnes ({nb_arcs} couples à moins de {Rmax} m) a été sauvegardée dans '{output_file}'.")
+
+
+def calculer_matrice_distances_index(bat_file_path, parkings_file, dossier_index, output_file, Rmax):
+    """
+    Calcule une matrice creuse des distances bâtiments-parkings (distances <= Rmax) à partir d'un
+    index spatial persistant (voir index_spatial.py), sans évaluer tous les couples bâtiment-parking.
+    La matrice produite a le même format que celle de `calculer_matrice_distances_bat_parkings`.
+
+    Args:
+    - bat_file_path (str): Chemin du fichier JSON des bâtiments sélectionnés.
+    - parkings_file (str): Chemin du fichier JSON des parkings sélectionnés.
+    - dossier_index (str): Dossier de l'index spatial.
+    - output_file (str): Chemin du fichier pour sauvegarder la matrice des distances.
+    - Rmax (float): Distance maximale de couverture.
+
+    Returns:
+    - None
+    """
+    from index_spatial import IndexSpatial
+
+    index = IndexSpatial(dossier_index)
+
+    # Charger les fichiers JSON en tables d'entités
+    with open(bat_file_path, 'r', encoding='utf-8') as f:
+        batiments = TableEntites.depuis_batiments(json.load(f), demande_seule=False)
+
+    with open(parkings_file, 'r', encoding='utf-8') as f:
+        parkings = TableEntites.depuis_parkings(json.load(f))
+
+    # Listes de couverture lues dans l'index, restreintes aux parkings de la zone
+    ids_parkings = index.tableaux["parkings"]["ids"]
+    matrice_distances = []
+    for j in range(len(batiments)):
+        positions, distances = index.autour("parkings", batiments.lat[j], batiments.lon[j], Rmax)
+        matrice_distances.append({
+            "batiment_id": batiments.ids[j],
+            "distances": {
+                str(ids_parkings[k]): distance
+                for k, distance in zip(positions.tolist(), distances.tolist()) if str(ids_parkings[k]) in parkings
+            }
+        })
+
+    # Sauvegarder la matrice dans un fichier JSON
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(matrice_distances, f, ensure_ascii=False, indent=4)
+    ecrire_meta_matrice(output_file, "index", Rmax)
+
+    nb_arcs = sum(len(entry["distances"]) for entry in matrice_distances)
+    print(f"La matrice des distances ({nb_arcs} couples à moins de {Rmax} m, index spatial) a été sauvegardée dans '{output_file}'.")
+
+
 def calculer_matrice_distances_tf_parkings(tf_file_path, selected_sites_path, output_file):
     """
     Calcule une matrice des distances entre des transformateurs et des parkings sélectionnés avec des bornes.
@@ -336,36 +416,20 @@ def calculer_matrice_distances_tf_parkings(tf_file_path, selected_sites_path, ou
     Returns:
     - None
     """
-    # Charger les fichiers JSON
+    # Charger les transformateurs et les sites sélectionnés en tables d'entités
     with open(tf_file_path, 'r', encoding='utf-8') as f:
-        transformateurs = json.load(f)
+        transformateurs = TableEntites.depuis_transfos(json.load(f))
 
-    # Charger le fichier JSON des sites sélectionnés
     with open(selected_sites_path, 'r', encoding='utf-8') as f:
-        selected_sites = json.load(f)
-
-    # Construire les points des parkings à partir de selected_sites
-    points_parkings = [
-        (site["gml_id"], (site["geo_point"]["lat"], site["geo_point"]["lon"]))
-        for site in selected_sites
-    ]
-
-    # Extraire les points des transformateurs
-    points_transformateurs = [
-        (transfo["gml_id"], (float(transfo["Geo Point"].split(",")[0]), float(transfo["Geo Point"].split(",")[1])))
-        for transfo in transformateurs
-    ]
+        sites = TableEntites.depuis_sites(json.load(f))
 
     matrice_distances = []
-    for id_parking, coord_parking in points_parkings:
-        distances = {
-            "parking_id": id_parking,
-            "distances": {}
-        }
-        for id_transfo, coord_transfo in points_transformateurs:
-            distance = geodesic(coord_parking, coord_transfo).meters
-            distances["distances"][id_transfo] = distance
-        matrice_distances.append(distances)
+    for i in range(len(sites)):
+        coord_parking = sites.point(i)
+        matrice_distances.append({
+            "parking_id": sites.ids[i],
+            "distances": {transformateurs.ids[t]: geodesic(coord_parking, transformateurs.point(t)).meters for t in range(len(transformateurs))}
+        })
 
     # Sauvegarder la matrice dans un fichier JSON
     with open(output_file, 'w', encoding='utf-8') as f:
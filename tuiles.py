@@ -0,0 +1,288 @@
+import os
+import json
+import glob
+import hashlib
+from math import pi, log, tan, radians, cos, floor
+from concurrent.futures import ProcessPoolExecutor
+
+
+RAYON_MERCATOR = 6378137.0 # rayon de la sphère de la projection Web Mercator (EPSG:3857)
+ORIGINE = pi * RAYON_MERCATOR
+TAILLE_TUILE_PX = 256
+VERSION_STYLE = 1 # à incrémenter quand le rendu change, pour forcer la régénération des tuiles
+
+
+def vers_mercator(lon, lat):
+    """
+    Convertit des coordonnées (lon, lat) en mètres Web Mercator (EPSG:3857).
+    """
+    return RAYON_MERCATOR * radians(lon), RAYON_MERCATOR * log(tan(pi / 4 + radians(lat) / 2))
+
+
+def vers_mercator_tableau(coords):
+    """
+    Version vectorisée de `vers_mercator` pour un tableau numpy de coordonnées (lon, lat).
+    """
+    import numpy as np
+    lon, lat = coords[:, 0], coords[:, 1]
+    return np.column_stack([RAYON_MERCATOR * np.radians(lon), RAYON_MERCATOR * np.log(np.tan(pi / 4 + np.radians(lat) / 2))])
+
+
+def taille_tuile_m(zoom):
+    return 2 * ORIGINE / 2 ** zoom
+
+
+def bornes_tuile(zoom, x, y):
+    """
+    Emprise (xmin, ymin, xmax, ymax) en mètres Web Mercator de la tuile XYZ (zoom, x, y).
+    """
+    taille = taille_tuile_m(zoom)
+    xmin = -ORIGINE + x * taille
+    ymax = ORIGINE - y * taille
+    return xmin, ymax - taille, xmin + taille, ymax
+
+
+def tuiles_emprise(zoom, xmin, ymin, xmax, ymax):
+    """
+    Liste des tuiles (x, y) du niveau `zoom` qui intersectent une emprise en mètres Web Mercator.
+    """
+    taille = taille_tuile_m(zoom)
+    n = 2 ** zoom
+    x0, x1 = max(int(floor((xmin + ORIGINE) / taille)), 0), min(int(floor((xmax + ORIGINE) / taille)), n - 1)
+    y0, y1 = max(int(floor((ORIGINE - ymax) / taille)), 0), min(int(floor((ORIGINE - ymin) / taille)), n - 1)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def charger_entites(bat_files, selected_sites_files, asso_files, transfo_files, Rmax):
+    """
+    Charge et projette en Web Mercator les entités à représenter, pour une ou plusieurs zones.
+
+    Returns:
+        - dict : "batiments" (empreinte, centre, demande), "sites" (centre, nb de bornes, rayon de couverture),
+          "transfos" (centre, nb de connexions) et "liens" (segments parking-transformateur).
+    """
+    from shapely.geometry import shape
+    import shapely
+
+    batiments = []
+    for bat_file in bat_files:
+        with open(bat_file, 'r', encoding='utf-8') as f:
+            for batiment in json.load(f).get("batiments", []):
+                centre = vers_mercator(batiment["geo_point_2d"]["lon"], batiment["geo_point_2d"]["lat"])
+                empreinte = None
+                if "geo_shape" in batiment:
+                    geometrie = shape(batiment["geo_shape"]["geometry"])
+                    empreinte = shapely.transform(geometrie, vers_mercator_tableau)
+                batiments.append({"id": batiment["gml_id"], "centre": centre, "empreinte": empreinte, "demande": batiment.get("nb_ve_potentiel", 0)})
+
+    sites, points_sites = [], {}
+    for sites_file in selected_sites_files:
+        with open(sites_file, 'r', encoding='utf-8') as f:
+            for site in json.load(f):
+                lat = site["geo_point"]["lat"]
+                centre = vers_mercator(site["geo_point"]["lon"], lat)
+                # Les distances Web Mercator sont dilatées d'un facteur 1/cos(lat)
+                sites.append({"id": site["gml_id"], "centre": centre, "nb_bornes": site["nb_bornes_installees"], "rayon": Rmax / cos(radians(lat))})
+                points_sites[site["gml_id"]] = centre
+
+    associations = {}
+    for asso_file in asso_files:
+        with open(asso_file, 'r', encoding='utf-8') as f:
+            associations.update(json.load(f))
+
+    transfos, liens = [], []
+    for transfo_file in transfo_files:
+        with open(transfo_file, 'r', encoding='utf-8') as f:
+            for tf in json.load(f):
+                lat, lon = map(float, tf["Geo Point"].split(","))
+                centre = vers_mercator(lon, lat)
+                bornes = associations.get(tf["gml_id"], [])
+                transfos.append({"id": tf["gml_id"], "centre": centre, "nb_connexions": len(bornes)})
+                for parking_id in sorted({borne_id.split('.borne_')[0] for borne_id in bornes}):
+                    if parking_id in points_sites:
+                        liens.append({"id": f"{tf['gml_id']}-{parking_id}", "segment": (points_sites[parking_id], centre)})
+
+    return {"batiments": batiments, "sites": sites, "transfos": transfos, "liens": liens}
+
+
+def contenus_tuiles(entites, zoom, zoom_empreintes=16, zoom_min_sans_demande=15):
+    """
+    Répartit les entités dans les tuiles d'un niveau de zoom, avec un niveau de détail adapté :
+    sous `zoom_empreintes`, les bâtiments sont de simples points (et ceux sans demande ne sont affichés
+    qu'à partir de `zoom_min_sans_demande`) ; au-delà, les empreintes sont simplifiées à la taille d'un pixel.
+
+    Returns:
+        - dict : {(x, y): contenu de la tuile (primitives de dessin, sérialisables)}.
+    """
+    m_par_px = taille_tuile_m(zoom) / TAILLE_TUILE_PX
+    marge = 12 * m_par_px # les symboles ponctuels débordent de leur position de quelques pixels
+    contenus = {}
+
+    def ajouter(emprise, cle, primitive):
+        xmin, ymin, xmax, ymax = emprise
+        for tuile in tuiles_emprise(zoom, xmin - marge, ymin - marge, xmax + marge, ymax + marge):
+            contenu = contenus.setdefault(tuile, {"cercles": [], "polygones": [], "points_batiments": [], "liens": [], "transfos": [], "sites": []})
+            contenu[cle].append(primitive)
+
+    for site in entites["sites"]:
+        x, y = site["centre"]
+        r = site["rayon"]
+        ajouter((x - r, y - r, x + r, y + r), "cercles", (round(x, 2), round(y, 2), round(r, 2)))
+
+    for batiment in entites["batiments"]:
+        if batiment["demande"] <= 0 and zoom < zoom_min_sans_demande:
+            continue
+        if zoom >= zoom_empreintes and batiment["empreinte"] is not None:
+            empreinte = batiment["empreinte"].simplify(m_par_px, preserve_topology=True)
+            polygones = getattr(empreinte, "geoms", [empreinte])
+            for polygone in polygones:
+                if polygone.is_empty or polygone.geom_type != "Polygon":
+                    continue
+                coords = [(round(px, 2), round(py, 2)) for px, py in polygone.exterior.coords]
+                ajouter(polygone.bounds, "polygones", (coords, batiment["demande"] > 0))
+        else:
+            x, y = batiment["centre"]
+            ajouter((x, y, x, y), "points_batiments", (round(x, 2), round(y, 2), batiment["demande"] > 0))
+
+    for lien in entites["liens"]:
+        (x0, y0), (x1, y1) = lien["segment"]
+        ajouter((min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)), "liens", (round(x0, 2), round(y0, 2), round(x1, 2), round(y1, 2)))
+
+    for tf in entites["transfos"]:
+        x, y = tf["centre"]
+        ajouter((x, y, x, y), "transfos", (round(x, 2), round(y, 2), tf["nb_connexions"]))
+
+    for site in entites["sites"]:
+        x, y = site["centre"]
+        ajouter((x, y, x, y), "sites", (round(x, 2), round(y, 2), site["nb_bornes"]))
+
+    return contenus
+
+
+def empreinte_contenu(zoom, contenu):
+    donnees = json.dumps([VERSION_STYLE, zoom, contenu], sort_keys=True).encode('utf-8')
+    return hashlib.blake2b(donnees, digest_size=12).hexdigest()
+
+
+def rendre_tuile(zoom, x, y, contenu, fichier, max_connections_per_transformer=3):
+    """
+    Dessine une tuile PNG transparente de 256 px (à superposer à un fond de carte).
+    Utilise directement l'API objet de matplotlib (Figure + canvas Agg), sans état global pyplot.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.patches import Circle
+    from matplotlib.collections import PatchCollection, PolyCollection, LineCollection
+
+    xmin, ymin, xmax, ymax = bornes_tuile(zoom, x, y)
+    fig = Figure(figsize=(1, 1), dpi=TAILLE_TUILE_PX)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_xlim(xmin, xmax)
+    ax.set_ylim(ymin, ymax)
+    ax.set_axis_off()
+    echelle = min(1.0, 2 ** (zoom - 16)) # taille des symboles réduite aux petits zooms
+
+    if contenu["cercles"]:
+        ax.add_collection(PatchCollection([Circle((cx, cy), r) for cx, cy, r in contenu["cercles"]],
+                                          facecolor='lightcoral', edgecolor='none', alpha=0.2))
+    if contenu["polygones"]:
+        ax.add_collection(PolyCollection([coords for coords, _ in contenu["polygones"]],
+                                         facecolors=['violet' if demande else 'lightgray' for _, demande in contenu["polygones"]],
+                                         edgecolors='none'))
+    if contenu["points_batiments"]:
+        ax.scatter([p[0] for p in contenu["points_batiments"]], [p[1] for p in contenu["points_batiments"]],
+                   c=['violet' if p[2] else 'lightgray' for p in contenu["points_batiments"]], s=2 * echelle, linewidths=0)
+    if contenu["liens"]:
+        ax.add_collection(LineCollection([((x0, y0), (x1, y1)) for x0, y0, x1, y1 in contenu["liens"]],
+                                         colors='gray', linestyles='--', linewidths=0.3))
+    if contenu["transfos"]:
+        ax.scatter([t[0] for t in contenu["transfos"]], [t[1] for t in contenu["transfos"]],
+                   c=['red' if t[2] >= max_connections_per_transformer else 'green' for t in contenu["transfos"]],
+                   s=12 * echelle, linewidths=0)
+    if contenu["sites"]:
+        ax.scatter([s[0] for s in contenu["sites"]], [s[1] for s in contenu["sites"]],
+                   s=[(s[2] * 4 + 4) * echelle for s in contenu["sites"]], color='blue', linewidths=0)
+        if zoom >= 16:
+            for sx, sy, nb_bornes in contenu["sites"]:
+                ax.text(sx, sy, str(nb_bornes), fontsize=1.5, ha='center', va='bottom', color='darkred', weight='bold')
+
+    os.makedirs(os.path.dirname(fichier), exist_ok=True)
+    fig.savefig(fichier, dpi=TAILLE_TUILE_PX, transparent=True)
+    return fichier
+
+
+def generer_tuiles(bat_files, selected_sites_files, asso_files, transfo_files, dossier_tuiles, Rmax,
+                   zooms=range(12, 18), nb_workers=4, max_connections_per_transformer=3):
+    """
+    Génère les tuiles XYZ ({z}/{x}/{y}.png) des sites sélectionnés, cercles de couverture, bâtiments et
+    liens parkings-transformateurs, pour une ou plusieurs zones, en parallèle sur plusieurs processus.
+
+    Un manifeste conserve l'empreinte du contenu de chaque tuile : seules les tuiles dont le contenu
+    a changé (par exemple autour des sites d'une nouvelle solution) sont régénérées, et les tuiles
+    devenues vides sont supprimées.
+
+    Args:
+        - bat_files, selected_sites_files, asso_files, transfo_files (list): Fichiers des zones à représenter.
+        - dossier_tuiles (str): Dossier racine des tuiles.
+        - Rmax (float): Rayon de couverture des bornes.
+        - zooms (iterable): Niveaux de zoom à générer.
+        - nb_workers (int): Nombre de processus de rendu.
+        - max_connections_per_transformer (int): Seuil d'affichage des transformateurs saturés.
+
+    Returns:
+        - dict : nombre de tuiles générées, inchangées et supprimées.
+    """
+    manifeste_path = os.path.join(dossier_tuiles, "manifeste.json")
+    manifeste = {}
+    if os.path.exists(manifeste_path):
+        with open(manifeste_path, 'r', encoding='utf-8') as f:
+            manifeste = json.load(f)
+
+    entites = charger_entites(bat_files, selected_sites_files, asso_files, transfo_files, Rmax)
+
+    nouveau_manifeste, a_generer = {}, []
+    for zoom in zooms:
+        for (x, y), contenu in contenus_tuiles(entites, zoom).items():
+            cle = f"{zoom}/{x}/{y}"
+            h = empreinte_contenu(zoom, contenu)
+            nouveau_manifeste[cle] = h
+            fichier = os.path.join(dossier_tuiles, str(zoom), str(x), f"{y}.png")
+            if manifeste.get(cle) != h or not os.path.exists(fichier):
+                a_generer.append((zoom, x, y, contenu, fichier, max_connections_per_transformer))
+
+    if a_generer:
+        with ProcessPoolExecutor(max_workers=nb_workers) as executor:
+            list(executor.map(rendre_tuile, *zip(*a_generer), chunksize=16))
+
+    supprimees = 0
+    for cle in manifeste.keys() - nouveau_manifeste.keys():
+        fichier = os.path.join(dossier_tuiles, *cle.split("/")) + ".png"
+        if os.path.exists(fichier):
+            os.remove(fichier)
+            supprimees += 1
+
+    os.makedirs(dossier_tuiles, exist_ok=True)
+    with open(manifeste_path, 'w', encoding='utf-8') as f:
+        json.dump(nouveau_manifeste, f)
+
+    bilan = {"generees": len(a_generer), "inchangees": len(nouveau_manifeste) - len(a_generer), "supprimees": supprimees}
+    print(f"Tuiles sauvegardées dans '{dossier_tuiles}' : {bilan}")
+    return bilan
+
+
+def fichiers_zones(dossier_local, dossier_sortie):
+    """
+    Recherche les fichiers de toutes les zones déjà traitées et résolues, pour une carte de toute la métropole.
+
+    Returns:
+        - tuple : (bat_files, selected_sites_files, asso_files, transfo_files)
+    """
+    selected_sites_files = sorted(glob.glob(os.path.join(dossier_sortie, "SOLUTION_sites_*.json")))
+    suffixes = [os.path.basename(f)[len("SOLUTION_sites_"):-len(".json")] for f in selected_sites_files]
+    bat_files = [os.path.join(dossier_local, f"batiments_rennes_{s}.json") for s in suffixes]
+    asso_files = [os.path.join(dossier_sortie, f"SOLUTION_asso_tf_bornes{s}.json") for s in suffixes]
+    transfo_files = [os.path.join(dossier_local, f"transfo_rennes_{s}.json") for s in suffixes]
+    existe = os.path.exists
+    return ([f for f in bat_files if existe(f)], selected_sites_files,
+            [f for f in asso_files if existe(f)], [f for f in transfo_files if existe(f)])